@@ -0,0 +1,252 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+# Peak RSS is only reported where the resource module exists, it doesn't on Windows
+try:
+    import resource
+except ImportError:
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#---------------------------------------------------------#
+# Benchmarks of the palette extraction pipeline stages on #
+# synthetic images. Every case runs in a fresh process so #
+# its peak RSS is not skewed by the previous cases, and   #
+# the allocations of each stage are traced on their own.  #
+#                                                         #
+#   python benchmarks/bench_pipeline.py -o results.json   #
+#   python benchmarks/bench_pipeline.py --baseline \      #
+#       results.json --threshold 0.25                     #
+#---------------------------------------------------------#
+
+# Kinds of synthetic images
+#   flat: a few solid colored shapes, like flat illustrations
+#   gradient: smooth two-axis gradients, thousands of close colors
+#   noise: random pixels limited to a number of bits per channel, like noisy photos
+IMAGE_KINDS = ['flat', 'gradient', 'noise']
+
+# Image resolutions (width x width * 3/4) and sample sizes benchmarked
+RESOLUTIONS = [512, 2048, 4096]
+SAMPLE_SIZES = [100, 512, 0]
+
+# Bits per channel of the noise images, setting their number of distinct colors
+NOISE_BITS = 6
+
+# Seed of every random generator, so runs are reproducible
+SEED = 131
+
+# Stages faster than this are too noisy to be reported as regressions
+MIN_COMPARED_SECONDS = 0.001
+
+# Creates a synthetic image of the given kind
+def make_image(kind, width, height):
+    from PyQt5.QtCore import QRect, QPointF
+    from PyQt5.QtGui import QImage, QColor, QPainter, QLinearGradient
+
+    rng = random.Random(SEED)
+    if kind == 'noise':
+        mask = (0xFF << (8 - NOISE_BITS)) & 0xFF
+        table = bytes(value & mask for value in range(256))
+        pixels = rng.randbytes(width * height * 4).translate(table)
+        return QImage(pixels, width, height, QImage.Format_RGB32).copy()
+
+    image = QImage(width, height, QImage.Format_RGB32)
+    painter = QPainter(image)
+    if kind == 'flat':
+        colors = [QColor(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(12)]
+        image.fill(colors[0])
+        for _ in range(60):
+            painter.fillRect(QRect(rng.randrange(width), rng.randrange(height),
+                                   rng.randrange(1, width // 2), rng.randrange(1, height // 2)),
+                             rng.choice(colors))
+    else:
+        horizontal = QLinearGradient(QPointF(0, 0), QPointF(width, 0))
+        horizontal.setColorAt(0, QColor('#1d3557'))
+        horizontal.setColorAt(1, QColor('#e63946'))
+        painter.fillRect(image.rect(), horizontal)
+        vertical = QLinearGradient(QPointF(0, 0), QPointF(0, height))
+        vertical.setColorAt(0, QColor(255, 255, 255, 0))
+        vertical.setColorAt(1, QColor(241, 250, 238, 200))
+        painter.fillRect(image.rect(), vertical)
+    painter.end()
+    return image
+
+# Writes the synthetic images used by the decode stage, returns their paths
+def write_images(directory, resolutions):
+    paths = {}
+    for kind in IMAGE_KINDS:
+        for resolution in resolutions:
+            for extension in ('png', 'jpg'):
+                path = os.path.join(directory, f'{kind}_{resolution}.{extension}')
+                make_image(kind, resolution, resolution * 3 // 4).save(path)
+                paths[(kind, resolution, extension)] = path
+    return paths
+
+# Runs a function repeatedly, returning the median wall time and its last result
+def time_call(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2], result
+
+# Runs a function once more with its allocations traced, returning their peak in megabytes
+# Traced apart from the timed runs, which tracing slows down, and only counting the
+# memory allocated by the function itself. Buffers allocated by Qt aren't traced
+def peak_allocated_mb(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+# Returns the peak resident set size of this process in megabytes, or None where it is unknown
+# It only ever grows, so it is the peak of a whole case rather than of a stage
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+# Benchmarks every stage on one image, run in a fresh worker process
+def run_case(image_path, kind, resolution, extension, sample_size, repeat):
+    from image_to_palette.core.ImageDecoder import load_sample, image_colors
+    from image_to_palette.core.Bucketing import EXACT_PRECISION, PRECISIONS
+    from image_to_palette.core.Extraction import create_palette
+    from image_to_palette.core.Quantizers import QUANTIZERS
+    from image_to_palette.model.Palette import Palette
+
+    case = f'{kind}_{resolution}.{extension}@{sample_size or "full"}'
+    results = []
+
+    # Times a stage, then traces its allocations, returning the result of the stage
+    def record(stage, function, pixels=None):
+        seconds, result = time_call(function, repeat)
+        results.append({
+            'case': case,
+            'stage': stage,
+            'seconds': seconds,
+            'pixels': pixels,
+            'pixels_per_second': pixels / seconds if pixels and seconds > 0 else None,
+            'peak_mb': peak_allocated_mb(function),
+        })
+        return result
+
+    source_pixels = resolution * (resolution * 3 // 4)
+    image = record('decode', lambda: load_sample(image_path, sample_size), source_pixels)
+
+    sample_pixels = image.width() * image.height()
+    total_colors = record('count', lambda: image_colors(image), sample_pixels)
+
+    # Bucketed counts, whose smaller histograms the later stages don't use
+    for precision in PRECISIONS:
+        if precision != EXACT_PRECISION:
+            record(f'count.{precision}', lambda: image_colors(image, precision), sample_pixels)
+
+    for name, quantizer in QUANTIZERS.items():
+        palette_colors = record(f'quantize.{name}', lambda: quantizer().quantize(total_colors, 10, random.Random(SEED)))
+
+    palette = create_palette(image_path, total_colors, palette_colors)
+    data = record('serialize', lambda: json.dumps(palette.to_json()))
+    record('load', lambda: Palette().from_json(json.loads(data)))
+
+    # The case runs in its own process, so its peak RSS covers the memory Qt allocated too
+    case_rss = peak_rss_mb()
+    for entry in results:
+        entry['case_peak_rss_mb'] = case_rss
+    return results
+
+# Runs every case, each in its own process
+def run_benchmarks(repeat, quick):
+    resolutions = RESOLUTIONS[:1] if quick else RESOLUTIONS
+    context = multiprocessing.get_context('spawn')
+    results = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_images(directory, resolutions)
+        for (kind, resolution, extension), path in paths.items():
+            for sample_size in SAMPLE_SIZES:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    results.extend(executor.submit(run_case, path, kind, resolution, extension,
+                                                   sample_size, repeat).result())
+                print(f'{kind}_{resolution}.{extension}@{sample_size or "full"} done', file=sys.stderr)
+
+    return results
+
+# Compares the results with a baseline, returning the regressed stages
+def find_regressions(results, baseline, threshold):
+    baseline_seconds = {(entry['case'], entry['stage']): entry['seconds'] for entry in baseline['results']}
+    regressions = []
+    for entry in results:
+        previous = baseline_seconds.get((entry['case'], entry['stage']))
+        if previous is None or max(previous, entry['seconds']) < MIN_COMPARED_SECONDS:
+            continue
+        if entry['seconds'] > previous * (1 + threshold):
+            regressions.append((entry['case'], entry['stage'], previous, entry['seconds']))
+    return regressions
+
+# Prints the results as a table
+def print_table(results):
+    print(f'{"case":<28} {"stage":<20} {"ms":>10} {"Mpx/s":>10} {"peak MB":>9} {"case RSS":>9}')
+    for entry in results:
+        mpx = f'{entry["pixels_per_second"] / 1e6:.1f}' if entry['pixels_per_second'] else '-'
+        rss = f'{entry["case_peak_rss_mb"]:.1f}' if entry['case_peak_rss_mb'] is not None else '-'
+        print(f'{entry["case"]:<28} {entry["stage"]:<20} {entry["seconds"] * 1000:>10.2f} {mpx:>10} {entry["peak_mb"]:>9.1f} {rss:>9}')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks the palette extraction pipeline.')
+    parser.add_argument('-o', '--output', help='JSON file to write the results to.')
+    parser.add_argument('--baseline', help='JSON results file to compare against.')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Relative slowdown over the baseline reported as a regression (default 0.25).')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per stage, the median is kept (default 5).')
+    parser.add_argument('--quick', action='store_true', help='Only benchmark the smallest resolution.')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.repeat, args.quick)
+    print_table(results)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'numpy': _numpy_version(),
+                'repeat': args.repeat,
+                'threshold': args.threshold,
+                'results': results,
+            }, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            regressions = find_regressions(results, json.load(file), args.threshold)
+        for case, stage, previous, current in regressions:
+            print(f'REGRESSION {case} {stage}: {previous * 1000:.2f} ms -> {current * 1000:.2f} ms', file=sys.stderr)
+        return 1 if regressions else 0
+
+    return 0
+
+# Returns the installed NumPy version, or None
+def _numpy_version():
+    try:
+        import numpy
+        return numpy.__version__
+    except ImportError:
+        return None
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,10 @@
 from krita import *
 from PyQt5.QtWidgets import QDockWidget
-from PyQt5.QtCore import QSize
+from PyQt5.QtCore import QSize, QStandardPaths, QTimer
 from PyQt5.QtGui import QDragEnterEvent, QDropEvent, QDragLeaveEvent
-from image_to_palette.managers import UIManager, RecentPalettesManager, PaletteManager, FileManager
-from .model.Palette import Palette
+from .core.Instrumentation import tracer
 import os
+import time
 
 #---------------------------------------------------------#
 # Image to Palette - Copyright (c) 2024 - Meredith Scott  #
@@ -15,6 +15,16 @@ import os
 # A Krita docker plugin that allows you to quickly        #
 # generate color palettes from images.                    #
 #---------------------------------------------------------#
+
+# Returns the user's Krita resource directory
+# Krita reports the folder chosen in its settings, the default location is only used outside Krita
+def resource_location():
+    try:
+        location = Krita.instance().getAppDataLocation()
+    except (NameError, AttributeError):
+        location = None
+    return location or QStandardPaths.writableLocation(QStandardPaths.AppDataLocation)
+
 class ImageToPalette(QDockWidget):
     def __init__(self):
         super().__init__()
@@ -23,41 +33,94 @@ class ImageToPalette(QDockWidget):
 
         # Get the directory of the current script
         current_dir = os.path.dirname(os.path.abspath(__file__))
-        # Define RECENT_PALETTES_FILE in the current directory
-        # File is for storing the recent palette history
-        self.RECENT_PALETTES_FILE = os.path.join(current_dir, '.krita_recent_palettes.json')
+        # File storing the recent palette history, in the user's Krita resource directory
+        # as the plugin directory may be read-only
+        resource_dir = resource_location()
+        self.RECENT_PALETTES_FILE = os.path.join(resource_dir, 'image_to_palette', 'recent_palettes.json')
+        # Database indexing every generated and saved palette
+        self.PALETTE_LIBRARY_FILE = os.path.join(resource_dir, 'image_to_palette', 'library.sqlite')
+        # Database indexing the palette files of the folders searched for similar palettes
+        self.PALETTE_INDEX_FILE = os.path.join(resource_dir, 'image_to_palette', 'palette_index.sqlite')
+        # Krita's own palette resources, palettes exported there show up in its Palette docker
+        self.KRITA_PALETTES_DIR = os.path.join(resource_dir, 'palettes')
+        # Recent palette history of earlier versions, migrated on first use
+        self.LEGACY_RECENT_PALETTES_FILE = os.path.join(current_dir, '.krita_recent_palettes.json')
+        # Directory caching the color histograms of opened images, in the user's cache directory
+        cache_dir = QStandardPaths.writableLocation(QStandardPaths.CacheLocation)
+        self.HISTOGRAM_CACHE_DIR = os.path.join(cache_dir, 'image_to_palette', 'histograms')
+
+        # The managers and UI, and the numeric backends they import, are only built
+        # once the docker is first shown, so a hidden docker costs Krita's startup nothing
+        self.main_widget = None
+        self.build_scheduled = False
+
+    # Builds the docker the first time it is shown
+    # The build waits for the event loop, so Krita's window is drawn before it
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self.build_scheduled:
+            self.build_scheduled = True
+            QTimer.singleShot(0, self.build)
+
+    # Imports and creates the managers, then the UI of the docker
+    def build(self):
+        start = time.perf_counter()
+        from image_to_palette.managers import UIManager, RecentPalettesManager, PaletteManager, FileManager, SettingsManager, BatchManager, CanvasManager, LibraryManager, DebugManager, RegionManager, SearchManager
+        from .model.Palette import Palette
+        imported = time.perf_counter()
 
         # Initializing Palette
         self.palette = Palette()
 
         # Initializing Managers
+        self.settings_manager = SettingsManager(self)
+        self.debug_manager = DebugManager(self)
         self.recent_palettes_manager = RecentPalettesManager(self)
         self.ui_manager = UIManager(self)
         self.file_manager = FileManager(self)
         self.palette_manager = PaletteManager(self)
+        self.batch_manager = BatchManager(self)
+        self.canvas_manager = CanvasManager(self)
+        self.library_manager = LibraryManager(self)
+        self.region_manager = RegionManager(self)
+        self.search_manager = SearchManager(self)
 
         # Initializing UI
         self.main_widget = self.ui_manager.create_main_widget()
         self.setWidget(self.main_widget)
         self.original_bg_color = self.main_widget.palette().color(self.main_widget.backgroundRole())
 
+        tracer.record_startup('import managers', imported - start)
+        tracer.record_startup('build docker', time.perf_counter() - imported)
+        self.debug_manager.refresh()
+
+    # Returns whether the managers and UI were built
+    def is_built(self):
+        return self.main_widget is not None
+
     # Sets recommended size of the docker    
     def sizeHint(self):
         return QSize(300, 100)
 
     # Handles the drag enter event
     def dragEnterEvent(self, event: QDragEnterEvent):
+        if not self.is_built():
+            event.ignore()
+            return
         self.ui_manager.handle_drag_enter(event)
 
     # Handles the drag leave event
     def dragLeaveEvent(self, event: QDragLeaveEvent):
-        self.ui_manager.animate_background_color(self.original_bg_color)
+        if self.is_built():
+            self.ui_manager.animate_background_color(self.original_bg_color)
 
     # Handles the drop event
     def dropEvent(self, event: QDropEvent):
-        self.ui_manager.handle_drop_event(event)
+        if self.is_built():
+            self.ui_manager.handle_drop_event(event)
 
     # Handles a resize event
     def resizeEvent(self, event):
         super().resizeEvent(event)
-        self.recent_palettes_manager.update_recent_palettes_combo()
\ No newline at end of file
+        if self.is_built():
+            self.recent_palettes_manager.schedule_elide()
\ No newline at end of file
@@ -1,17 +1,30 @@
-from krita import DockWidgetFactory, DockWidgetFactoryBase
-from .ImageToPalette import ImageToPalette
+# The docker is only registered when loaded by Krita
+# Outside of Krita the package provides the headless core and command line interface
+try:
+    from krita import DockWidgetFactory, DockWidgetFactoryBase, Krita
+except ImportError:
+    DockWidgetFactory = None
 
-# Defining an ID for the docker
-DOCKER_ID = 'image_to_palette_docker'
+if DockWidgetFactory is not None:
+    import time
+    from .core.Instrumentation import tracer
 
-# Getting the current instance of Krita
-instance = Krita.instance()
+    # Registering only imports the docker class, the rest is loaded when it is first shown
+    registration_start = time.perf_counter()
+    from .ImageToPalette import ImageToPalette
 
-# Creating a factory for the docker widget
-dock_widget_factory = DockWidgetFactory(DOCKER_ID, #ID
-                                        DockWidgetFactoryBase.DockRight, # Default docking position
-                                        ImageToPalette # Class of the docker widget
-                                        )
+    # Defining an ID for the docker
+    DOCKER_ID = 'image_to_palette_docker'
 
-# Registering the docker widget factory with Krita
-instance.addDockWidgetFactory(dock_widget_factory)
+    # Getting the current instance of Krita
+    instance = Krita.instance()
+
+    # Creating a factory for the docker widget
+    dock_widget_factory = DockWidgetFactory(DOCKER_ID, #ID
+                                            DockWidgetFactoryBase.DockRight, # Default docking position
+                                            ImageToPalette # Class of the docker widget
+                                            )
+
+    # Registering the docker widget factory with Krita
+    instance.addDockWidgetFactory(dock_widget_factory)
+    tracer.record_startup('register docker', time.perf_counter() - registration_start)
@@ -0,0 +1,109 @@
+import argparse
+import os
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .core.Bucketing import DEFAULT_PRECISION, PRECISIONS
+from .core.ColorDistance import COLOR_DIFFERENCES, DEFAULT_COLOR_DIFFERENCE, DEFAULT_MIN_DISTANCE
+from .core.Extraction import extract_palette
+from .core.ImageDecoder import DEFAULT_SAMPLE_SIZE, is_image_file
+from .core.PaletteFile import BINARY_PALETTE_EXTENSION, save_palette_file
+from .core.Quantizers import DEFAULT_QUANTIZER, QUANTIZERS
+
+#---------------------------------------------------------#
+# Command line interface for generating palettes from     #
+# images in bulk, without Krita.                          #
+#                                                         #
+#   python -m image_to_palette IMAGES_OR_FOLDERS -o OUT   #
+#---------------------------------------------------------#
+
+# Parses the command line arguments
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m image_to_palette',
+        description='Generates palette files, loadable in the Image to Palette docker, from images.')
+    parser.add_argument('inputs', nargs='+', help='Image files or folders of images.')
+    parser.add_argument('-o', '--output', help='Folder to write the palettes to. Defaults to next to each image.')
+    parser.add_argument('-r', '--recursive', action='store_true', help='Also process images in subfolders.')
+    parser.add_argument('-s', '--sample-size', type=int, default=DEFAULT_SAMPLE_SIZE,
+                        help=f'Size images are scaled into before counting, 0 for full resolution (default {DEFAULT_SAMPLE_SIZE}).')
+    parser.add_argument('-m', '--method', choices=list(QUANTIZERS), default=DEFAULT_QUANTIZER,
+                        help=f'Method picking the palette colors (default {DEFAULT_QUANTIZER}).')
+    parser.add_argument('-p', '--precision', choices=list(PRECISIONS), default=DEFAULT_PRECISION,
+                        help=f'Precision colors are counted at, coarser ones merge near identical shades (default {DEFAULT_PRECISION}).')
+    parser.add_argument('-d', '--min-distance', type=float, default=DEFAULT_MIN_DISTANCE,
+                        help=f'Smallest color difference between two palette colors, 0 allows near identical ones (default {DEFAULT_MIN_DISTANCE}).')
+    parser.add_argument('--metric', choices=list(COLOR_DIFFERENCES), default=DEFAULT_COLOR_DIFFERENCE,
+                        help=f'Color difference formula of --min-distance (default {DEFAULT_COLOR_DIFFERENCE}).')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='Number of worker processes (default one per core).')
+    parser.add_argument('-f', '--format', choices=['json', 'binary'], default='json',
+                        help=f'Palette file format, binary files use the {BINARY_PALETTE_EXTENSION} extension (default json).')
+    parser.add_argument('--seed', help='Seed making the generated palettes reproducible.')
+    parser.add_argument('--skip-existing', action='store_true', help='Skip images whose palette file already exists.')
+    return parser.parse_args(argv)
+
+# Returns (image path, palette path) pairs for every image found in the inputs
+def find_images(inputs, output_dir, recursive, extension):
+    for input_path in inputs:
+        if os.path.isfile(input_path):
+            yield input_path, palette_path(input_path, os.path.dirname(input_path), output_dir, extension)
+            continue
+
+        for root, dirs, files in os.walk(input_path):
+            if not recursive:
+                dirs.clear()
+            for file_name in sorted(files):
+                if is_image_file(file_name):
+                    image_path = os.path.join(root, file_name)
+                    yield image_path, palette_path(image_path, input_path, output_dir, extension)
+
+# Returns the path of the palette file of an image, mirroring its folder structure in output_dir
+def palette_path(image_path, input_root, output_dir, extension):
+    base_path = os.path.splitext(image_path)[0]
+    if output_dir is not None:
+        base_path = os.path.join(output_dir, os.path.relpath(base_path, input_root or '.'))
+    return base_path + extension
+
+# Extracts the palette of one image and writes it, run in a worker process
+def process_image(image_path, output_path, sample_size, method, seed, precision=DEFAULT_PRECISION,
+                  min_distance=DEFAULT_MIN_DISTANCE, metric=DEFAULT_COLOR_DIFFERENCE):
+    # Each image gets its own seed derived from the given one
+    if seed is not None:
+        seed = zlib.crc32(f'{seed}:{os.path.basename(image_path)}'.encode('utf-8'))
+    palette = extract_palette(image_path, sample_size, method, seed=seed, precision=precision,
+                              min_distance=min_distance, metric=metric)
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    save_palette_file(output_path, palette)
+    return output_path
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    extension = BINARY_PALETTE_EXTENSION if args.format == 'binary' else '.json'
+    jobs = list(find_images(args.inputs, args.output, args.recursive, extension))
+    if args.skip_existing:
+        jobs = [(image_path, output_path) for image_path, output_path in jobs if not os.path.exists(output_path)]
+
+    failures = 0
+    with ProcessPoolExecutor(max_workers=max(args.jobs, 1)) as executor:
+        futures = {
+            executor.submit(process_image, image_path, output_path, args.sample_size, args.method, args.seed,
+                            args.precision, args.min_distance, args.metric): image_path
+            for image_path, output_path in jobs
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            image_path = futures[future]
+            try:
+                output_path = future.result()
+                print(f'[{done}/{len(jobs)}] {image_path} -> {output_path}', file=sys.stderr)
+            except Exception as e:
+                failures += 1
+                print(f'[{done}/{len(jobs)}] {image_path} failed: {e}', file=sys.stderr)
+
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,281 @@
+import math
+from array import array
+from collections import Counter
+from functools import lru_cache
+
+from .ColorSpace import np, rgb_to_lab, rgb_to_lab_array
+from .Histogram import OPAQUE_ALPHA, PixelAccumulator, unpremultiply_numpy
+from ..model.ColorHistogram import ColorHistogram
+
+# Precisions colors are counted at, from exact 24-bit colors to perceptual buckets
+# Each bucket is counted as the pixel weighted mean of the colors that fell into it
+EXACT_PRECISION = 'exact'
+LAB_PRECISION = 'lab'
+PRECISIONS = {
+    EXACT_PRECISION: 'Exact Colors',
+    'rgb666': '6 Bits per Channel',
+    'rgb555': '5 Bits per Channel',
+    LAB_PRECISION: 'Perceptual (Lab)',
+}
+DEFAULT_PRECISION = EXACT_PRECISION
+
+# Bits kept per channel by the rgb precisions
+RGB_BITS = {'rgb666': 6, 'rgb555': 5}
+
+# Lab buckets are looked up from colors first reduced to this many bits per channel
+LAB_RGB_BITS = 6
+
+# Edge of the cubic Lab cells colors are bucketed into, in delta E 1976
+LAB_CELL_SIZE = 4.0
+
+# Offset keeping Lab cell coordinates positive, a and b stay within +-128
+LAB_CELL_OFFSET = 64
+
+# Fewer pixels than the buckets divided by this are only counted into the buckets they
+# fall in, rather than with a bincount allocating a count for every bucket
+SPARSE_ADD_RATIO = 8
+
+# Returns the bucket index of rgb channels reduced to the given bits per channel
+def rgb_index(red, green, blue, bits):
+    shift = 8 - bits
+    return ((red >> shift) << (2 * bits)) | ((green >> shift) << bits) | (blue >> shift)
+
+# Returns the Lab cell of a color, as integer (L, a, b) cell coordinates
+def lab_cell(color):
+    return tuple(int(math.floor(value / LAB_CELL_SIZE)) for value in rgb_to_lab(color & 0xFFFFFF))
+
+# Returns the center of the LAB_RGB_BITS rgb cell of a color, the color its Lab bucket is found from
+def lab_rgb_center(color):
+    shift = 8 - LAB_RGB_BITS
+    kept = ((0xFF << shift) & 0xFF) * 0x010101
+    return (color & kept) | ((1 << (shift - 1)) * 0x010101)
+
+# Returns the table mapping each LAB_RGB_BITS rgb index to a dense Lab bucket index,
+# and the number of Lab buckets
+@lru_cache(maxsize=1)
+def lab_bucket_table():
+    levels = 1 << LAB_RGB_BITS
+    channel = (np.arange(levels) << (8 - LAB_RGB_BITS)) | (1 << (7 - LAB_RGB_BITS))
+    red, green, blue = np.meshgrid(channel, channel, channel, indexing='ij')
+    colors = (red.ravel() << 16) | (green.ravel() << 8) | blue.ravel()
+
+    # Cells are packed into a single key, L and the shifted a and b stay within 10 bits
+    cells = np.floor(rgb_to_lab_array(colors) / LAB_CELL_SIZE).astype(np.int64) + LAB_CELL_OFFSET
+    keys = (cells[:, 0] << 20) | (cells[:, 1] << 10) | cells[:, 2]
+    _, table = np.unique(keys, return_inverse=True)
+    table = table.ravel().astype(np.intp)
+    return table, int(table.max()) + 1
+
+# Returns the number of buckets of a precision
+def bucket_count(precision):
+    if precision == LAB_PRECISION:
+        return lab_bucket_table()[1]
+    return 1 << (3 * RGB_BITS[precision])
+
+# Returns the bucket index of each opaque rgb color of an array
+def bucket_indices(red, green, blue, precision):
+    if precision == LAB_PRECISION:
+        return lab_bucket_table()[0][rgb_index(red, green, blue, LAB_RGB_BITS)]
+    return rgb_index(red, green, blue, RGB_BITS[precision])
+
+# Builds a ColorHistogram from the pixel count and channel sums of each bucket
+# Buckets whose mean colors round to the same color are merged
+def _histogram_from_buckets(counts, sums):
+    used = np.flatnonzero(counts)
+    if not len(used):
+        return ColorHistogram()
+
+    counts = counts[used]
+    means = np.rint(sums[:, used] / counts).astype(np.int64)
+    colors = OPAQUE_ALPHA | (means[0] << 16) | (means[1] << 8) | means[2]
+
+    colors, inverse = np.unique(colors, return_inverse=True)
+    counts = np.bincount(inverse.ravel(), weights=counts).astype(np.int64)
+    order = np.argsort(-counts, kind='stable')
+    return ColorHistogram(array('I', colors[order].astype(np.uint32).tobytes()),
+                          array('I', counts[order].astype(np.uint32).tobytes()))
+
+# Reduces a ColorHistogram to the given precision
+def bucket_histogram(histogram, precision):
+    if precision == EXACT_PRECISION or not histogram:
+        return histogram
+    if np is not None:
+        return _bucket_colors_numpy(histogram, precision)
+    return _bucket_colors_python(histogram, precision)
+
+# Sums the pixel counts and channels of the colors of each bucket in a few vectorized passes
+def _bucket_colors_numpy(histogram, precision):
+    colors = np.frombuffer(histogram.colors, dtype=np.uint32).astype(np.intp)
+    counts = np.frombuffer(histogram.counts, dtype=np.uint32).astype(np.float64)
+    red, green, blue = (colors >> 16) & 0xFF, (colors >> 8) & 0xFF, colors & 0xFF
+
+    index = bucket_indices(red, green, blue, precision)
+    size = bucket_count(precision)
+    sums = np.stack([np.bincount(index, weights=counts * channel, minlength=size)
+                     for channel in (red, green, blue)])
+    return _histogram_from_buckets(np.bincount(index, weights=counts, minlength=size), sums)
+
+# Folds the colors into buckets of [count, red, green, blue] sums
+# Rgb buckets are a dense list, the Lab cells of the fallback are keyed by cell
+# Colors are reduced to LAB_RGB_BITS before their Lab cell is found, as the NumPy table does
+def _bucket_colors_python(histogram, precision):
+    if precision == LAB_PRECISION:
+        buckets = {}
+        cells = {}  # Rgb cell center -> Lab cell, shared by the colors of the rgb cell
+        for color, count in histogram:
+            center = lab_rgb_center(color)
+            cell = cells.get(center)
+            if cell is None:
+                cell = cells[center] = lab_cell(center)
+            totals = buckets.setdefault(cell, [0, 0, 0, 0])
+            totals[0] += count
+            totals[1] += ((color >> 16) & 0xFF) * count
+            totals[2] += ((color >> 8) & 0xFF) * count
+            totals[3] += (color & 0xFF) * count
+        buckets = buckets.values()
+    else:
+        bits = RGB_BITS[precision]
+        dense = [None] * (1 << (3 * bits))
+        for color, count in histogram:
+            red, green, blue = (color >> 16) & 0xFF, (color >> 8) & 0xFF, color & 0xFF
+            index = rgb_index(red, green, blue, bits)
+            totals = dense[index]
+            if totals is None:
+                totals = dense[index] = [0, 0, 0, 0]
+            totals[0] += count
+            totals[1] += red * count
+            totals[2] += green * count
+            totals[3] += blue * count
+        buckets = (totals for totals in dense if totals is not None)
+
+    return _histogram_from_sums(buckets)
+
+# Builds a ColorHistogram from [count, red, green, blue] sums of buckets
+# Buckets whose mean colors round to the same color are merged
+def _histogram_from_sums(buckets):
+    counter = Counter()
+    for count, red, green, blue in buckets:
+        color = OPAQUE_ALPHA | (round(red / count) << 16) | (round(green / count) << 8) | round(blue / count)
+        counter[color] += count
+    return ColorHistogram.from_pairs(counter.most_common())
+
+# Counts pixel buffers fed one tile at a time into a dense, fixed-size table of
+# buckets, so a full resolution image is counted in bounded memory
+# Without NumPy the exact colors are counted, then reduced to buckets at the end
+class BucketAccumulator:
+    def __init__(self, premultiplied=False, skip_transparent=False, precision=DEFAULT_PRECISION):
+        self.premultiplied = premultiplied
+        self.skip_transparent = skip_transparent
+        self.precision = precision
+
+        if np is None:
+            self.exact = PixelAccumulator(premultiplied, skip_transparent)
+            return
+        size = bucket_count(precision)
+        self.counts = np.zeros(size, dtype=np.int64)
+        self.sums = np.zeros((3, size), dtype=np.int64)  # Red, green and blue sums of each bucket
+
+    # Counts every stride-th pixel of a buffer of 32-bit ARGB pixels
+    # Pixels whose byte in mask (one per pixel, before striding) is 0 are skipped
+    def add(self, pixels, stride=1, mask=None):
+        if np is None:
+            self.exact.add(pixels, stride, mask)
+            return
+
+        data = np.frombuffer(pixels, dtype=np.uint32)[::stride]
+        if mask is not None:
+            data = data[np.frombuffer(mask, dtype=np.uint8)[::stride] != 0]
+        if self.skip_transparent:
+            data = data[(data >> 24) != 0]
+        if self.premultiplied:
+            data = unpremultiply_numpy(data)
+        if not len(data):
+            return
+
+        data = data.astype(np.intp)
+        channels = ((data >> 16) & 0xFF, (data >> 8) & 0xFF, data & 0xFF)
+        index = bucket_indices(*channels, self.precision)
+
+        if len(index) * SPARSE_ADD_RATIO < len(self.counts):
+            buckets, inverse = np.unique(index, return_inverse=True)
+            inverse = inverse.ravel()
+            self.counts[buckets] += np.bincount(inverse)
+            for sums, channel in zip(self.sums, channels):
+                sums[buckets] += np.bincount(inverse, weights=channel).astype(np.int64)
+        else:
+            self.counts += np.bincount(index, minlength=len(self.counts))
+            for sums, channel in zip(self.sums, channels):
+                sums += np.bincount(index, weights=channel, minlength=len(self.counts)).astype(np.int64)
+
+    # Returns a ColorHistogram of the mean color of every bucket, ordered from most to least common
+    def histogram(self):
+        if np is None:
+            return bucket_histogram(self.exact.histogram(), self.precision)
+        return _histogram_from_buckets(self.counts, self.sums)
+
+# Pixel counts and channel sums of the buckets of a precision, kept up to date as
+# histograms are added and taken away, so a histogram whose colors change a part at
+# a time is rebuilt from its buckets rather than by bucketing every color again
+# Without NumPy the buckets are kept in a dictionary, only the ones in use are stored
+class BucketTotals:
+    def __init__(self, precision):
+        self.precision = precision
+
+        if np is None:
+            self.buckets = {}  # Bucket key -> [count, red, green, blue] sums
+            self.cells = {}  # Rgb cell center -> Lab cell, shared by the colors of the rgb cell
+            return
+        size = bucket_count(precision)
+        self.counts = np.zeros(size, dtype=np.int64)
+        self.sums = np.zeros((3, size), dtype=np.int64)  # Red, green and blue sums of each bucket
+
+    # Adds the colors of a ColorHistogram to their buckets, or takes them away with a sign of -1
+    def add(self, histogram, sign=1):
+        if not histogram:
+            return
+        if np is None:
+            self._add_python(histogram, sign)
+            return
+
+        colors = np.frombuffer(histogram.colors, dtype=np.uint32).astype(np.intp)
+        counts = np.frombuffer(histogram.counts, dtype=np.uint32).astype(np.int64) * sign
+        channels = ((colors >> 16) & 0xFF, (colors >> 8) & 0xFF, colors & 0xFF)
+        index = bucket_indices(*channels, self.precision)
+        np.add.at(self.counts, index, counts)
+        for sums, channel in zip(self.sums, channels):
+            np.add.at(sums, index, counts * channel)
+
+    # Returns a ColorHistogram of the mean color of every bucket, ordered from most to least common
+    def histogram(self):
+        if np is None:
+            return _histogram_from_sums(self.buckets.values())
+        return _histogram_from_buckets(self.counts, self.sums)
+
+    def _add_python(self, histogram, sign):
+        bits = RGB_BITS.get(self.precision)
+        for color, count in histogram:
+            red, green, blue = (color >> 16) & 0xFF, (color >> 8) & 0xFF, color & 0xFF
+            if bits is None:
+                center = lab_rgb_center(color)
+                key = self.cells.get(center)
+                if key is None:
+                    key = self.cells[center] = lab_cell(center)
+            else:
+                key = rgb_index(red, green, blue, bits)
+
+            totals = self.buckets.get(key)
+            if totals is None:
+                totals = self.buckets[key] = [0, 0, 0, 0]
+            count *= sign
+            totals[0] += count
+            totals[1] += red * count
+            totals[2] += green * count
+            totals[3] += blue * count
+            if not totals[0]:
+                del self.buckets[key]
+
+# Returns an accumulator counting colors at the given precision
+def create_accumulator(premultiplied=False, skip_transparent=False, precision=DEFAULT_PRECISION):
+    if precision == EXACT_PRECISION:
+        return PixelAccumulator(premultiplied, skip_transparent)
+    return BucketAccumulator(premultiplied, skip_transparent, precision)
@@ -0,0 +1,109 @@
+import zlib
+
+from .Bucketing import DEFAULT_PRECISION, create_accumulator
+from .ImageDecoder import DEFAULT_SAMPLE_SIZE, sample_stride
+from .Instrumentation import span
+
+# Width and height of the tiles read when the canvas is sampled at full resolution
+TILE_SIZE = 256
+
+# Widest run of pixels read at once from a single sampled row
+ROW_CHUNK_SIZE = 4096
+
+# Color model and depth whose pixel data is laid out like QImage.Format_ARGB32
+# (8-bit B, G, R, A bytes, not premultiplied)
+SUPPORTED_COLOR_MODEL = 'RGBA'
+SUPPORTED_COLOR_DEPTH = 'U8'
+
+# Returns whether pixel data of the given Krita color model and depth can be counted directly
+def is_supported_color_space(color_model, color_depth):
+    return color_model == SUPPORTED_COLOR_MODEL and color_depth == SUPPORTED_COLOR_DEPTH
+
+# Yields the (x, y, width, height) tiles read to sample a region with the given stride
+# Downsampled regions only read their sampled rows, in chunks, so the pixels
+# skipped between two rows are never copied out of the canvas
+def sample_tiles(x, y, width, height, stride):
+    if stride == 1:
+        for top in range(y, y + height, TILE_SIZE):
+            for left in range(x, x + width, TILE_SIZE):
+                yield left, top, min(TILE_SIZE, x + width - left), min(TILE_SIZE, y + height - top)
+        return
+
+    # Chunks start on a multiple of the stride so columns line up between chunks
+    chunk_size = ROW_CHUNK_SIZE - ROW_CHUNK_SIZE % stride or stride
+    for top in range(y, y + height, stride):
+        for left in range(x, x + width, chunk_size):
+            yield left, top, min(chunk_size, x + width - left), 1
+
+# Counts the colors of a canvas region, reading it one tile at a time
+# read_pixels(x, y, width, height) returns the 8-bit RGBA pixel data of a region,
+# read_mask(x, y, width, height), if given, one selection byte per pixel
+# Fully transparent pixels are left out, they hold no painted color
+# Returns a ColorHistogram ordered from most to least common,
+# or None if is_cancelled() turned true between two tiles
+def sample_canvas(read_pixels, x, y, width, height, sample_size=DEFAULT_SAMPLE_SIZE,
+                  read_mask=None, is_cancelled=lambda: False, precision=DEFAULT_PRECISION):
+    stride = sample_stride(width, height, sample_size)
+    accumulator = create_accumulator(skip_transparent=True, precision=precision)
+
+    with span('sample canvas', pixels=width * height, stride=stride, masked=read_mask is not None):
+        for left, top, tile_width, tile_height in sample_tiles(x, y, width, height, stride):
+            if is_cancelled():
+                return None
+
+            pixels = read_pixels(left, top, tile_width, tile_height)
+            mask = read_mask(left, top, tile_width, tile_height) if read_mask is not None else None
+            accumulator.add(pixels, stride, mask)
+
+        return accumulator.histogram()
+
+# Reads the given (x, y, width, height) tiles, keeping the pixels of the tiles that changed
+# is_dirty(key, checksum) tells whether a tile differs from the one previously counted
+# Returns {(x, y) tile origin: (checksum, pixels)} of the changed tiles
+def read_dirty_tiles(read_pixels, tiles, is_dirty):
+    dirty_tiles = {}
+    with span('read tiles', tiles=len(tiles), pixels=sum(width * height for _, _, width, height in tiles)) as read_span:
+        for left, top, tile_width, tile_height in tiles:
+            pixels = bytes(read_pixels(left, top, tile_width, tile_height))
+            checksum = zlib.crc32(pixels)
+            if is_dirty((left, top), checksum):
+                dirty_tiles[(left, top)] = (checksum, pixels)
+        read_span.set(dirty_tiles=len(dirty_tiles))
+    return dirty_tiles
+
+# Tiles sampling a followed canvas, checked for changes a few at a time
+# Every check reads the tiles around the changes found so far, which keep changing
+# while a stroke goes on, then the next tiles of a sweep going round the whole
+# canvas, so a check reads about the same number of pixels whatever the canvas size
+class TileSweep:
+    def __init__(self, width, height, stride):
+        self.tiles = list(sample_tiles(0, 0, width, height, stride))
+        self.positions = {tile[:2]: position for position, tile in enumerate(self.tiles)}
+        # Tiles are listed row by row, the tiles of a row share its top
+        self.columns = max(sum(1 for tile in self.tiles if tile[1] == self.tiles[0][1]), 1) if self.tiles else 1
+        self.position = 0  # Next tile of the sweep
+
+    # Returns the tiles to read on a check, the ones at or next to the given tile keys,
+    # then sweep tiles until about the given number of pixels is read
+    def next_tiles(self, keys, pixel_budget):
+        selected = set()
+        for key in keys:
+            position = self.positions.get(key)
+            if position is None:
+                continue
+            for row in (-self.columns, 0, self.columns):
+                for column in (-1, 0, 1):
+                    neighbor = position + row + column
+                    if 0 <= neighbor < len(self.tiles):
+                        selected.add(neighbor)
+
+        pixels = sum(self.tiles[position][2] * self.tiles[position][3] for position in selected)
+        swept = 0
+        while self.tiles and swept < len(self.tiles) and (pixels < pixel_budget or not swept):
+            tile = self.tiles[self.position]
+            if self.position not in selected:
+                selected.add(self.position)
+                pixels += tile[2] * tile[3]
+            self.position = (self.position + 1) % len(self.tiles)
+            swept += 1
+        return [self.tiles[position] for position in sorted(selected)]
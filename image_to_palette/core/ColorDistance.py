@@ -0,0 +1,218 @@
+import math
+
+from .ColorSpace import np, rgb_to_lab, rgb_to_lab_array
+
+# Color difference formulas palette colors are kept apart with
+CIE76 = 'cie76'
+CIEDE2000 = 'ciede2000'
+COLOR_DIFFERENCES = {CIE76: 'Delta E 1976', CIEDE2000: 'Delta E 2000'}
+DEFAULT_COLOR_DIFFERENCE = CIE76
+
+# Smallest difference between two palette colors, 0 lets palettes hold near identical colors
+DEFAULT_MIN_DISTANCE = 0
+
+# Edge of the cubic Lab cells the colors of a histogram are indexed by
+GRID_CELL_SIZE = 8.0
+
+# CIEDE2000 shrinks differences between saturated colors well below their Lab distance,
+# colors further apart in Lab than this many times the minimum are taken as distinct
+# when rejecting neighbors, the colors actually picked are always compared exactly
+CIEDE2000_SEARCH_FACTOR = 3.0
+
+# Returns the CIE 1976 difference between two Lab colors, their Euclidean distance
+def delta_e_76(lab1, lab2):
+    return math.sqrt((lab1[0] - lab2[0]) ** 2 + (lab1[1] - lab2[1]) ** 2 + (lab1[2] - lab2[2]) ** 2)
+
+# Returns the CIEDE2000 difference between two Lab colors
+def delta_e_2000(lab1, lab2):
+    l1, a1, b1 = lab1
+    l2, a2, b2 = lab2
+
+    mean_c = (math.hypot(a1, b1) + math.hypot(a2, b2)) / 2
+    g = 0.5 * (1 - math.sqrt(mean_c ** 7 / (mean_c ** 7 + 25.0 ** 7)))
+    a1, a2 = a1 * (1 + g), a2 * (1 + g)
+    c1, c2 = math.hypot(a1, b1), math.hypot(a2, b2)
+    h1 = math.degrees(math.atan2(b1, a1)) % 360 if c1 else 0.0
+    h2 = math.degrees(math.atan2(b2, a2)) % 360 if c2 else 0.0
+
+    delta_l = l2 - l1
+    delta_c = c2 - c1
+    delta_h = h2 - h1
+    if c1 * c2 == 0:
+        delta_h = 0.0
+    elif delta_h > 180:
+        delta_h -= 360
+    elif delta_h < -180:
+        delta_h += 360
+    delta_big_h = 2 * math.sqrt(c1 * c2) * math.sin(math.radians(delta_h) / 2)
+
+    mean_l = (l1 + l2) / 2
+    mean_c = (c1 + c2) / 2
+    if c1 * c2 == 0:
+        mean_h = h1 + h2
+    elif abs(h1 - h2) <= 180:
+        mean_h = (h1 + h2) / 2
+    else:
+        mean_h = (h1 + h2 + 360) / 2 if h1 + h2 < 360 else (h1 + h2 - 360) / 2
+
+    t = (1 - 0.17 * math.cos(math.radians(mean_h - 30)) + 0.24 * math.cos(math.radians(2 * mean_h))
+         + 0.32 * math.cos(math.radians(3 * mean_h + 6)) - 0.20 * math.cos(math.radians(4 * mean_h - 63)))
+    s_l = 1 + 0.015 * (mean_l - 50) ** 2 / math.sqrt(20 + (mean_l - 50) ** 2)
+    s_c = 1 + 0.045 * mean_c
+    s_h = 1 + 0.015 * mean_c * t
+    r_t = (-2 * math.sqrt(mean_c ** 7 / (mean_c ** 7 + 25.0 ** 7))
+           * math.sin(math.radians(60 * math.exp(-(((mean_h - 275) / 25) ** 2)))))
+
+    return math.sqrt((delta_l / s_l) ** 2 + (delta_c / s_c) ** 2 + (delta_big_h / s_h) ** 2
+                     + r_t * (delta_c / s_c) * (delta_big_h / s_h))
+
+# Vectorized delta_e_2000() between an (N, 3) array of Lab colors and one Lab color
+def delta_e_2000_array(lab, point):
+    l1, a1, b1 = lab[:, 0], lab[:, 1], lab[:, 2]
+    l2, a2, b2 = point
+
+    mean_c = (np.hypot(a1, b1) + math.hypot(a2, b2)) / 2
+    g = 0.5 * (1 - np.sqrt(mean_c ** 7 / (mean_c ** 7 + 25.0 ** 7)))
+    a1, a2 = a1 * (1 + g), a2 * (1 + g)
+    c1, c2 = np.hypot(a1, b1), np.hypot(a2, b2)
+    h1 = np.where(c1 > 0, np.degrees(np.arctan2(b1, a1)) % 360, 0.0)
+    h2 = np.where(c2 > 0, np.degrees(np.arctan2(b2, a2)) % 360, 0.0)
+
+    chromatic = c1 * c2 != 0
+    delta_h = h2 - h1
+    delta_h = np.where(delta_h > 180, delta_h - 360, np.where(delta_h < -180, delta_h + 360, delta_h))
+    delta_h = np.where(chromatic, delta_h, 0.0)
+    delta_big_h = 2 * np.sqrt(c1 * c2) * np.sin(np.radians(delta_h) / 2)
+
+    mean_l = (l1 + l2) / 2
+    mean_c = (c1 + c2) / 2
+    wrapped = np.where(h1 + h2 < 360, (h1 + h2 + 360) / 2, (h1 + h2 - 360) / 2)
+    mean_h = np.where(~chromatic, h1 + h2, np.where(np.abs(h1 - h2) <= 180, (h1 + h2) / 2, wrapped))
+
+    t = (1 - 0.17 * np.cos(np.radians(mean_h - 30)) + 0.24 * np.cos(np.radians(2 * mean_h))
+         + 0.32 * np.cos(np.radians(3 * mean_h + 6)) - 0.20 * np.cos(np.radians(4 * mean_h - 63)))
+    s_l = 1 + 0.015 * (mean_l - 50) ** 2 / np.sqrt(20 + (mean_l - 50) ** 2)
+    s_c = 1 + 0.045 * mean_c
+    s_h = 1 + 0.015 * mean_c * t
+    r_t = (-2 * np.sqrt(mean_c ** 7 / (mean_c ** 7 + 25.0 ** 7))
+           * np.sin(np.radians(60 * np.exp(-(((mean_h - 275) / 25) ** 2)))))
+
+    return np.sqrt((((l2 - l1) / s_l) ** 2 + ((c2 - c1) / s_c) ** 2 + (delta_big_h / s_h) ** 2
+                    + r_t * ((c2 - c1) / s_c) * (delta_big_h / s_h)))
+
+# Returns the difference function of the given formula
+def color_difference(metric):
+    return delta_e_2000 if metric == CIEDE2000 else delta_e_76
+
+# Lab colors of a histogram, converted once per image, indexed by a uniform grid
+# so the colors close to a given one are found without scanning the whole histogram
+class LabIndex:
+    __slots__ = ('lab', 'cells')
+
+    def __init__(self, histogram):
+        if np is not None:
+            self.lab = rgb_to_lab_array(np.frombuffer(histogram.colors, dtype=np.uint32) & 0xFFFFFF)
+            keys = np.floor(self.lab / GRID_CELL_SIZE).astype(np.int64)
+            order = np.lexsort((keys[:, 2], keys[:, 1], keys[:, 0]))
+            cell_keys, starts = np.unique(keys[order], axis=0, return_index=True)
+            groups = np.split(order, starts[1:])
+            self.cells = {tuple(key): group for key, group in zip(cell_keys.tolist(), groups)}
+        else:
+            self.lab = [rgb_to_lab(color & 0xFFFFFF) for color in histogram.colors]
+            self.cells = {}
+            for index, lab in enumerate(self.lab):
+                self.cells.setdefault(self.cell(lab), []).append(index)
+
+    # Returns the grid cell holding a Lab color
+    def cell(self, lab):
+        return tuple(int(math.floor(value / GRID_CELL_SIZE)) for value in lab)
+
+    # Returns the indices of the histogram colors less than distance away from a Lab color
+    def within(self, lab, distance, metric=DEFAULT_COLOR_DIFFERENCE):
+        radius = distance * CIEDE2000_SEARCH_FACTOR if metric == CIEDE2000 else distance
+        low = self.cell([value - radius for value in lab])
+        high = self.cell([value + radius for value in lab])
+        groups = [self.cells[key] for key in ((l, a, b) for l in range(low[0], high[0] + 1)
+                                              for a in range(low[1], high[1] + 1)
+                                              for b in range(low[2], high[2] + 1)) if key in self.cells]
+        if not groups:
+            return []
+
+        if np is not None:
+            indices = np.concatenate(groups)
+            if metric == CIEDE2000:
+                distances = delta_e_2000_array(self.lab[indices], lab)
+            else:
+                distances = np.sqrt(((self.lab[indices] - lab) ** 2).sum(axis=1))
+            return indices[distances < distance].tolist()
+
+        difference = color_difference(metric)
+        return [index for group in groups for index in group if difference(self.lab[index], lab) < distance]
+
+# Returns the Lab index of the given histogram, building it on first use
+# The index is kept on the histogram, so every regeneration of the image reuses it
+def get_lab_index(histogram):
+    if histogram.lab_index is None:
+        histogram.lab_index = LabIndex(histogram)
+    return histogram.lab_index
+
+# Picks palette colors at least min_distance apart, in the order they are offered
+# Each picked color rules out every histogram color around it through the Lab index,
+# so colors too close to the palette are skipped without being compared again
+class DistinctPicker:
+    def __init__(self, histogram, num_colors, min_distance, metric=DEFAULT_COLOR_DIFFERENCE):
+        self.histogram = histogram
+        self.lab_index = get_lab_index(histogram)
+        self.num_colors = num_colors
+        self.min_distance = min_distance
+        self.metric = metric
+        self.difference = color_difference(metric)
+        self.chosen = []
+        self.chosen_lab = []
+        self.rejected = set()  # Indices of the histogram colors too close to a picked color
+
+    # Returns whether the palette is complete
+    def is_full(self):
+        return len(self.chosen) >= self.num_colors
+
+    # Offers the histogram color at the given index, returning whether it was picked
+    def offer_index(self, index):
+        if index in self.rejected:
+            return False
+        lab = self.lab_index.lab[index]
+        if not self.accept(self.histogram.colors[index], tuple(lab)):
+            self.rejected.add(index)
+            return False
+        return True
+
+    # Offers a color that may not be in the histogram, such as a cluster mean
+    def offer_color(self, color):
+        return self.accept(color, rgb_to_lab(color & 0xFFFFFF))
+
+    # Offers histogram colors by index until the palette is complete
+    def offer_indices(self, indices):
+        for index in indices:
+            if self.is_full():
+                return
+            self.offer_index(index)
+
+    # Completes the palette with the most common colors not picked yet
+    # Used once no color left is far enough, when the image has too few distinct colors
+    def fill(self):
+        picked = set(self.chosen)
+        for color in self.histogram.colors:
+            if self.is_full():
+                break
+            if color not in picked:
+                self.chosen.append(color)
+        return self.chosen
+
+    # Picks a color if it is far enough from every picked color
+    def accept(self, color, lab):
+        if self.is_full() or any(self.difference(lab, other) < self.min_distance for other in self.chosen_lab):
+            return False
+
+        self.chosen.append(color)
+        self.chosen_lab.append(lab)
+        self.rejected.update(self.lab_index.within(lab, self.min_distance, self.metric))
+        return True
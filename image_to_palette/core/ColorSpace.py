@@ -0,0 +1,50 @@
+# NumPy is optional, Krita does not ship it on every platform
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# D65 reference white
+WHITE_X = 0.95047
+WHITE_Y = 1.0
+WHITE_Z = 1.08883
+
+# Linear light value of each 8-bit sRGB channel value
+SRGB_TO_LINEAR = [
+    value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+    for value in (channel / 255.0 for channel in range(256))
+]
+
+# Splits a 0xRRGGBB color into its red, green and blue channels
+def split_rgb(color):
+    return (color >> 16) & 0xFF, (color >> 8) & 0xFF, color & 0xFF
+
+# Compresses an XYZ component for the Lab conversion
+def _lab_f(t):
+    return t ** (1.0 / 3.0) if t > 216.0 / 24389.0 else (24389.0 / 27.0 * t + 16.0) / 116.0
+
+# Converts a 0xRRGGBB color into a CIELAB (L, a, b) tuple
+def rgb_to_lab(color):
+    red, green, blue = (SRGB_TO_LINEAR[channel] for channel in split_rgb(color))
+
+    fx = _lab_f((0.4124564 * red + 0.3575761 * green + 0.1804375 * blue) / WHITE_X)
+    fy = _lab_f((0.2126729 * red + 0.7151522 * green + 0.0721750 * blue) / WHITE_Y)
+    fz = _lab_f((0.0193339 * red + 0.1191920 * green + 0.9503041 * blue) / WHITE_Z)
+
+    return 116.0 * fy - 16.0, 500.0 * (fx - fy), 200.0 * (fy - fz)
+
+# Converts an array of 0xRRGGBB colors into an (N, 3) array of CIELAB values
+def rgb_to_lab_array(colors):
+    colors = np.asarray(colors, dtype=np.int64)
+    table = np.asarray(SRGB_TO_LINEAR)
+    rgb = np.stack([table[(colors >> 16) & 0xFF], table[(colors >> 8) & 0xFF], table[colors & 0xFF]], axis=1)
+
+    xyz = rgb @ np.array([
+        [0.4124564, 0.2126729, 0.0193339],
+        [0.3575761, 0.7151522, 0.1191920],
+        [0.1804375, 0.0721750, 0.9503041],
+    ])
+    xyz /= np.array([WHITE_X, WHITE_Y, WHITE_Z])
+    f = np.where(xyz > 216.0 / 24389.0, np.cbrt(xyz), (24389.0 / 27.0 * xyz + 16.0) / 116.0)
+
+    return np.stack([116.0 * f[:, 1] - 16.0, 500.0 * (f[:, 0] - f[:, 1]), 200.0 * (f[:, 1] - f[:, 2])], axis=1)
@@ -0,0 +1,90 @@
+import os
+import random
+
+from .Instrumentation import span
+from .Bucketing import DEFAULT_PRECISION, EXACT_PRECISION
+from .ColorDistance import DEFAULT_COLOR_DIFFERENCE, DEFAULT_MIN_DISTANCE
+from .ImageDecoder import DEFAULT_SAMPLE_SIZE, load_sample, image_colors, is_streamable, stream_colors
+from .Quantizers import DEFAULT_QUANTIZER, create_quantizer
+from ..model.Palette import Palette
+
+# Number of colors in a generated palette
+PALETTE_SIZE = 10
+
+# Returns the histogram cache variant of the given extraction settings
+# Exact colors keep the variant of earlier versions, so their cached histograms stay valid
+def cache_variant(sample_size, precision=DEFAULT_PRECISION):
+    if precision == EXACT_PRECISION:
+        return f'sample={sample_size}'
+    return f'sample={sample_size},precision={precision}'
+
+# Collects the colors of the image at the given path
+# Returns a ColorHistogram ordered from most to least common,
+# or None if is_cancelled() turned true between two stages
+def extract_colors(image_path, sample_size=DEFAULT_SAMPLE_SIZE, histogram_cache=None, is_cancelled=lambda: False,
+                   precision=DEFAULT_PRECISION):
+    variant = cache_variant(sample_size, precision)
+    if histogram_cache is not None:
+        with span('cache read', image=os.path.basename(image_path)) as cache_span:
+            total_colors = histogram_cache.get(image_path, variant)
+            cache_span.set(hit=total_colors is not None)
+        if total_colors is not None:
+            return total_colors
+
+    # Huge TIFF images Qt would decode whole are streamed one strip or tile at a time instead
+    if is_streamable(image_path):
+        total_colors = stream_colors(image_path, sample_size, is_cancelled, precision)
+        if total_colors is None:
+            return None
+    else:
+        image = load_sample(image_path, sample_size)
+        if is_cancelled():
+            return None
+
+        total_colors = image_colors(image, precision)
+        if is_cancelled():
+            return None
+
+    # The colors were collected, a cache that cannot be written only costs the next open
+    if histogram_cache is not None:
+        with span('cache write', colors=len(total_colors)):
+            try:
+                histogram_cache.put(image_path, total_colors, variant)
+            except OSError as e:
+                print(f"Unable to cache the colors of '{image_path}': {e}")
+    return total_colors
+
+# Returns a new random seed for generate_colors()
+def new_seed():
+    return random.getrandbits(32)
+
+# Picks the colors of a palette from a ColorHistogram
+# The same seed always picks the same colors from the same histogram, method and minimum distance
+def generate_colors(total_colors, quantizer=DEFAULT_QUANTIZER, num_colors=PALETTE_SIZE, seed=None,
+                    min_distance=DEFAULT_MIN_DISTANCE, metric=DEFAULT_COLOR_DIFFERENCE):
+    rng = random.Random(seed) if seed is not None else random.Random()
+    with span('generate palette', method=quantizer, colors=len(total_colors), min_distance=min_distance):
+        return create_quantizer(quantizer).quantize(total_colors, num_colors, rng, min_distance, metric)
+
+# Creates a palette of the given image from its colors and picked palette colors
+def create_palette(image_path, total_colors, palette_colors, seed=None, method=None):
+    palette = Palette()
+    palette.image_name = os.path.basename(image_path)
+    palette.source = image_path
+    palette.total_colors = total_colors
+    palette.seed = seed
+    palette.method = method
+    for color in palette_colors:
+        palette.add_color(color)
+    return palette
+
+# Extracts a palette from the image at the given path
+def extract_palette(image_path, sample_size=DEFAULT_SAMPLE_SIZE, quantizer=DEFAULT_QUANTIZER,
+                    histogram_cache=None, seed=None, precision=DEFAULT_PRECISION,
+                    min_distance=DEFAULT_MIN_DISTANCE, metric=DEFAULT_COLOR_DIFFERENCE):
+    if seed is None:
+        seed = new_seed()
+
+    total_colors = extract_colors(image_path, sample_size, histogram_cache, precision=precision)
+    palette_colors = generate_colors(total_colors, quantizer, PALETTE_SIZE, seed, min_distance, metric)
+    return create_palette(image_path, total_colors, palette_colors, seed, quantizer)
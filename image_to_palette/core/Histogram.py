@@ -0,0 +1,178 @@
+from array import array
+from collections import Counter
+
+from ..model.ColorHistogram import ColorHistogram
+
+# NumPy is optional, Krita does not ship it on every platform
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Alpha bits that QColor.rgb() forces onto every color
+OPAQUE_ALPHA = 0xFF000000
+
+# Converts a premultiplied ARGB pixel into an opaque rgb color
+# Rounds the same way as QImage.pixelColor() so the counts match it exactly
+def unpremultiply(color):
+    alpha = color >> 24
+    if alpha == 0 or alpha == 255:
+        return color | OPAQUE_ALPHA
+
+    half = alpha // 2
+    red = min((((color >> 16) & 0xFF) * 255 + half) // alpha, 255)
+    green = min((((color >> 8) & 0xFF) * 255 + half) // alpha, 255)
+    blue = min(((color & 0xFF) * 255 + half) // alpha, 255)
+    return OPAQUE_ALPHA | (red << 16) | (green << 8) | blue
+
+# Counts the colors in a buffer of 32-bit ARGB pixels
+# Returns a ColorHistogram ordered from most to least common
+def count_pixels(pixels, premultiplied=False):
+    if np is not None:
+        return _count_pixels_numpy(pixels, premultiplied)
+    return _count_pixels_python(pixels, premultiplied)
+
+# Counts the pixels in a single vectorized pass
+def _count_pixels_numpy(pixels, premultiplied):
+    data = np.frombuffer(pixels, dtype=np.uint32)
+    if not premultiplied:
+        data = data | np.uint32(OPAQUE_ALPHA)
+
+    colors, counts = np.unique(data, return_counts=True)
+    return histogram_from_counts(colors, counts, premultiplied)
+
+# Builds a ColorHistogram from NumPy arrays of distinct raw pixels and their counts
+def histogram_from_counts(colors, counts, premultiplied):
+    # Only the distinct raw pixels are unpremultiplied, then merged again
+    if premultiplied:
+        colors, inverse = np.unique(unpremultiply_numpy(colors), return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=counts).astype(np.int64)
+
+    order = np.argsort(-counts, kind='stable')
+    return ColorHistogram(array('I', colors[order].astype(np.uint32).tobytes()),
+                          array('I', counts[order].astype(np.uint32).tobytes()))
+
+# Vectorized version of unpremultiply()
+def unpremultiply_numpy(colors):
+    colors = colors.astype(np.int64)
+    alpha = colors >> 24
+    translucent = (alpha != 0) & (alpha != 255)
+    divisor = np.where(translucent, alpha, 1)
+    half = divisor // 2
+
+    result = np.full(colors.shape, OPAQUE_ALPHA, dtype=np.int64)
+    for shift in (16, 8, 0):
+        channel = (colors >> shift) & 0xFF
+        unpremultiplied = np.minimum((channel * 255 + half) // divisor, 255)
+        result |= np.where(translucent, unpremultiplied, channel) << shift
+
+    return result.astype(np.uint32)
+
+# Counts the pixels with a Counter fed straight from the buffer
+def _count_pixels_python(pixels, premultiplied):
+    raw_counter = Counter(memoryview(pixels).cast('B').cast('I'))
+
+    # Pixels only differing by alpha collapse into the same color
+    to_rgb = unpremultiply if premultiplied else (lambda color: color | OPAQUE_ALPHA)
+    color_counter = Counter()
+    for color, count in raw_counter.items():
+        color_counter[to_rgb(color)] += count
+
+    return ColorHistogram.from_pairs(color_counter.most_common())
+
+# Counts the colors of pixel buffers fed one tile at a time, so an image larger
+# than memory is never materialized as a whole
+class PixelAccumulator:
+    # Distinct colors buffered by the NumPy path before they are merged
+    MERGE_THRESHOLD = 1 << 20
+
+    def __init__(self, premultiplied=False, skip_transparent=False):
+        self.premultiplied = premultiplied
+        self.skip_transparent = skip_transparent  # Whether fully transparent pixels are left out
+
+        # Distinct raw pixels and counts of each tile, merged when they grow too large
+        self.tile_colors = []
+        self.tile_counts = []
+        self.buffered = 0
+        self.counter = Counter()
+
+    # Counts every stride-th pixel of a buffer of 32-bit ARGB pixels
+    # Pixels whose byte in mask (one per pixel, before striding) is 0 are skipped
+    def add(self, pixels, stride=1, mask=None):
+        if np is not None:
+            self._add_numpy(pixels, stride, mask)
+        else:
+            self._add_python(pixels, stride, mask)
+
+    # Returns a ColorHistogram of every pixel added so far
+    def histogram(self):
+        if np is not None:
+            self._merge_numpy()
+            if not self.tile_colors:
+                return ColorHistogram()
+            return histogram_from_counts(self.tile_colors[0], self.tile_counts[0], self.premultiplied)
+
+        to_rgb = unpremultiply if self.premultiplied else (lambda color: color | OPAQUE_ALPHA)
+        color_counter = Counter()
+        for color, count in self.counter.items():
+            color_counter[to_rgb(color)] += count
+        return ColorHistogram.from_pairs(color_counter.most_common())
+
+    def _add_numpy(self, pixels, stride, mask):
+        data = np.frombuffer(pixels, dtype=np.uint32)[::stride]
+        if mask is not None:
+            data = data[np.frombuffer(mask, dtype=np.uint8)[::stride] != 0]
+        if self.skip_transparent:
+            data = data[(data >> 24) != 0]
+        if not self.premultiplied:
+            data = data | np.uint32(OPAQUE_ALPHA)
+        if not len(data):
+            return
+
+        colors, counts = np.unique(data, return_counts=True)
+        self.tile_colors.append(colors)
+        self.tile_counts.append(counts)
+        self.buffered += len(colors)
+        if self.buffered > self.MERGE_THRESHOLD:
+            self._merge_numpy()
+
+    # Merges the buffered tiles into a single set of distinct pixels
+    def _merge_numpy(self):
+        if len(self.tile_colors) <= 1:
+            return
+
+        colors, inverse = np.unique(np.concatenate(self.tile_colors), return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=np.concatenate(self.tile_counts)).astype(np.int64)
+        self.tile_colors = [colors]
+        self.tile_counts = [counts]
+        self.buffered = len(colors)
+
+    def _add_python(self, pixels, stride, mask):
+        data = memoryview(pixels).cast('B').cast('I')[::stride]
+        if mask is not None:
+            data = (color for color, selected in zip(data, memoryview(mask).cast('B')[::stride]) if selected)
+        if self.skip_transparent:
+            data = (color for color in data if color >> 24)
+        self.counter.update(data)
+
+# Adds up the counts of several ColorHistograms of opaque colors
+# Returns a ColorHistogram ordered from most to least common
+def merge_histograms(histograms):
+    histograms = [histogram for histogram in histograms if histogram]
+    if len(histograms) == 1:
+        return histograms[0]
+    if not histograms:
+        return ColorHistogram()
+
+    if np is not None:
+        colors, inverse = np.unique(np.concatenate([np.frombuffer(histogram.colors, dtype=np.uint32)
+                                                    for histogram in histograms]), return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=np.concatenate([np.frombuffer(histogram.counts, dtype=np.uint32)
+                                                                      for histogram in histograms]))
+        return histogram_from_counts(colors, counts.astype(np.int64), False)
+
+    counter = Counter()
+    for histogram in histograms:
+        for color, count in histogram:
+            counter[color] += count
+    return ColorHistogram.from_pairs(counter.most_common())
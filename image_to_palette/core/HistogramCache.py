@@ -0,0 +1,236 @@
+import hashlib
+import json
+import os
+import struct
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+
+from ..model.ColorHistogram import ColorHistogram
+
+# Header of a cached histogram file: magic, format version, number of colors
+CACHE_HEADER = struct.Struct('<4sHI')
+CACHE_MAGIC = b'ITPH'
+CACHE_VERSION = 1
+
+# Default on-disk budget of the cache in bytes
+DEFAULT_CACHE_BUDGET = 64 * 1024 * 1024
+
+# Name of the file holding the cache entries in least to most recently used order
+INDEX_FILE_NAME = 'index.json'
+
+# Size of the blocks read when hashing an image's content
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Cache hits whose new recency is only kept in memory before the index is saved
+# Losing them only makes the eviction order slightly less accurate
+INDEX_SAVE_INTERVAL = 32
+
+# Extension of the files holding the entries
+ENTRY_EXTENSION = '.bin'
+
+# Persistent cache of image color histograms, evicting the least recently used
+# entries once the files exceed the byte budget
+# Entries are keyed by the image path, modification time and size, and optionally
+# by a hash of the image content
+class HistogramCache:
+    def __init__(self, directory, budget=DEFAULT_CACHE_BUDGET, content_hash=False):
+        self.directory = directory
+        self.budget = budget
+        self.content_hash = content_hash
+
+        self.lock = threading.Lock()  # The cache is shared by the worker threads
+        self.entries = None  # Key -> file size, loaded on first use
+        self.unsaved_hits = 0  # Hits since the index was last saved
+
+    # Returns the cached ColorHistogram of the given image, or None if it is not cached
+    # The variant distinguishes histograms of the same image built with different settings
+    def get(self, image_path, variant=''):
+        if self.budget <= 0:
+            return None
+
+        # An image that cannot be read is left for the decoder to report
+        try:
+            key = self.make_key(image_path, variant)
+        except OSError:
+            return None
+
+        with self.lock:
+            self.load_index()
+            if key not in self.entries:
+                return None
+
+            try:
+                total_colors = self.read_entry(key)
+            except (OSError, ValueError, EOFError, struct.error):
+                self.remove_entry(key)
+                self.save_index_quietly()
+                return None
+
+            # Hits only reorder the entries, they are saved in batches
+            self.entries.move_to_end(key)
+            self.unsaved_hits += 1
+            if self.unsaved_hits >= INDEX_SAVE_INTERVAL:
+                self.save_index_quietly()
+            return total_colors
+
+    # Stores the ColorHistogram of the given image
+    def put(self, image_path, total_colors, variant=''):
+        if self.budget <= 0:
+            return
+
+        key = self.make_key(image_path, variant)
+        with self.lock:
+            self.load_index()
+            os.makedirs(self.directory, exist_ok=True)
+            self.entries[key] = self.write_entry(key, total_colors)
+            self.entries.move_to_end(key)
+            self.evict()
+            self.save_index()
+
+    # Saves the recency of the hits not saved yet
+    def flush(self):
+        with self.lock:
+            if self.entries is not None and self.unsaved_hits:
+                self.save_index()
+
+    # Changes the byte budget, evicting entries right away if the cache no longer fits
+    def set_budget(self, budget):
+        with self.lock:
+            self.budget = budget
+            self.load_index()
+            self.evict()
+            self.save_index()
+
+    # Removes every cached histogram
+    def clear(self):
+        with self.lock:
+            self.load_index()
+            for key in list(self.entries):
+                self.remove_entry(key)
+            self.save_index()
+
+    # Builds the cache key of the given image
+    def make_key(self, image_path, variant):
+        image_path = os.path.abspath(image_path)
+        stat = os.stat(image_path)
+        identity = f'{image_path}|{stat.st_mtime_ns}|{stat.st_size}|{variant}'
+        if self.content_hash:
+            identity += f'|{self.hash_content(image_path)}'
+        return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+    # Hashes the content of the given file
+    def hash_content(self, file_path):
+        content_hash = hashlib.sha1()
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+                content_hash.update(block)
+        return content_hash.hexdigest()
+
+    # Returns the path of the file holding the given entry
+    def entry_path(self, key):
+        return os.path.join(self.directory, f'{key}{ENTRY_EXTENSION}')
+
+    # Writes an entry as a header followed by the packed colors and counts
+    # The entry is written next to its file then moved over it, so it is never read half written
+    # Returns the size of the written file
+    def write_entry(self, key, total_colors):
+        colors = total_colors.colors
+        counts = total_colors.counts
+        if sys.byteorder == 'big':
+            colors = array('I', colors)
+            counts = array('I', counts)
+            colors.byteswap()
+            counts.byteswap()
+
+        entry_path = self.entry_path(key)
+        with open(entry_path + '.tmp', 'wb') as file:
+            file.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, len(colors)))
+            file.write(colors)
+            file.write(counts)
+        os.replace(entry_path + '.tmp', entry_path)
+
+        return CACHE_HEADER.size + 8 * len(colors)
+
+    # Reads an entry back into a ColorHistogram
+    def read_entry(self, key):
+        with open(self.entry_path(key), 'rb') as file:
+            magic, version, length = CACHE_HEADER.unpack(file.read(CACHE_HEADER.size))
+            if magic != CACHE_MAGIC or version != CACHE_VERSION:
+                raise ValueError(f"Unsupported histogram cache entry '{key}'.")
+
+            colors = array('I')
+            counts = array('I')
+            colors.fromfile(file, length)
+            counts.fromfile(file, length)
+
+        if sys.byteorder == 'big':
+            colors.byteswap()
+            counts.byteswap()
+        return ColorHistogram(colors, counts)
+
+    # Deletes the file of an entry and forgets it
+    def remove_entry(self, key):
+        self.entries.pop(key, None)
+        try:
+            os.remove(self.entry_path(key))
+        except OSError:
+            pass
+
+    # Removes the least recently used entries until the cache fits in its budget
+    def evict(self):
+        total_size = sum(self.entries.values())
+        while total_size > self.budget and self.entries:
+            key, size = next(iter(self.entries.items()))
+            self.remove_entry(key)
+            total_size -= size
+
+    # Loads the entries from the index file
+    # Entry files missing from the index, left by a crash or an unreadable index, are
+    # taken back as the least recently used entries so they are evicted first
+    def load_index(self):
+        if self.entries is not None:
+            return
+
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE_NAME), 'r') as file:
+                self.entries = OrderedDict(json.load(file))
+        except (OSError, json.JSONDecodeError, TypeError, ValueError):
+            self.entries = OrderedDict()
+
+        try:
+            file_names = os.listdir(self.directory)
+        except OSError:
+            return
+        orphans = OrderedDict()
+        for file_name in file_names:
+            key, extension = os.path.splitext(file_name)
+            if extension == ENTRY_EXTENSION and key not in self.entries:
+                try:
+                    orphans[key] = os.path.getsize(os.path.join(self.directory, file_name))
+                except OSError:
+                    pass
+        if orphans:
+            orphans.update(self.entries)
+            self.entries = orphans
+
+    # Saves the entries to the index file
+    # The index is written next to its file then moved over it, so a crash never leaves it empty
+    def save_index(self):
+        self.unsaved_hits = 0
+        if not os.path.isdir(self.directory):
+            return
+
+        index_path = os.path.join(self.directory, INDEX_FILE_NAME)
+        with open(index_path + '.tmp', 'w') as file:
+            json.dump(list(self.entries.items()), file)
+        os.replace(index_path + '.tmp', index_path)
+
+    # Saves the index on reads, where a read-only or full cache directory must not fail the read
+    # The index is only out of date, entries missing from it are taken back on the next load
+    def save_index_quietly(self):
+        try:
+            self.save_index()
+        except OSError as e:
+            print(f"Unable to save the histogram cache index: {e}")
@@ -0,0 +1,145 @@
+import os
+import struct
+from functools import lru_cache
+
+from PyQt5.QtGui import QImage, QImageReader, QPixelFormat
+from PyQt5.QtCore import Qt
+
+from .Bucketing import DEFAULT_PRECISION, EXACT_PRECISION, create_accumulator
+from .Histogram import count_pixels
+from .Instrumentation import span
+from .TiffReader import TiffReader
+from ..model.ColorHistogram import ColorHistogram
+
+# Width and height of the box an image is scaled into before counting
+# A sample size of 0 keeps the image at its full resolution
+DEFAULT_SAMPLE_SIZE = 100
+
+# Extensions of the image files palettes can be created from when Qt has no
+# image format plugins to report
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.bmp')
+
+# Extensions of the layered documents only Krita itself can open
+KRITA_DOCUMENT_EXTENSIONS = ('.kra', '.krz', '.ora', '.psd')
+
+# TIFF images with more pixels than this are read one strip or tile at a time rather
+# than decoded whole by Qt, so memory stays bounded whatever the file size
+STREAMING_PIXEL_THRESHOLD = 32 * 1024 * 1024
+
+# Extensions of the images that can be streamed
+STREAMING_EXTENSIONS = ('.tif', '.tiff')
+
+# Quality hint asking codecs for smooth rather than fast scaling while decoding
+SCALED_DECODE_QUALITY = 100
+
+# Returns the extensions of every image format Qt can read, such as .webp, .tif or .gif
+@lru_cache(maxsize=None)
+def image_extensions():
+    formats = [bytes(image_format).decode('ascii').lower() for image_format in QImageReader.supportedImageFormats()]
+    return tuple(f'.{image_format}' for image_format in formats) or IMAGE_EXTENSIONS
+
+# Returns whether the given path names an image Qt can read, ignoring the case of its extension
+def is_image_file(file_name):
+    return file_name.lower().endswith(image_extensions())
+
+# Returns whether the given path names a document only Krita can open
+def is_krita_document(file_name):
+    return file_name.lower().endswith(KRITA_DOCUMENT_EXTENSIONS) and not is_image_file(file_name)
+
+# Returns the step between sampled pixels so a width x height region
+# fits within a sample_size x sample_size box, 1 keeping every pixel
+def sample_stride(width, height, sample_size=DEFAULT_SAMPLE_SIZE):
+    if sample_size <= 0:
+        return 1
+    return max(-(-max(width, height) // sample_size), 1)
+
+# Returns the raw 32-bit ARGB pixel buffer of the given image without copying it
+# The image must be kept alive for as long as the buffer is in use
+def image_pixels(image):
+    pixels = image.constBits()
+    pixels.setsize(image.sizeInBytes())
+    return pixels
+
+# Returns whether the pixels of the given image are stored premultiplied by alpha
+def is_premultiplied(image):
+    return image.hasAlphaChannel() and image.pixelFormat().premultiplied() == QPixelFormat.Premultiplied
+
+# Counts the colors of the given image, at the given precision
+# Returns a ColorHistogram ordered from most to least common
+def image_colors(image, precision=DEFAULT_PRECISION):
+    if image.isNull():
+        return ColorHistogram()
+
+    # Use a fixed 32-bit format so a pixel is one uint32
+    with span('count colors', pixels=image.width() * image.height()) as count_span:
+        premultiplied = is_premultiplied(image)
+        target_format = QImage.Format_ARGB32_Premultiplied if premultiplied else QImage.Format_ARGB32
+        if image.format() != target_format:
+            image = image.convertToFormat(target_format)
+
+        if precision == EXACT_PRECISION:
+            total_colors = count_pixels(image_pixels(image), premultiplied)
+        else:
+            accumulator = create_accumulator(premultiplied, precision=precision)
+            accumulator.add(image_pixels(image))
+            total_colors = accumulator.histogram()
+        count_span.set(colors=len(total_colors), precision=precision)
+    return total_colors
+
+# Loads the image at the given path scaled to fit within a sample_size x sample_size box
+# The scaled size is handed to the codec before decoding, so codecs able to decode at
+# a reduced size (JPEG scales in the DCT domain) never materialize the full image
+def load_sample(image_path, sample_size=DEFAULT_SAMPLE_SIZE):
+    reader = QImageReader(image_path)
+    reader.setQuality(SCALED_DECODE_QUALITY)
+
+    source_size = reader.size()
+    if sample_size > 0 and source_size.isValid():
+        target_size = source_size.scaled(sample_size, sample_size, Qt.KeepAspectRatio)
+        if target_size.width() < source_size.width() or target_size.height() < source_size.height():
+            reader.setScaledSize(target_size)
+
+    with span('decode', image=os.path.basename(image_path), format=bytes(reader.format()).decode()) as decode_span:
+        image = reader.read()
+        decode_span.set(pixels=image.width() * image.height(), scaled_by_codec=reader.scaledSize().isValid())
+    if image.isNull():
+        raise ValueError(f"Unable to read the image '{image_path}': {reader.errorString()}")
+
+    # Formats that cannot report their size up front are scaled after decoding
+    if sample_size > 0 and (image.width() > sample_size or image.height() > sample_size):
+        with span('scale', pixels=image.width() * image.height()):
+            image = image.scaled(sample_size, sample_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+    return image
+
+# Returns whether the image at the given path is better streamed one strip or tile at a time
+# That is when it is a huge TIFF image TiffReader can read, Qt's TIFF plugin decoding it whole
+# Other formats are decoded by load_sample, scaled by the codec where it can
+def is_streamable(image_path):
+    if not image_path.lower().endswith(STREAMING_EXTENSIONS):
+        return False
+    try:
+        reader = TiffReader(image_path)
+    except (OSError, ValueError, struct.error):
+        return False
+    return reader.width * reader.height > STREAMING_PIXEL_THRESHOLD
+
+# Counts the colors of a TIFF image read one strip or tile at a time
+# Like load_sample, only every few pixels are counted so the image fits within a
+# sample_size x sample_size box, 0 counting every pixel, and the strips or tiles
+# without a counted row are never read
+# Returns a ColorHistogram ordered from most to least common,
+# or None if is_cancelled() turned true between two strips or tiles
+def stream_colors(image_path, sample_size=DEFAULT_SAMPLE_SIZE, is_cancelled=lambda: False,
+                  precision=DEFAULT_PRECISION):
+    reader = TiffReader(image_path)
+    stride = sample_stride(reader.width, reader.height, sample_size)
+    accumulator = create_accumulator(reader.premultiplied, precision=precision)
+
+    with span('stream decode', image=os.path.basename(image_path), pixels=reader.width * reader.height, stride=stride):
+        for pixels in reader.bands(stride):
+            if is_cancelled():
+                return None
+            accumulator.add(pixels)
+
+        return accumulator.histogram()
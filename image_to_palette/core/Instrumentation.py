@@ -0,0 +1,171 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+#---------------------------------------------------------#
+# Timing and memory spans around the stages of the        #
+# extraction pipeline. Spans are recorded into a bounded  #
+# ring buffer, shown in the debug panel and dumped as a   #
+# Chrome trace. While disabled a span is a shared no-op.  #
+#---------------------------------------------------------#
+
+# Number of spans kept, the oldest are dropped first
+TRACE_BUFFER_SIZE = 1000
+
+# Resetting the allocation peak needs Python 3.9, older versions report the peak since tracing started
+RESET_PEAK = getattr(tracemalloc, 'reset_peak', None)
+
+# Span returned while instrumentation is disabled, entering it records nothing
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+    # Ignores the fields of a disabled span
+    def set(self, **fields):
+        pass
+
+NULL_SPAN = NullSpan()
+
+# Times a pipeline stage, recording it into its tracer when it ends
+# Fields, such as the number of pixels read, can be added while the stage runs
+class Span:
+    __slots__ = ('tracer', 'name', 'fields', 'start', 'memory_start')
+
+    def __init__(self, tracer, name, fields):
+        self.tracer = tracer
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        self.memory_start = self.tracer.begin_memory()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        end = time.perf_counter()
+        self.tracer.record({
+            "name": self.name,
+            "thread": threading.current_thread().name,
+            "start": self.start - self.tracer.epoch,
+            "duration_ms": (end - self.start) * 1000,
+            "peak_bytes": self.tracer.end_memory(self.memory_start),
+            "fields": self.fields,
+            "error": repr(exc) if exc is not None else None,
+        })
+        return False
+
+    # Adds fields to the span
+    def set(self, **fields):
+        self.fields.update(fields)
+
+# Collects the spans of every thread into a ring buffer
+class Tracer:
+    def __init__(self, size=TRACE_BUFFER_SIZE):
+        self.enabled = False
+        self.track_memory = False
+        self.epoch = time.perf_counter()
+        self.events = deque(maxlen=size)
+        self.lock = threading.Lock()
+        self.open_spans = 0  # Spans measuring memory, the allocation peak is only reset when none is open
+        self.started_tracemalloc = False
+        self.startup_costs = {}  # Startup step -> seconds, recorded whether spans are enabled or not
+
+    # Returns a span timing the stage with the given name, or a no-op span when disabled
+    def span(self, name, **fields):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, fields)
+
+    # Enables or disables recording spans
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        if not enabled:
+            self.set_track_memory(False)
+
+    # Enables or disables measuring the peak allocation of spans
+    # Tracing allocations slows every allocation down, so it is only on when asked for
+    def set_track_memory(self, track_memory):
+        self.track_memory = track_memory
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+        elif not track_memory and self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+
+    # Returns the traced memory at the start of a span, or None if memory isn't tracked
+    # Spans running at the same time share the process allocation peak, theirs is an upper bound
+    def begin_memory(self):
+        if not self.track_memory or not tracemalloc.is_tracing():
+            return None
+        with self.lock:
+            if self.open_spans == 0 and RESET_PEAK is not None:
+                RESET_PEAK()
+            self.open_spans += 1
+        return tracemalloc.get_traced_memory()[0]
+
+    # Returns the peak allocation of a span over the memory traced when it started
+    def end_memory(self, memory_start):
+        if memory_start is None:
+            return None
+        with self.lock:
+            self.open_spans = max(0, self.open_spans - 1)
+        if not tracemalloc.is_tracing():
+            return None
+        return max(0, tracemalloc.get_traced_memory()[1] - memory_start)
+
+    # Records the time a startup step took, measured once per Krita session
+    def record_startup(self, name, seconds):
+        self.startup_costs[name] = seconds
+
+    # Adds a finished span to the ring buffer
+    def record(self, event):
+        with self.lock:
+            self.events.append(event)
+
+    # Returns the recorded spans, oldest first
+    def snapshot(self):
+        with self.lock:
+            return list(self.events)
+
+    # Drops every recorded span
+    def clear(self):
+        with self.lock:
+            self.events.clear()
+
+    # Writes the recorded spans as a Chrome trace, viewable in chrome://tracing or Perfetto
+    def dump(self, file_name):
+        threads = {}
+        trace_events = []
+        for event in self.snapshot():
+            thread_id = threads.setdefault(event["thread"], len(threads) + 1)
+            args = dict(event["fields"])
+            if event["peak_bytes"] is not None:
+                args["peak_bytes"] = event["peak_bytes"]
+            if event["error"] is not None:
+                args["error"] = event["error"]
+            trace_events.append({"name": event["name"], "ph": "X", "pid": os.getpid(), "tid": thread_id,
+                                 "ts": event["start"] * 1e6, "dur": event["duration_ms"] * 1e3, "args": args})
+        for thread_name, thread_id in threads.items():
+            trace_events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": thread_id,
+                                 "args": {"name": thread_name}})
+
+        with open(file_name, 'w') as file:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms",
+                       "startupCostsMs": {name: seconds * 1000 for name, seconds in self.startup_costs.items()}},
+                      file, default=str)
+
+# Tracer shared by the whole plugin, workers record into it from their threads
+tracer = Tracer()
+
+# Returns a span timing the stage with the given name on the shared tracer
+def span(name, **fields):
+    return tracer.span(name, **fields)
@@ -0,0 +1,145 @@
+import contextlib
+import itertools
+import os
+import struct
+import zipfile
+from xml.sax.saxutils import quoteattr
+
+from .ColorSpace import split_rgb
+
+#---------------------------------------------------------#
+# Exporters to the palette formats of other applications. #
+# Every writer takes an iterable of palettes and writes   #
+# them one at a time, as a group each, so exporting a     #
+# whole history or library never holds it in memory.      #
+#---------------------------------------------------------#
+
+# Extensions of the exported palette formats
+KPL_EXTENSION = '.kpl'
+GPL_EXTENSION = '.gpl'
+ASE_EXTENSION = '.ase'
+EXPORT_EXTENSIONS = (KPL_EXTENSION, GPL_EXTENSION, ASE_EXTENSION)
+
+# Number of swatch columns of exported palettes, matching the docker grid
+EXPORT_COLUMNS = 5
+
+# Krita palettes are zip files holding a mimetype, the colors and their profiles
+KPL_MIMETYPE = 'krita/x-colorset'
+KPL_PROFILE = 'sRGB-elle-V2-srgbtrc.icc'
+
+# Adobe swatch exchange block types
+ASE_GROUP_START = 0xC001
+ASE_GROUP_END = 0xC002
+ASE_COLOR_ENTRY = 0x0001
+ASE_COLOR_TYPE_GLOBAL = 0
+
+# Returns whether the given path names a palette format palettes are exported to
+def is_export_format(file_name):
+    return file_name.lower().endswith(EXPORT_EXTENSIONS)
+
+# Returns the name of a group of exported swatches
+def group_name(palette, index):
+    return palette.image_name or f"Palette {index + 1}"
+
+# Exports palettes to the format given by the file extension
+# Returns the number of palettes written
+def export_palettes(file_name, palettes, name=None):
+    name = name or os.path.splitext(os.path.basename(file_name))[0]
+    writer = {KPL_EXTENSION: write_kpl, GPL_EXTENSION: write_gpl, ASE_EXTENSION: write_ase}
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension not in writer:
+        raise ValueError(f"Unsupported palette format '{extension}'.")
+
+    # A failed write leaves the destination as it was and removes its partial copy
+    temp_name = f'{file_name}.tmp'
+    try:
+        count = writer[extension](temp_name, palettes, name)
+        os.replace(temp_name, file_name)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_name)
+        raise
+    return count
+
+# Writes a GIMP palette, the swatches of each palette following a comment naming it
+def write_gpl(file_name, palettes, name):
+    count = 0
+    with open(file_name, 'w', encoding='utf-8') as file:
+        file.write(f"GIMP Palette\nName: {name}\nColumns: {EXPORT_COLUMNS}\n#\n")
+        for index, palette in enumerate(palettes):
+            group = group_name(palette, index).replace('\n', ' ')
+            file.write(f"# {group}\n")
+            for position, color in enumerate(palette.cur_colors):
+                red, green, blue = split_rgb(color)
+                file.write(f"{red:3d} {green:3d} {blue:3d}\t{group} {position + 1}\n")
+            count += 1
+    return count
+
+# Writes a Krita palette, each palette as a group of swatches
+# A single palette keeps its swatches in the default group, like palettes made in Krita
+# The colorset is streamed into the zip entry rather than built in memory
+def write_kpl(file_name, palettes, name):
+    # Peek at the first two palettes to tell a single palette from several
+    palettes = iter(palettes)
+    head = list(itertools.islice(palettes, 2))
+    single = len(head) == 1
+    count = 0
+
+    with zipfile.ZipFile(file_name, 'w') as archive:
+        # The mimetype comes first and uncompressed so the file type can be sniffed
+        archive.writestr(zipfile.ZipInfo('mimetype'), KPL_MIMETYPE, compress_type=zipfile.ZIP_STORED)
+        archive.writestr('profiles.xml', '<?xml version="1.0" encoding="UTF-8"?>\n<Profiles/>\n',
+                         compress_type=zipfile.ZIP_DEFLATED)
+
+        with archive.open('colorset.xml', 'w') as entry:
+            def write(text):
+                entry.write(text.encode('utf-8'))
+
+            rows = -(-len(head[0].cur_colors) // EXPORT_COLUMNS) if single else 0
+            write('<?xml version="1.0" encoding="UTF-8"?>\n')
+            write(f'<ColorSet version="2.0" name={quoteattr(name)} comment="" columns="{EXPORT_COLUMNS}" rows="{rows}" readonly="false">\n')
+            for index, palette in enumerate(itertools.chain(head, palettes)):
+                if not single:
+                    rows = -(-len(palette.cur_colors) // EXPORT_COLUMNS)
+                    write(f' <Group name={quoteattr(group_name(palette, index))} rows="{rows}">\n')
+                for position, color in enumerate(palette.cur_colors):
+                    red, green, blue = split_rgb(color)
+                    write(f'  <ColorSetEntry name="#{color & 0xFFFFFF:06x}" id="" spot="false" bitdepth="U8">\n'
+                          f'   <RGB r="{red / 255:.6f}" g="{green / 255:.6f}" b="{blue / 255:.6f}" space="{KPL_PROFILE}"/>\n'
+                          f'   <Position row="{position // EXPORT_COLUMNS}" column="{position % EXPORT_COLUMNS}"/>\n'
+                          f'  </ColorSetEntry>\n')
+                if not single:
+                    write(' </Group>\n')
+                count += 1
+            write('</ColorSet>\n')
+    return count
+
+# Packs an ASE name, a null terminated UTF-16 string prefixed by its length
+def ase_name(name):
+    encoded = (name + '\0').encode('utf-16-be')
+    return struct.pack('>H', len(encoded) // 2) + encoded
+
+# Writes an ASE block of the given type
+def write_ase_block(file, block_type, data=b''):
+    file.write(struct.pack('>HI', block_type, len(data)))
+    file.write(data)
+
+# Writes an Adobe swatch exchange file, each palette as a group of swatches
+# The block count is only known at the end, it is patched into the header once written
+def write_ase(file_name, palettes, name):
+    count = blocks = 0
+    with open(file_name, 'wb') as file:
+        file.write(b'ASEF' + struct.pack('>HHI', 1, 0, 0))
+        for index, palette in enumerate(palettes):
+            write_ase_block(file, ASE_GROUP_START, ase_name(group_name(palette, index)))
+            for color in palette.cur_colors:
+                red, green, blue = split_rgb(color)
+                write_ase_block(file, ASE_COLOR_ENTRY, ase_name(f'#{color & 0xFFFFFF:06x}') + b'RGB '
+                                + struct.pack('>fffH', red / 255, green / 255, blue / 255, ASE_COLOR_TYPE_GLOBAL))
+            write_ase_block(file, ASE_GROUP_END)
+            blocks += len(palette.cur_colors) + 2
+            count += 1
+
+        file.seek(8)
+        file.write(struct.pack('>I', blocks))
+    return count
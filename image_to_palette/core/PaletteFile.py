@@ -0,0 +1,193 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import weakref
+from array import array
+
+from ..model.ColorHistogram import ColorHistogram
+
+#---------------------------------------------------------#
+# Binary palette file layout, all values little-endian:   #
+#   magic 'ITPL', version u16, reserved u16,              #
+#   header size u32, histogram offset u64, colors u32     #
+#   header: utf-8 json with the image name and colors     #
+#   histogram: colors u32[n] then counts u32[n], 8-byte   #
+#   aligned so it can be memory mapped                    #
+#---------------------------------------------------------#
+FILE_HEADER = struct.Struct('<4sHHIQI')
+FILE_MAGIC = b'ITPL'
+FILE_VERSION = 1
+HISTOGRAM_ALIGNMENT = 8
+
+# Extension of binary palette files
+BINARY_PALETTE_EXTENSION = '.itpal'
+
+# Returns whether the given path names a binary palette file
+def is_binary_palette(file_name):
+    return file_name.lower().endswith(BINARY_PALETTE_EXTENSION)
+
+# Histograms currently mapping a file, released before that file is replaced
+_mapped_histograms = weakref.WeakValueDictionary()  # id -> histogram, histograms are unhashable
+
+# Returns a path normalized for comparison with other paths
+def _normalized_path(file_name):
+    return os.path.normcase(os.path.abspath(file_name))
+
+# Copies every histogram mapped from the given file into memory and unmaps it
+# Windows cannot replace a file while it is mapped
+def release_mapped_histograms(file_name):
+    file_name = _normalized_path(file_name)
+    for histogram in list(_mapped_histograms.values()):
+        if _normalized_path(histogram.file_name) == file_name:
+            histogram.release()
+
+# Histogram of a binary palette file, only mapped into memory on first use
+class MappedColorHistogram(ColorHistogram):
+    __slots__ = ('file_name', 'offset', 'length', 'mapped', 'mapping', '__weakref__')
+
+    def __init__(self, file_name, offset, length):
+        self.file_name = file_name
+        self.offset = offset
+        self.length = length
+        self.mapped = None
+        self.mapping = None  # Memory map of the file, until released
+        self.sampling_index = None
+        self.lab_index = None
+
+    @property
+    def colors(self):
+        return self.map()[0]
+
+    @property
+    def counts(self):
+        return self.map()[1]
+
+    def __len__(self):
+        return self.length
+
+    # Maps the histogram section of the file, returning its colors and counts
+    def map(self):
+        if self.mapped is None:
+            if self.length == 0:
+                self.mapped = (array('I'), array('I'))
+            elif sys.byteorder == 'big':
+                self.mapped = self.read_swapped()
+            else:
+                with open(self.file_name, 'rb') as file:
+                    self.mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                view = memoryview(self.mapping)
+                end = self.offset + 4 * self.length
+                self.mapped = (view[self.offset:end].cast('I'), view[end:end + 4 * self.length].cast('I'))
+                _mapped_histograms[id(self)] = self
+        return self.mapped
+
+    # Copies the histogram into memory and unmaps the file
+    # The map stays open if a view of it is still in use elsewhere, until that view is dropped
+    def release(self):
+        if self.mapping is None:
+            return
+        mapped = self.mapped
+        self.mapped = (array('I', mapped[0]), array('I', mapped[1]))
+        _mapped_histograms.pop(id(self), None)
+        for view in mapped:
+            view.release()
+        try:
+            self.mapping.close()
+        except BufferError:
+            pass
+        self.mapping = None
+
+    # Reads the histogram section into memory, converting it to big-endian
+    def read_swapped(self):
+        colors = array('I')
+        counts = array('I')
+        with open(self.file_name, 'rb') as file:
+            file.seek(self.offset)
+            colors.fromfile(file, self.length)
+            counts.fromfile(file, self.length)
+        colors.byteswap()
+        counts.byteswap()
+        return colors, counts
+
+    # Returns an in-memory copy that no longer depends on the file
+    def materialize(self):
+        colors, counts = self.map()
+        return ColorHistogram(array('I', colors), array('I', counts))
+
+# Writes the palette to a binary palette file
+# The file is written next to its destination and moved over it, so histograms
+# still mapped from a previous version of the file stay valid on every platform
+# but Windows, where they are copied into memory and unmapped first
+def write_palette(file_name, palette):
+    histogram = palette.total_colors
+    if isinstance(histogram, MappedColorHistogram):
+        histogram = histogram.materialize()
+
+    header = json.dumps({
+        "image_name": palette.image_name,
+        "current_colors": [f'#{color:06x}' for color in palette.cur_colors],
+        "seed": palette.seed,
+        "method": palette.method,
+    }).encode('utf-8')
+    histogram_offset = FILE_HEADER.size + len(header)
+    padding = -histogram_offset % HISTOGRAM_ALIGNMENT
+    histogram_offset += padding
+
+    colors = histogram.colors
+    counts = histogram.counts
+    if sys.byteorder == 'big':
+        colors = array('I', colors)
+        counts = array('I', counts)
+        colors.byteswap()
+        counts.byteswap()
+
+    temp_name = f'{file_name}.tmp'
+    with open(temp_name, 'wb') as file:
+        file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, 0, len(header), histogram_offset, len(histogram)))
+        file.write(header)
+        file.write(b'\0' * padding)
+        file.write(colors)
+        file.write(counts)
+    if os.name == 'nt':
+        release_mapped_histograms(file_name)
+    os.replace(temp_name, file_name)
+
+# Reads only the header of a binary palette file into the given palette
+# The histogram is left in the file and mapped the first time it is used
+def read_palette(file_name, palette):
+    with open(file_name, 'rb') as file:
+        data = file.read(FILE_HEADER.size)
+        if len(data) < FILE_HEADER.size:
+            raise ValueError(f"'{file_name}' is not a palette file.")
+        magic, version, _, header_size, histogram_offset, length = FILE_HEADER.unpack(data)
+        if magic != FILE_MAGIC:
+            raise ValueError(f"'{file_name}' is not a palette file.")
+        if version != FILE_VERSION:
+            raise ValueError(f"Unsupported palette file version {version}.")
+
+        # A truncated or corrupt file is refused here rather than when its histogram is first mapped
+        if (FILE_HEADER.size + header_size > histogram_offset
+                or histogram_offset + length * 8 > os.fstat(file.fileno()).st_size):
+            raise ValueError(f"'{file_name}' is truncated or corrupt.")
+        header = json.loads(file.read(header_size).decode('utf-8'))
+
+    palette.from_json(header)
+    palette.total_colors = MappedColorHistogram(file_name, histogram_offset, length)
+
+# Saves the palette as a json or binary file, depending on the file extension
+def save_palette_file(file_name, palette):
+    if is_binary_palette(file_name):
+        write_palette(file_name, palette)
+    else:
+        with open(file_name, 'w') as file:
+            json.dump(palette.to_json(), file)
+
+# Loads a json or binary palette file, depending on the file extension, into the given palette
+def load_palette_file(file_name, palette):
+    if is_binary_palette(file_name):
+        read_palette(file_name, palette)
+    else:
+        with open(file_name, 'r') as file:
+            palette.from_json(json.load(file))
@@ -0,0 +1,308 @@
+import heapq
+import json
+import math
+import os
+import sqlite3
+from array import array
+from itertools import product
+
+from .ColorSpace import np, rgb_to_lab, rgb_to_lab_array
+from .PaletteFile import BINARY_PALETTE_EXTENSION, load_palette_file
+from ..model.Palette import Palette
+
+# Version of the index schema, stored as the database user_version
+INDEX_VERSION = 1
+
+# Extensions of the palette files indexed in a folder
+PALETTE_FILE_EXTENSIONS = ('.json', BINARY_PALETTE_EXTENSION)
+
+# Centers of the Lab bins signatures are made of, on each of the L, a and b axes
+SIGNATURE_AXES = (
+    (10.0, 30.0, 50.0, 70.0, 90.0),
+    (-60.0, -30.0, 0.0, 30.0, 60.0),
+    (-60.0, -30.0, 0.0, 30.0, 60.0),
+)
+SIGNATURE_CENTERS = list(product(*SIGNATURE_AXES))
+SIGNATURE_SPACING = tuple(axis[1] - axis[0] for axis in SIGNATURE_AXES)
+SIGNATURE_LENGTH = len(SIGNATURE_CENTERS)
+
+# Spread of each color over the bins around it, in bin spacings
+# Colors are spread so near identical colors land in overlapping bins rather than
+# being told apart by a bin edge
+SIGNATURE_SPREAD = 0.6
+
+# Most common colors of an image histogram its signature is computed from
+SIGNATURE_IMAGE_COLORS = 4096
+
+# Files read between two commits while updating the index
+UPDATE_BATCH_SIZE = 200
+
+# Number of closest palettes returned by a search
+DEFAULT_TOP_K = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+    path TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    folder TEXT NOT NULL,
+    modified REAL NOT NULL,
+    size INTEGER NOT NULL,
+    image_name TEXT,
+    colors TEXT,
+    signature BLOB
+);
+CREATE INDEX IF NOT EXISTS files_folder ON files (folder);
+"""
+
+# Returns the signature of a set of colors, a unit vector of SIGNATURE_LENGTH float32 values
+# Each color is spread over the Lab bins around it and weighted by its count, all counting
+# once without weights, so the dot product of two signatures is their similarity from 0 to 1
+def color_signature(colors, weights=None):
+    if np is not None:
+        return _color_signature_numpy(colors, weights)
+    return _color_signature_python(colors, weights)
+
+# Spreads every color over every bin in a single vectorized pass
+def _color_signature_numpy(colors, weights):
+    colors = np.asarray(colors, dtype=np.int64) & 0xFFFFFF
+    if not len(colors):
+        return array('f', bytes(4 * SIGNATURE_LENGTH))
+
+    distances = (((rgb_to_lab_array(colors)[:, None, :] - np.array(SIGNATURE_CENTERS)[None, :, :])
+                  / np.array(SIGNATURE_SPACING)) ** 2).sum(axis=2)
+    spread = np.exp(-distances / (2 * SIGNATURE_SPREAD ** 2))
+    spread /= spread.sum(axis=1, keepdims=True)
+    if weights is not None:
+        spread *= np.asarray(weights, dtype=np.float64)[:, None]
+
+    signature = spread.sum(axis=0)
+    norm = np.sqrt((signature ** 2).sum())
+    if norm > 0:
+        signature /= norm
+    return array('f', signature.astype(np.float32).tobytes())
+
+# Spreads the colors over the bins one color at a time
+def _color_signature_python(colors, weights):
+    signature = [0.0] * SIGNATURE_LENGTH
+    for index, color in enumerate(colors):
+        lab = rgb_to_lab(color & 0xFFFFFF)
+        spread = [math.exp(-sum(((value - center) / spacing) ** 2
+                                for value, center, spacing in zip(lab, centers, SIGNATURE_SPACING))
+                           / (2 * SIGNATURE_SPREAD ** 2))
+                  for centers in SIGNATURE_CENTERS]
+        scale = (weights[index] if weights is not None else 1) / sum(spread)
+        for bin_index, value in enumerate(spread):
+            signature[bin_index] += value * scale
+
+    norm = math.sqrt(sum(value * value for value in signature))
+    return array('f', (value / norm for value in signature) if norm > 0 else signature)
+
+# Returns the signature of the swatches of a palette
+def palette_signature(palette):
+    return color_signature(palette.cur_colors)
+
+# Returns the signature of an image from its ColorHistogram, weighted by pixel count
+def image_signature(histogram):
+    length = min(len(histogram), SIGNATURE_IMAGE_COLORS)
+    return color_signature(histogram.colors[:length], histogram.counts[:length])
+
+# Returns the dot product of two signatures
+def similarity(signature, other):
+    return sum(a * b for a, b in zip(signature, other))
+
+# Returns whether a path is the given folder or lies inside it
+def is_within(path, folder):
+    path, folder = os.path.normcase(path), os.path.normcase(folder)
+    try:
+        return os.path.commonpath((path, folder)) == folder
+    except ValueError:  # Paths on different drives
+        return False
+
+# Palette file returned by index searches
+class IndexEntry:
+    __slots__ = ('path', 'image_name', 'colors', 'similarity')
+
+    def __init__(self, path, image_name, colors, similarity):
+        self.path = path
+        self.image_name = image_name
+        self.colors = colors  # Hex strings of the palette colors
+        self.similarity = similarity
+
+# Index of the palette files of a set of folders, backed by SQLite
+# Each file is stored with a fixed-length signature of its swatches and the modification
+# time it was read at, so an update only reads the files added or changed since
+# Searches compare a signature with every indexed one, held in memory as one matrix
+class PaletteIndex:
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.connection = None  # Opened on first use
+        self.paths = None  # Paths and signatures of the indexed palettes, loaded on the first search
+        self.signatures = None
+
+    # Returns the database connection, creating the database if needed
+    def connect(self):
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.file_name) or '.', exist_ok=True)
+            self.connection = sqlite3.connect(self.file_name)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            if self.connection.execute('PRAGMA user_version').fetchone()[0] != INDEX_VERSION:
+                with self.connection:
+                    self.connection.executescript(SCHEMA)
+                    self.connection.execute(f'PRAGMA user_version={INDEX_VERSION}')
+        return self.connection
+
+    # Closes the database connection
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    # Returns the indexed folders
+    def folders(self):
+        return [row[0] for row in self.connect().execute('SELECT path FROM folders ORDER BY path')]
+
+    # Adds a folder to the index, its files are read by the next update
+    # Folders never overlap, so each file belongs to a single folder: a folder inside an
+    # indexed one is already covered, and indexed folders inside a new one are merged into it
+    # Returns the indexed folder covering the given one
+    def add_folder(self, folder):
+        folder = os.path.abspath(folder)
+        folders = self.folders()
+        for indexed in folders:
+            if is_within(folder, indexed):
+                return indexed
+
+        inner = [(indexed,) for indexed in folders if is_within(indexed, folder)]
+        connection = self.connect()
+        with connection:
+            connection.executemany('UPDATE files SET folder = ? WHERE folder = ?', ((folder, path) for path, in inner))
+            connection.executemany('DELETE FROM folders WHERE path = ?', inner)
+            connection.execute('INSERT INTO folders (path) VALUES (?)', (folder,))
+        return folder
+
+    # Removes a folder and its files from the index
+    def remove_folder(self, folder):
+        connection = self.connect()
+        with connection:
+            connection.execute('DELETE FROM folders WHERE path = ?', (folder,))
+            connection.execute('DELETE FROM files WHERE folder = ?', (folder,))
+        self.invalidate()
+
+    # Returns the number of indexed palettes
+    def count(self):
+        return self.connect().execute('SELECT COUNT(*) FROM files WHERE signature IS NOT NULL').fetchone()[0]
+
+    # Reads the files added or changed in the indexed folders since the last update,
+    # and drops the files removed from them
+    # Returns (files read, files removed, directories scanned),
+    # or None if is_cancelled() turned true, keeping the files read so far
+    def update(self, is_cancelled=lambda: False):
+        connection = self.connect()
+        read = removed = 0
+        directories = []
+        folders = self.folders()
+        for folder in folders:
+            # Indexes written before folders were merged may still hold nested folders
+            if any(other != folder and is_within(folder, other) for other in folders):
+                continue
+
+            indexed = {path: (modified, size) for path, modified, size in
+                       connection.execute('SELECT path, modified, size FROM files WHERE folder = ?', (folder,))}
+
+            rows = []
+            for root, _, files in os.walk(folder):
+                directories.append(root)
+                for file_name in files:
+                    if not file_name.lower().endswith(PALETTE_FILE_EXTENSIONS):
+                        continue
+                    path = os.path.join(root, file_name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+
+                    if indexed.pop(path, None) == (stat.st_mtime, stat.st_size):
+                        continue
+                    rows.append(self.read_file(path, folder, stat))
+                    if len(rows) >= UPDATE_BATCH_SIZE:
+                        if is_cancelled():
+                            return None
+                        self.write_rows(rows)
+                        read += len(rows)
+                        rows = []
+
+            self.write_rows(rows)
+            read += len(rows)
+            if indexed:
+                with connection:
+                    connection.executemany('DELETE FROM files WHERE path = ?', ((path,) for path in indexed))
+                removed += len(indexed)
+
+        return read, removed, directories
+
+    # Returns the files table row of a palette file
+    # Files that are not palettes are kept without a signature, so they are not read again
+    def read_file(self, path, folder, stat):
+        palette = Palette()
+        try:
+            load_palette_file(path, palette)
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            print(f"Unable to index '{path}': {e}")
+            return path, folder, stat.st_mtime, stat.st_size, None, None, None
+        if not palette.cur_colors:
+            return path, folder, stat.st_mtime, stat.st_size, None, None, None
+
+        colors = json.dumps([f'#{color:06x}' for color in palette.cur_colors])
+        return (path, folder, stat.st_mtime, stat.st_size, palette.image_name, colors,
+                palette_signature(palette).tobytes())
+
+    # Writes files table rows, replacing the previous rows of the same files
+    def write_rows(self, rows):
+        if not rows:
+            return
+        connection = self.connect()
+        with connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO files (path, folder, modified, size, image_name, colors, signature) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        self.invalidate()
+
+    # Drops the signatures held in memory, reloading them on the next search
+    def invalidate(self):
+        self.paths = None
+        self.signatures = None
+
+    # Loads the signatures of every indexed palette into memory
+    def load_signatures(self):
+        rows = self.connect().execute('SELECT path, signature FROM files WHERE signature IS NOT NULL').fetchall()
+        self.paths = [path for path, _ in rows]
+        if np is not None:
+            self.signatures = np.frombuffer(b''.join(signature for _, signature in rows),
+                                            dtype=np.float32).reshape(len(rows), SIGNATURE_LENGTH)
+        else:
+            self.signatures = [array('f', signature) for _, signature in rows]
+
+    # Returns the entries of the k indexed palettes most similar to a signature, most similar first
+    def search(self, signature, k=DEFAULT_TOP_K):
+        if self.signatures is None:
+            self.load_signatures()
+        if not self.paths:
+            return []
+
+        if np is not None:
+            scores = self.signatures @ np.frombuffer(signature, dtype=np.float32)
+            top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+            ranked = [(float(scores[index]), int(index)) for index in top]
+            ranked.sort(key=lambda item: (-item[0], item[1]))
+        else:
+            ranked = heapq.nlargest(k, ((similarity(signature, other), index) for index, other in enumerate(self.signatures)),
+                                    key=lambda item: (item[0], -item[1]))
+
+        paths = [self.paths[index] for _, index in ranked]
+        placeholders = ','.join('?' * len(paths))
+        details = {path: (image_name, colors) for path, image_name, colors in self.connect().execute(
+            f'SELECT path, image_name, colors FROM files WHERE path IN ({placeholders})', paths)}
+        return [IndexEntry(path, details[path][0], json.loads(details[path][1]), score)
+                for (score, _), path in zip(ranked, paths) if path in details]
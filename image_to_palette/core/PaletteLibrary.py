@@ -0,0 +1,213 @@
+import json
+import math
+import os
+import sqlite3
+import time
+
+from .ColorSpace import rgb_to_lab
+from ..model.Palette import Palette
+
+# Version of the library schema, stored as the database user_version
+LIBRARY_VERSION = 1
+
+# Edge of the cubic Lab cells swatches are bucketed into for color searches
+BUCKET_SIZE = 10.0
+
+# Offset keeping bucket coordinates positive, Lab a and b stay within +-128
+BUCKET_OFFSET = 32
+
+# Largest Lab distance (delta E 1976) a swatch may be from the searched color by default
+DEFAULT_SEARCH_DISTANCE = 10.0
+
+# Kinds of library entries
+KIND_GENERATED = 'generated'
+KIND_SAVED = 'saved'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS palettes (
+    id INTEGER PRIMARY KEY,
+    image_name TEXT,
+    source TEXT,
+    kind TEXT NOT NULL,
+    created REAL NOT NULL,
+    seed INTEGER,
+    method TEXT,
+    colors TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS swatches (
+    palette_id INTEGER NOT NULL REFERENCES palettes(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    color INTEGER NOT NULL,
+    l REAL NOT NULL,
+    a REAL NOT NULL,
+    b REAL NOT NULL,
+    bucket INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS swatches_bucket ON swatches (bucket);
+CREATE INDEX IF NOT EXISTS swatches_palette ON swatches (palette_id);
+"""
+
+# Returns the grid cell coordinate of a Lab component
+def bucket_coordinate(value):
+    return int(math.floor(value / BUCKET_SIZE)) + BUCKET_OFFSET
+
+# Packs the grid cell coordinates of a Lab color into a bucket id
+def pack_bucket(l, a, b):
+    return (l << 16) | (a << 8) | b
+
+# Returns the bucket id of the grid cell holding a Lab color
+def lab_bucket(lab):
+    return pack_bucket(*(bucket_coordinate(value) for value in lab))
+
+# Returns the ids of every bucket a Lab sphere of the given radius overlaps
+def neighbor_buckets(lab, radius):
+    ranges = [range(bucket_coordinate(value - radius), bucket_coordinate(value + radius) + 1) for value in lab]
+    return [pack_bucket(l, a, b) for l in ranges[0] for a in ranges[1] for b in ranges[2]]
+
+# Returns the row a palette is added to the library as, taken when the palette is recorded
+# so it can be written later even if the palette changes in the meantime
+def library_record(palette, source=None, kind=KIND_GENERATED):
+    return palette.image_name, source, kind, time.time(), palette.seed, palette.method, list(palette.cur_colors)
+
+# Palette summary returned by library queries, without any histogram
+class LibraryEntry:
+    __slots__ = ('palette_id', 'image_name', 'source', 'kind', 'created', 'seed', 'method', 'colors')
+
+    def __init__(self, palette_id, image_name, source, kind, created, seed, method, colors):
+        self.palette_id = palette_id
+        self.image_name = image_name
+        self.source = source  # Image the palette was generated from, or file it was saved to
+        self.kind = kind
+        self.created = created
+        self.seed = seed
+        self.method = method
+        self.colors = colors  # Hex strings of the palette colors
+
+    # Creates a Palette holding the colors of the entry
+    def to_palette(self):
+        palette = Palette()
+        palette.from_json({"image_name": self.image_name, "current_colors": self.colors,
+                           "seed": self.seed, "method": self.method})
+        return palette
+
+# Unbounded, indexed store of every generated and saved palette, backed by SQLite
+# Swatches are indexed by Lab grid cell, so palettes holding a color close to a
+# given one are found by reading only the few cells around it
+class PaletteLibrary:
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.connection = None  # Opened on first use
+
+    # Returns the database connection, creating the database if needed
+    def connect(self):
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.file_name) or '.', exist_ok=True)
+            self.connection = sqlite3.connect(self.file_name)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA foreign_keys=ON')
+            if self.connection.execute('PRAGMA user_version').fetchone()[0] != LIBRARY_VERSION:
+                with self.connection:
+                    self.connection.executescript(SCHEMA)
+                    self.connection.execute(f'PRAGMA user_version={LIBRARY_VERSION}')
+        return self.connection
+
+    # Closes the database connection
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    # Adds a palette to the library, returning its id
+    def add_palette(self, palette, source=None, kind=KIND_GENERATED):
+        return self.add_records([library_record(palette, source, kind)])[0]
+
+    # Adds palettes recorded with library_record in a single transaction, returning their ids
+    def add_records(self, records):
+        connection = self.connect()
+        palette_ids = []
+        with connection:
+            for image_name, source, kind, created, seed, method, colors in records:
+                cursor = connection.execute(
+                    'INSERT INTO palettes (image_name, source, kind, created, seed, method, colors) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (image_name, source, kind, created, seed, method,
+                     json.dumps([f'#{color:06x}' for color in colors])))
+                palette_id = cursor.lastrowid
+                palette_ids.append(palette_id)
+
+                swatches = []
+                for position, color in enumerate(colors):
+                    lab = rgb_to_lab(color & 0xFFFFFF)
+                    swatches.append((palette_id, position, color, *lab, lab_bucket(lab)))
+                connection.executemany(
+                    'INSERT INTO swatches (palette_id, position, color, l, a, b, bucket) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    swatches)
+        return palette_ids
+
+    # Removes a palette from the library
+    def remove_palette(self, palette_id):
+        connection = self.connect()
+        with connection:
+            connection.execute('DELETE FROM palettes WHERE id = ?', (palette_id,))
+
+    # Returns the number of palettes in the library
+    def count(self):
+        return self.connect().execute('SELECT COUNT(*) FROM palettes').fetchone()[0]
+
+    # Returns up to limit entries, newest first, older than the given palette id
+    # Pages are read by id rather than offset, so any page is as fast as the first one
+    def page(self, before_id=None, limit=50):
+        connection = self.connect()
+        if before_id is None:
+            rows = connection.execute('SELECT * FROM palettes ORDER BY id DESC LIMIT ?', (limit,))
+        else:
+            rows = connection.execute('SELECT * FROM palettes WHERE id < ? ORDER BY id DESC LIMIT ?', (before_id, limit))
+        return [self.make_entry(row) for row in rows]
+
+    # Returns the entries with the given ids, in the same order
+    def get(self, palette_ids):
+        if not palette_ids:
+            return []
+        placeholders = ','.join('?' * len(palette_ids))
+        rows = self.connect().execute(f'SELECT * FROM palettes WHERE id IN ({placeholders})', list(palette_ids))
+        entries = {entry.palette_id: entry for entry in map(self.make_entry, rows)}
+        return [entries[palette_id] for palette_id in palette_ids if palette_id in entries]
+
+    # Yields the palettes of the given entries, or of the whole library newest first,
+    # reading them one page at a time so exports never load the library into memory
+    def iterate(self, palette_ids=None, page_size=500):
+        if palette_ids is not None:
+            for start in range(0, len(palette_ids), page_size):
+                for entry in self.get(palette_ids[start:start + page_size]):
+                    yield entry.to_palette()
+            return
+
+        before_id = None
+        while True:
+            page = self.page(before_id, page_size)
+            for entry in page:
+                yield entry.to_palette()
+            if len(page) < page_size:
+                return
+            before_id = page[-1].palette_id
+
+    # Returns the (palette id, distance) of the palettes holding a swatch within
+    # max_distance of the given rgb color, closest first
+    def find_by_color(self, color, max_distance=DEFAULT_SEARCH_DISTANCE, limit=100):
+        lab = rgb_to_lab(color & 0xFFFFFF)
+        buckets = neighbor_buckets(lab, max_distance)
+        placeholders = ','.join('?' * len(buckets))
+        rows = self.connect().execute(
+            f'SELECT palette_id, l, a, b FROM swatches WHERE bucket IN ({placeholders})', buckets)
+
+        closest = {}
+        for palette_id, l, a, b in rows:
+            distance = math.sqrt((l - lab[0]) ** 2 + (a - lab[1]) ** 2 + (b - lab[2]) ** 2)
+            if distance <= max_distance and distance < closest.get(palette_id, math.inf):
+                closest[palette_id] = distance
+
+        return sorted(closest.items(), key=lambda item: (item[1], -item[0]))[:limit]
+
+    # Creates an entry from a palettes table row
+    def make_entry(self, row):
+        palette_id, image_name, source, kind, created, seed, method, colors = row
+        return LibraryEntry(palette_id, image_name, source, kind, created, seed, method, json.loads(colors))
@@ -0,0 +1,425 @@
+import random
+from collections import defaultdict
+
+from .ColorDistance import DEFAULT_COLOR_DIFFERENCE, DistinctPicker
+from .ColorSpace import np, split_rgb, rgb_to_lab, rgb_to_lab_array
+from .Histogram import OPAQUE_ALPHA
+from .SamplingIndex import MAX_DRAWS_PER_COLOR, get_sampling_index
+
+# Packs red, green and blue channels into an opaque rgb color
+def pack_rgb(red, green, blue):
+    return OPAQUE_ALPHA | (int(round(red)) << 16) | (int(round(green)) << 8) | int(round(blue))
+
+# Returns the count-weighted mean color of a list of (rgb, count) tuples
+def weighted_mean(colors):
+    total = red = green = blue = 0
+    for color, count in colors:
+        r, g, b = split_rgb(color)
+        red += r * count
+        green += g * count
+        blue += b * count
+        total += count
+    return pack_rgb(red / total, green / total, blue / total)
+
+# Picks num_colors representative colors from a ColorHistogram
+class Quantizer:
+    name = ''
+    label = ''
+
+    # Returns exactly num_colors colors, repeating some if the image has too few
+    # With a min_distance, colors closer than it under the given metric are never both picked
+    def quantize(self, total_colors, num_colors, rng=random, min_distance=0, metric=DEFAULT_COLOR_DIFFERENCE):
+        if not total_colors:
+            return []
+
+        if min_distance > 0:
+            picker = DistinctPicker(total_colors, num_colors, min_distance, metric)
+            self.select_distinct(total_colors, num_colors, rng, picker)
+            colors = picker.fill()
+        else:
+            colors = self.select(total_colors, num_colors, rng)
+        return [colors[i % len(colors)] for i in range(num_colors)]
+
+    # Returns up to num_colors colors, implemented by each quantizer
+    def select(self, total_colors, num_colors, rng):
+        raise NotImplementedError
+
+    # Returns up to num_colors colors picked through the given DistinctPicker
+    # Selected colors too close to another one are replaced by the most common colors left
+    def select_distinct(self, total_colors, num_colors, rng, picker):
+        for color in self.select(total_colors, num_colors, rng):
+            picker.offer_color(color)
+        picker.offer_indices(range(len(total_colors)))
+        return picker.chosen
+
+# Takes random distinct colors from the histogram, ignoring their counts
+# Samples indices instead of shuffling, so the shared histogram is never modified
+class RandomQuantizer(Quantizer):
+    name = 'random'
+    label = 'Random'
+
+    def select(self, total_colors, num_colors, rng):
+        colors = total_colors.colors
+        if len(colors) < num_colors:
+            return [colors[rng.randrange(len(colors))]]
+        return [colors[index] for index in rng.sample(range(len(colors)), num_colors)]
+
+    def select_distinct(self, total_colors, num_colors, rng, picker):
+        draws = min(len(total_colors), num_colors * MAX_DRAWS_PER_COLOR)
+        picker.offer_indices(rng.sample(range(len(total_colors)), draws))
+        picker.offer_indices(range(len(total_colors)))
+        return picker.chosen
+
+# Draws distinct colors by pixel count from the histogram's sampling index,
+# avoiding near identical shades, in O(k log N) per palette
+class WeightedRandomQuantizer(Quantizer):
+    name = 'weighted'
+    label = 'Weighted Random'
+
+    def select(self, total_colors, num_colors, rng):
+        return get_sampling_index(total_colors).sample(rng, num_colors)
+
+    def select_distinct(self, total_colors, num_colors, rng, picker):
+        sampling_index = get_sampling_index(total_colors)
+        if sampling_index.total:
+            picker.offer_indices(sampling_index.draw(rng) for _ in range(num_colors * MAX_DRAWS_PER_COLOR))
+        picker.offer_indices(range(len(total_colors)))
+        return picker.chosen
+
+# Repeatedly splits the box of colors holding the most pixels at the weighted
+# median of its widest channel, then averages each box
+class MedianCutQuantizer(Quantizer):
+    name = 'median_cut'
+    label = 'Median Cut'
+
+    def select(self, total_colors, num_colors, rng):
+        if np is not None:
+            return self.select_numpy(total_colors, num_colors)
+        return self.select_python(total_colors, num_colors)
+
+    # Splits boxes held as arrays of histogram indices, each split being a stable argsort
+    # and a cumulative sum, so only the boxes themselves are ever looped over
+    def select_numpy(self, total_colors, num_colors):
+        colors = np.frombuffer(total_colors.colors, dtype=np.uint32).astype(np.int64)
+        counts = np.frombuffer(total_colors.counts, dtype=np.uint32).astype(np.int64)
+        channels = np.stack(((colors >> 16) & 0xFF, (colors >> 8) & 0xFF, colors & 0xFF), axis=1)
+
+        # Each box is [indices, pixel count, channel ranges]
+        def make_box(indices):
+            values = channels[indices]
+            return [indices, int(counts[indices].sum()), (values.max(axis=0) - values.min(axis=0)).tolist()]
+
+        boxes = [make_box(np.arange(len(colors)))]
+        while len(boxes) < num_colors:
+            splittable = [index for index, box in enumerate(boxes) if len(box[0]) > 1]
+            if not splittable:
+                break
+
+            indices, total, ranges = boxes.pop(max(splittable, key=lambda index: boxes[index][1] * max(boxes[index][2])))
+            indices = indices[np.argsort(channels[indices, ranges.index(max(ranges))], kind='stable')]
+            median = int(np.searchsorted(np.cumsum(counts[indices]), total / 2)) + 1
+            median = min(max(median, 1), len(indices) - 1)
+            boxes.extend((make_box(indices[:median]), make_box(indices[median:])))
+
+        boxes.sort(key=lambda box: box[1], reverse=True)
+        means = []
+        for indices, total, _ in boxes:
+            sums = (channels[indices] * counts[indices, None]).sum(axis=0).tolist()
+            means.append(pack_rgb(sums[0] / total, sums[1] / total, sums[2] / total))
+        return means
+
+    def select_python(self, total_colors, num_colors):
+        boxes = [list(total_colors)]
+        while len(boxes) < num_colors:
+            splittable = [box for box in boxes if len(box) > 1]
+            if not splittable:
+                break
+
+            box = max(splittable, key=self.box_weight)
+            boxes.remove(box)
+            boxes.extend(self.split(box))
+
+        boxes.sort(key=lambda box: sum(count for _, count in box), reverse=True)
+        return [weighted_mean(box) for box in boxes]
+
+    # Pixels in a box scaled by its widest channel range, so large uniform boxes are not split
+    def box_weight(self, box):
+        return sum(count for _, count in box) * max(self.channel_ranges(box))
+
+    # Returns the range of the red, green and blue channels in a box
+    def channel_ranges(self, box):
+        channels = list(zip(*(split_rgb(color) for color, _ in box)))
+        return [max(channel) - min(channel) for channel in channels]
+
+    # Splits a box in two at the weighted median of its widest channel
+    def split(self, box):
+        ranges = self.channel_ranges(box)
+        shift = (16, 8, 0)[ranges.index(max(ranges))]
+        box.sort(key=lambda entry: (entry[0] >> shift) & 0xFF)
+
+        half = sum(count for _, count in box) / 2
+        seen = 0
+        for index, (_, count) in enumerate(box):
+            seen += count
+            if seen >= half:
+                break
+
+        median = min(max(index + 1, 1), len(box) - 1)
+        return [box[:median], box[median:]]
+
+# Builds an octree of the colors and merges the lightest sibling leaves into their
+# parent, deepest level first, until only num_colors leaves remain
+class OctreeQuantizer(Quantizer):
+    name = 'octree'
+    label = 'Octree'
+
+    # Bits per channel of the deepest octree level
+    MAX_DEPTH = 8
+
+    def select(self, total_colors, num_colors, rng):
+        if np is not None:
+            return self.select_numpy(total_colors, num_colors)
+        return self.select_python(total_colors, num_colors)
+
+    # Merges the leaves of each level in a few vectorized passes
+    # Leaves are held as arrays in the order the dict of the Python version keeps them,
+    # unmerged leaves first and new parents after, so both versions pick the same colors
+    # Their (level, red, green, blue) prefixes are packed into a single integer key
+    def select_numpy(self, total_colors, num_colors):
+        colors = np.frombuffer(total_colors.colors, dtype=np.uint32).astype(np.int64)
+        counts = np.frombuffer(total_colors.counts, dtype=np.uint32).astype(np.int64)
+        shift = 8 - self.MAX_DEPTH
+        red, green, blue = (colors >> 16) & 0xFF, (colors >> 8) & 0xFF, colors & 0xFF
+
+        keys, group = self.group_keys((self.MAX_DEPTH << 24) | ((red >> shift) << 16) | ((green >> shift) << 8) | (blue >> shift))
+        sums = self.group_sums(group, len(keys), (counts, red * counts, green * counts, blue * counts))
+
+        for level in range(self.MAX_DEPTH, 0, -1):
+            if len(keys) <= num_colors:
+                break
+
+            # Group the leaves of this level under their parent node
+            at_level = np.flatnonzero((keys >> 24) == level)
+            if not len(at_level):
+                continue
+            parents, group = self.group_keys(((level - 1) << 24) | ((keys[at_level] >> 1) & 0x7F7F7F))
+            parent_sums = self.group_sums(group, len(parents), sums[at_level].T)
+            children = np.bincount(group, minlength=len(parents))
+
+            # Merge the lightest nodes first, never going below num_colors leaves
+            lightest = np.argsort(parent_sums[:, 0], kind='stable')
+            merged_parents = lightest[self.merged_parents(children[lightest] - 1, len(keys) - num_colors)]
+            is_merged = np.zeros(len(parents), dtype=bool)
+            is_merged[merged_parents] = True
+
+            kept = np.ones(len(keys), dtype=bool)
+            kept[at_level[is_merged[group]]] = False
+            keys = np.concatenate((keys[kept], parents[merged_parents]))
+            sums = np.concatenate((sums[kept], parent_sums[merged_parents]))
+
+        heaviest = np.argsort(-sums[:, 0], kind='stable')[:num_colors]
+        return [pack_rgb(red / count, green / count, blue / count) for count, red, green, blue in sums[heaviest].tolist()]
+
+    # Returns the distinct keys in order of first appearance, and the group of each key
+    @staticmethod
+    def group_keys(keys):
+        distinct, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        order = np.argsort(first, kind='stable')
+        rank = np.empty(len(order), dtype=np.intp)
+        rank[order] = np.arange(len(order))
+        return distinct[order], rank[inverse.ravel()]
+
+    # Returns the sums of each group of the given columns, one row per group
+    @staticmethod
+    def group_sums(group, length, columns):
+        return np.stack([np.bincount(group, weights=column, minlength=length) for column in columns],
+                        axis=1).astype(np.int64)
+
+    # Returns which parents, lightest first, are merged so the leaves removed by merging
+    # add up to at most excess, each merge removing its children less one leaf
+    # Merges are taken in order and skipped when they would remove too many leaves,
+    # stopping as soon as no leaf is left to remove
+    @staticmethod
+    def merged_parents(removed, excess):
+        merged = np.zeros(len(removed), dtype=bool)
+        if excess <= 0:
+            return merged
+
+        # Every merge is taken until the first one that would remove too many
+        total = np.cumsum(removed)
+        exact = int(np.searchsorted(total, excess, side='left'))
+        if exact < len(total) and total[exact] == excess:
+            merged[:exact + 1] = True
+            return merged
+        position = int(np.searchsorted(total, excess, side='right'))
+        merged[:position] = True
+        excess -= int(total[position - 1]) if position else 0
+
+        # Then only the single child parents and the merges still fitting, of which there
+        # are fewer than the 8 children of a node
+        while position < len(removed) and excess > 0:
+            later = removed[position:]
+            fitting = np.flatnonzero((later > 0) & (later <= excess))
+            end = position + int(fitting[0]) if len(fitting) else len(removed)
+            merged[position:end] |= removed[position:end] == 0
+            if not len(fitting):
+                break
+            merged[end] = True
+            excess -= int(removed[end])
+            position = end + 1
+        return merged
+
+    def select_python(self, total_colors, num_colors):
+        # Leaves keyed by (level, red, green, blue) prefix with [count, red, green, blue] sums
+        leaves = defaultdict(lambda: [0, 0, 0, 0])
+        shift = 8 - self.MAX_DEPTH
+        for color, count in total_colors:
+            red, green, blue = split_rgb(color)
+            leaf = leaves[(self.MAX_DEPTH, red >> shift, green >> shift, blue >> shift)]
+            leaf[0] += count
+            leaf[1] += red * count
+            leaf[2] += green * count
+            leaf[3] += blue * count
+
+        for level in range(self.MAX_DEPTH, 0, -1):
+            if len(leaves) <= num_colors:
+                break
+
+            # Group the leaves of this level under their parent node
+            parents = defaultdict(list)
+            for key in leaves:
+                if key[0] == level:
+                    parents[(level - 1, key[1] >> 1, key[2] >> 1, key[3] >> 1)].append(key)
+
+            # Merge the lightest nodes first, never going below num_colors leaves
+            for parent, children in sorted(parents.items(), key=lambda item: sum(leaves[key][0] for key in item[1])):
+                if len(leaves) <= num_colors:
+                    break
+                if len(leaves) - len(children) + 1 < num_colors:
+                    continue
+
+                merged = [0, 0, 0, 0]
+                for key in children:
+                    merged = [total + value for total, value in zip(merged, leaves.pop(key))]
+                leaves[parent] = merged
+
+        heaviest = sorted(leaves.values(), key=lambda leaf: leaf[0], reverse=True)[:num_colors]
+        return [pack_rgb(red / count, green / count, blue / count) for count, red, green, blue in heaviest]
+
+# Clusters the colors in CIELAB with mini-batch k-means, sampling the batches by
+# pixel count, and returns the image color closest to each cluster center
+class KMeansQuantizer(Quantizer):
+    name = 'kmeans'
+    label = 'K-Means (Lab)'
+
+    BATCH_SIZE = 256
+    ITERATIONS = 40
+
+    # Colors compared with the centers at once when picking the closest colors
+    CHUNK_SIZE = 1 << 16
+
+    def select(self, total_colors, num_colors, rng):
+        colors = total_colors.colors
+        counts = total_colors.counts
+        if len(colors) <= num_colors:
+            return colors
+
+        if np is not None:
+            return self.select_numpy(colors, counts, num_colors, rng)
+        return self.select_python(colors, counts, num_colors, rng)
+
+    # Vectorized mini-batch k-means over the histogram
+    def select_numpy(self, colors, counts, num_colors, rng):
+        generator = np.random.default_rng(rng.getrandbits(64))
+        lab = rgb_to_lab_array(np.frombuffer(colors, dtype=np.uint32))
+        probabilities = np.frombuffer(counts, dtype=np.uint32).astype(np.float64)
+        probabilities /= probabilities.sum()
+
+        # k-means++ seeding weighted by pixel count
+        centers = [lab[generator.choice(len(lab), p=probabilities)]]
+        distances = ((lab - centers[0]) ** 2).sum(axis=1)
+        for _ in range(num_colors - 1):
+            weights = distances * probabilities
+            if weights.sum() <= 0:
+                break
+            centers.append(lab[generator.choice(len(lab), p=weights / weights.sum())])
+            distances = np.minimum(distances, ((lab - centers[-1]) ** 2).sum(axis=1))
+        centers = np.array(centers)
+
+        # Each center moves to the running mean of every point assigned to it so far,
+        # which a whole batch updates at once from the per-center sums
+        seen = np.zeros(len(centers))
+        for _ in range(self.ITERATIONS):
+            batch = lab[generator.choice(len(lab), size=self.BATCH_SIZE, p=probabilities)]
+            nearest = ((batch[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+            assigned = np.bincount(nearest, minlength=len(centers))
+            sums = np.stack([np.bincount(nearest, weights=batch[:, axis], minlength=len(centers))
+                             for axis in range(3)], axis=1)
+            updated = assigned > 0
+            seen += assigned
+            centers[updated] += (sums[updated] - assigned[updated, None] * centers[updated]) / seen[updated, None]
+
+        return [colors[index] for index in dict.fromkeys(self.closest_colors(lab, centers))]
+
+    # Returns the index of the color closest to each center
+    # Colors are compared in chunks, so the distances never grow with the histogram
+    def closest_colors(self, lab, centers):
+        best = np.full(len(centers), np.inf)
+        closest = np.zeros(len(centers), dtype=np.intp)
+        for start in range(0, len(lab), self.CHUNK_SIZE):
+            distances = ((lab[start:start + self.CHUNK_SIZE, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+            nearest = distances.argmin(axis=0)
+            nearest_distances = distances[nearest, np.arange(len(centers))]
+            closer = nearest_distances < best
+            best[closer] = nearest_distances[closer]
+            closest[closer] = nearest[closer] + start
+        return closest.tolist()
+
+    # Pure Python mini-batch k-means over the histogram
+    def select_python(self, colors, counts, num_colors, rng):
+        lab = [rgb_to_lab(color) for color in colors]
+        indices = range(len(lab))
+
+        def distance(p, q):
+            return (p[0] - q[0]) ** 2 + (p[1] - q[1]) ** 2 + (p[2] - q[2]) ** 2
+
+        def nearest(point, centers):
+            return min(range(len(centers)), key=lambda i: distance(point, centers[i]))
+
+        # k-means++ seeding weighted by pixel count
+        centers = [list(lab[rng.choices(indices, weights=counts)[0]])]
+        distances = [distance(point, centers[0]) for point in lab]
+        for _ in range(num_colors - 1):
+            weights = [d * count for d, count in zip(distances, counts)]
+            if sum(weights) <= 0:
+                break
+            centers.append(list(lab[rng.choices(indices, weights=weights)[0]]))
+            distances = [min(d, distance(point, centers[-1])) for d, point in zip(distances, lab)]
+
+        seen = [0] * len(centers)
+        cum_weights = [0] * len(counts)
+        running = 0
+        for i, count in enumerate(counts):
+            running += count
+            cum_weights[i] = running
+
+        for _ in range(self.ITERATIONS):
+            for index in rng.choices(indices, cum_weights=cum_weights, k=self.BATCH_SIZE):
+                point = lab[index]
+                center = nearest(point, centers)
+                seen[center] += 1
+                rate = 1.0 / seen[center]
+                centers[center] = [c + (p - c) * rate for c, p in zip(centers[center], point)]
+
+        closest = [min(indices, key=lambda i: distance(lab[i], center)) for center in centers]
+        return [colors[index] for index in dict.fromkeys(closest)]
+
+# Available quantizers by name, in the order they are listed in the docker
+QUANTIZERS = {quantizer.name: quantizer for quantizer in (RandomQuantizer, WeightedRandomQuantizer, MedianCutQuantizer, OctreeQuantizer, KMeansQuantizer)}
+
+# Quantizer used when none is configured, matching the original behavior
+DEFAULT_QUANTIZER = RandomQuantizer.name
+
+# Returns a new instance of the quantizer with the given name
+def create_quantizer(name):
+    return QUANTIZERS.get(name, QUANTIZERS[DEFAULT_QUANTIZER])()
@@ -0,0 +1,90 @@
+import json
+import os
+import time
+
+from .PaletteFile import load_palette_file
+from ..model.Palette import Palette
+
+# Version of the recent palettes file
+RECENT_PALETTES_VERSION = 1
+
+# Number of palettes kept in the recent list
+MAX_RECENT_PALETTES = 5
+
+# Creates the recent list entry of a palette file
+# The swatch colors and metadata are cached so the list never reopens the file
+def create_entry(file_name, palette):
+    try:
+        modified = os.path.getmtime(file_name)
+    except OSError:
+        modified = None
+
+    return {
+        "path": file_name,
+        "image_name": palette.image_name,
+        "colors": [f'#{color:06x}' for color in palette.cur_colors],
+        "method": palette.method,
+        "modified": modified,
+        "opened": time.time(),
+    }
+
+# Reads the palette file of an entry again, after it was changed outside the docker
+# The entry keeps the time it was opened, so its place in the list is unchanged
+# Returns None if the file is no longer a readable palette
+def reread_entry(entry):
+    palette = Palette()
+    try:
+        load_palette_file(entry["path"], palette)
+    except (OSError, ValueError, TypeError, AttributeError):
+        return None
+
+    updated = create_entry(entry["path"], palette)
+    updated["opened"] = entry.get("opened", updated["opened"])
+    return updated
+
+# Converts a list of paths from the original recent palettes file into entries
+# Their swatches are unknown until the palettes are opened again
+def migrate_entries(paths):
+    return [{"path": path} for path in paths if isinstance(path, str)][:MAX_RECENT_PALETTES]
+
+# Reads the recent palette entries, most recent first
+# Returns an empty list if the file is missing or unreadable
+def read_recent_palettes(file_name):
+    try:
+        with open(file_name, 'r') as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return []
+
+    if not isinstance(data, dict) or data.get("version") != RECENT_PALETTES_VERSION:
+        return []
+    return [entry for entry in data.get("palettes", []) if isinstance(entry, dict) and "path" in entry]
+
+# Writes the recent palette entries atomically, so a crash never leaves a partial file
+def write_recent_palettes(file_name, entries):
+    os.makedirs(os.path.dirname(file_name) or '.', exist_ok=True)
+    temp_name = f'{file_name}.tmp'
+    with open(temp_name, 'w') as file:
+        json.dump({"version": RECENT_PALETTES_VERSION, "palettes": entries}, file)
+    os.replace(temp_name, file_name)
+
+# Loads the recent palette entries, migrating the list of earlier versions once
+# Entries whose palette file no longer exists are left out
+# Returns the entries and whether any was left out, so the file is saved without them
+def load_recent_palettes(file_name, legacy_file_name):
+    if os.path.exists(file_name):
+        entries = read_recent_palettes(file_name)
+    else:
+        try:
+            with open(legacy_file_name, 'r') as file:
+                entries = migrate_entries(json.load(file))
+        except (OSError, ValueError, TypeError):
+            return [], False
+
+        try:
+            write_recent_palettes(file_name, entries)
+        except OSError:
+            pass
+
+    existing = [entry for entry in entries if os.path.isfile(entry["path"])]
+    return existing, len(existing) != len(entries)
@@ -0,0 +1,185 @@
+import math
+import os
+from collections import Counter
+
+from PyQt5.QtGui import QImage
+from PyQt5.QtCore import Qt
+
+from .Bucketing import DEFAULT_PRECISION, bucket_histogram
+from .Histogram import OPAQUE_ALPHA, PixelAccumulator, histogram_from_counts, merge_histograms, unpremultiply, np
+from .ImageDecoder import DEFAULT_SAMPLE_SIZE, image_pixels, is_premultiplied, load_sample
+from .Instrumentation import span
+from ..model.ColorHistogram import ColorHistogram
+
+# Width and height of the tiles an image is counted in, each counted at most once
+# whatever the number of regions covering it
+TILE_SIZE = 64
+
+# Size of the box regions are drawn over the image in, they are never counted at a smaller
+# size so that even the smallest region drawn covers pixels of its own
+PREVIEW_SIZE = 360
+
+# Most colors of a mask image taken as regions, the ones covering the fewest pixels
+# (such as antialiased edges) are left out beyond it
+MAX_MASK_REGIONS = 16
+
+# Rectangle of an image a palette is extracted from
+# Kept in fractions of the image size, so it applies to the image at any sample size
+class Region:
+    __slots__ = ('name', 'left', 'top', 'right', 'bottom')
+
+    def __init__(self, name, left, top, right, bottom):
+        self.name = name
+        self.left = left
+        self.top = top
+        self.right = right
+        self.bottom = bottom
+
+    # Returns the (left, top, right, bottom) pixels the region covers in a width x height image
+    # A region always covers at least one pixel of a non-empty image
+    def pixel_rect(self, width, height):
+        left = min(max(int(self.left * width), 0), max(width - 1, 0))
+        top = min(max(int(self.top * height), 0), max(height - 1, 0))
+        right = min(max(math.ceil(self.right * width), left + 1), width)
+        bottom = min(max(math.ceil(self.bottom * height), top + 1), height)
+        return left, top, right, bottom
+
+# Returns the sample size regions are counted at, at least the size they were drawn at
+def region_sample_size(sample_size):
+    return sample_size if sample_size <= 0 else max(sample_size, PREVIEW_SIZE)
+
+# Returns the image converted to the 32-bit format its pixels are counted in
+def counting_image(image):
+    target_format = QImage.Format_ARGB32_Premultiplied if is_premultiplied(image) else QImage.Format_ARGB32
+    return image if image.format() == target_format else image.convertToFormat(target_format)
+
+# Counts the colors of rectangles of one decoded image, tile by tile
+# The tiles a rectangle covers whole are counted once and shared by every rectangle,
+# only the parts of the tiles cut by its edges are counted for each rectangle
+class TiledImageCounter:
+    def __init__(self, image, tile_size=TILE_SIZE):
+        self.image = counting_image(image)  # Kept alive for as long as its pixels are used
+        self.premultiplied = is_premultiplied(self.image)
+        self.pixels = image_pixels(self.image)
+        self.width = self.image.width()
+        self.height = self.image.height()
+        self.tile_size = tile_size
+        self.tiles = {}  # (column, row) -> ColorHistogram of the tile
+
+    # Returns the pixels of a rectangle as one contiguous buffer
+    def rect_pixels(self, left, top, right, bottom):
+        row_size = self.image.bytesPerLine()
+        if np is not None:
+            rows = np.frombuffer(self.pixels, dtype=np.uint32).reshape(self.height, row_size // 4)
+            return np.ascontiguousarray(rows[top:bottom, left:right])
+        return b''.join(self.pixels[row * row_size + left * 4:row * row_size + right * 4] for row in range(top, bottom))
+
+    # Returns the histogram of a tile, counting it on first use
+    def tile_histogram(self, column, row):
+        histogram = self.tiles.get((column, row))
+        if histogram is None:
+            size = self.tile_size
+            accumulator = PixelAccumulator(self.premultiplied)
+            accumulator.add(self.rect_pixels(column * size, row * size, min((column + 1) * size, self.width),
+                                             min((row + 1) * size, self.height)))
+            histogram = self.tiles[(column, row)] = accumulator.histogram()
+        return histogram
+
+    # Returns a ColorHistogram of the pixels of a rectangle
+    def count(self, left, top, right, bottom):
+        size = self.tile_size
+        histograms = []
+        edges = PixelAccumulator(self.premultiplied)
+        for row in range(top // size, -(-bottom // size)):
+            for column in range(left // size, -(-right // size)):
+                tile = (column * size, row * size, min((column + 1) * size, self.width), min((row + 1) * size, self.height))
+                clipped = (max(left, tile[0]), max(top, tile[1]), min(right, tile[2]), min(bottom, tile[3]))
+                if clipped == tile:
+                    histograms.append(self.tile_histogram(column, row))
+                else:
+                    edges.add(self.rect_pixels(*clipped))
+
+        histograms.append(edges.histogram())
+        return merge_histograms(histograms)
+
+# Counts the colors under each color of a mask image in a single pass over the image
+# The mask is stretched over the image without smoothing, every color of it being one
+# region named after it, fully transparent mask pixels are left out
+# Returns (name, ColorHistogram) pairs, the region covering the most pixels first
+# and regions of the same size in the order of their mask color
+def count_mask_regions(image, mask):
+    image = counting_image(image)
+    premultiplied = is_premultiplied(image)
+    mask = mask.scaled(image.width(), image.height(), Qt.IgnoreAspectRatio, Qt.FastTransformation)
+    mask = mask.convertToFormat(QImage.Format_ARGB32)
+
+    if np is not None:
+        return _count_mask_regions_numpy(image_pixels(image), image_pixels(mask), premultiplied)
+    return _count_mask_regions_python(image_pixels(image), image_pixels(mask), premultiplied)
+
+# Returns the name of the region of a mask color
+def mask_region_name(label):
+    return f'#{label & 0xFFFFFF:06x}'
+
+# Counts every (mask color, pixel) pair at once, then splits the counts by mask color
+def _count_mask_regions_numpy(pixels, mask_pixels, premultiplied):
+    data = np.frombuffer(pixels, dtype=np.uint32)
+    if not premultiplied:
+        data = data | np.uint32(OPAQUE_ALPHA)
+    labels, label_index = np.unique(np.frombuffer(mask_pixels, dtype=np.uint32), return_inverse=True)
+
+    keys, counts = np.unique((label_index.ravel().astype(np.uint64) << np.uint64(32)) | data, return_counts=True)
+    key_labels = (keys >> np.uint64(32)).astype(np.intp)
+    colors = (keys & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+    bounds = np.searchsorted(key_labels, np.arange(len(labels) + 1))
+    sizes = np.add.reduceat(counts, bounds[:-1]) if len(counts) else np.zeros(len(labels), dtype=np.int64)
+
+    regions = []
+    for index in np.argsort(-sizes, kind='stable').tolist():
+        if labels[index] >> 24 == 0 or len(regions) == MAX_MASK_REGIONS:
+            continue
+        start, end = bounds[index], bounds[index + 1]
+        regions.append((mask_region_name(int(labels[index])), histogram_from_counts(colors[start:end], counts[start:end], premultiplied)))
+    return regions
+
+# Counts every (mask color, pixel) pair with a Counter, then splits the counts by mask color
+def _count_mask_regions_python(pixels, mask_pixels, premultiplied):
+    to_rgb = unpremultiply if premultiplied else (lambda color: color | OPAQUE_ALPHA)
+    counters = {}
+    for (label, color), count in Counter(zip(memoryview(mask_pixels).cast('B').cast('I'),
+                                             memoryview(pixels).cast('B').cast('I'))).items():
+        if label >> 24:
+            counters.setdefault(label, Counter())[to_rgb(color)] += count
+
+    labels = sorted(counters, key=lambda label: (-sum(counters[label].values()), label))[:MAX_MASK_REGIONS]
+    return [(mask_region_name(label), ColorHistogram.from_pairs(counters[label].most_common())) for label in labels]
+
+# Collects the colors of several regions of the image at the given path from a single decode
+# Regions are rectangles, and the colors of a mask image at mask_path, both optional
+# Returns (name, ColorHistogram) pairs in the order of the rectangles then the mask regions,
+# or None if is_cancelled() turned true between two stages
+def extract_region_colors(image_path, regions=(), mask_path=None, sample_size=DEFAULT_SAMPLE_SIZE,
+                          is_cancelled=lambda: False, precision=DEFAULT_PRECISION):
+    image = load_sample(image_path, region_sample_size(sample_size))
+    if is_cancelled():
+        return None
+
+    mask = None
+    if mask_path is not None:
+        mask = QImage(mask_path)
+        if mask.isNull():
+            raise ValueError(f"Unable to read the mask '{os.path.basename(mask_path)}'.")
+
+    with span('count regions', pixels=image.width() * image.height(), regions=len(regions)) as count_span:
+        region_colors = []
+        if regions:
+            counter = TiledImageCounter(image)
+            for region in regions:
+                if is_cancelled():
+                    return None
+                region_colors.append((region.name, counter.count(*region.pixel_rect(counter.width, counter.height))))
+            count_span.set(tiles=len(counter.tiles))
+        if mask is not None:
+            region_colors.extend(count_mask_regions(image, mask))
+
+    return [(name, bucket_histogram(total_colors, precision)) for name, total_colors in region_colors]
@@ -0,0 +1,63 @@
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+
+from .ColorSpace import np
+
+# Bits dropped from each channel when grouping colors into diversity buckets
+BUCKET_SHIFT = 4
+BUCKET_MASK = ((0xFF << BUCKET_SHIFT) & 0xFF) * 0x010101
+
+# Draws attempted per palette color before colors from already used buckets are accepted
+MAX_DRAWS_PER_COLOR = 8
+
+# Cumulative pixel count table of a histogram, drawing colors with a probability
+# proportional to their pixel count in O(log N) per draw
+class SamplingIndex:
+    __slots__ = ('colors', 'cum_weights', 'total')
+
+    def __init__(self, histogram):
+        self.colors = histogram.colors
+        if np is not None and len(histogram) > 0:
+            cum_weights = np.cumsum(np.frombuffer(histogram.counts, dtype=np.uint32), dtype=np.uint64)
+            self.cum_weights = array('Q', cum_weights.tobytes())
+        else:
+            self.cum_weights = array('Q', accumulate(histogram.counts))
+        self.total = self.cum_weights[-1] if self.cum_weights else 0
+
+    # Returns the index of a color drawn by pixel count
+    def draw(self, rng):
+        return bisect_right(self.cum_weights, rng.randrange(self.total))
+
+    # Draws up to num_colors distinct colors by pixel count
+    # Colors falling in the same coarse bucket as an already drawn color are rejected
+    # at first, so the palette is not made of near identical shades
+    def sample(self, rng, num_colors):
+        if self.total == 0:
+            return []
+
+        chosen = []
+        used_colors = set()
+        used_buckets = set()
+        for diverse in (True, False):
+            for _ in range(num_colors * MAX_DRAWS_PER_COLOR):
+                if len(chosen) == num_colors:
+                    return chosen
+
+                color = self.colors[self.draw(rng)]
+                bucket = color & BUCKET_MASK
+                if color in used_colors or (diverse and bucket in used_buckets):
+                    continue
+
+                chosen.append(color)
+                used_colors.add(color)
+                used_buckets.add(bucket)
+
+        return chosen
+
+# Returns the sampling index of the given histogram, building it on first use
+# The index is kept on the histogram, so snapshots sharing it share the index too
+def get_sampling_index(histogram):
+    if histogram.sampling_index is None:
+        histogram.sampling_index = SamplingIndex(histogram)
+    return histogram.sampling_index
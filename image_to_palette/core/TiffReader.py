@@ -0,0 +1,337 @@
+import struct
+import sys
+import zlib
+
+from .ColorSpace import np
+
+# Byte order marks and version of classic and BigTIFF files
+TIFF_BYTE_ORDERS = {b'II': '<', b'MM': '>'}
+CLASSIC_VERSION = 42
+BIG_TIFF_VERSION = 43
+
+# Tags read from the first image directory
+TAG_WIDTH = 256
+TAG_HEIGHT = 257
+TAG_BITS_PER_SAMPLE = 258
+TAG_COMPRESSION = 259
+TAG_PHOTOMETRIC = 262
+TAG_STRIP_OFFSETS = 273
+TAG_SAMPLES_PER_PIXEL = 277
+TAG_ROWS_PER_STRIP = 278
+TAG_STRIP_BYTE_COUNTS = 279
+TAG_PLANAR_CONFIGURATION = 284
+TAG_PREDICTOR = 317
+TAG_TILE_WIDTH = 322
+TAG_TILE_HEIGHT = 323
+TAG_TILE_OFFSETS = 324
+TAG_TILE_BYTE_COUNTS = 325
+TAG_EXTRA_SAMPLES = 338
+TAG_SAMPLE_FORMAT = 339
+
+# Struct formats of the integer field types
+FIELD_TYPES = {1: 'B', 3: 'H', 4: 'I', 16: 'Q'}
+
+# LZW is left to Qt, decoding it in Python takes minutes for the images worth streaming
+COMPRESSION_NONE = 1
+COMPRESSION_DEFLATE = (8, 32946)
+COMPRESSION_PACKBITS = 32773
+
+PHOTOMETRIC_MIN_IS_BLACK = 1
+PHOTOMETRIC_RGB = 2
+
+PREDICTOR_NONE = 1
+PREDICTOR_HORIZONTAL = 2
+
+# Extra sample holding alpha premultiplied into the color samples
+EXTRA_SAMPLE_ASSOCIATED_ALPHA = 1
+
+# Bytes read from the file, or decoded, at once
+CHUNK_SIZE = 1 << 20
+
+# Offsets of the blue, green, red and alpha bytes in a native 32-bit ARGB pixel
+if sys.byteorder == 'little':
+    ARGB_OFFSETS = (0, 1, 2, 3)
+else:
+    ARGB_OFFSETS = (3, 2, 1, 0)
+
+# Decodes PackBits compressed chunks of a strip or tile, yielding the decoded chunks
+def unpack_bits(chunks):
+    pending = b''
+    for chunk in chunks:
+        data = pending + chunk
+        output = bytearray()
+        index = 0
+        while index < len(data):
+            header = data[index]
+            if header < 128:
+                if index + header + 2 > len(data):
+                    break
+                output += data[index + 1:index + header + 2]
+                index += header + 2
+            elif header > 128:
+                if index + 2 > len(data):
+                    break
+                output += data[index + 1:index + 2] * (257 - header)
+                index += 2
+            else:
+                index += 1
+        pending = data[index:]
+        yield bytes(output)
+
+# Decodes Deflate compressed chunks of a strip or tile, yielding decoded chunks of at most
+# CHUNK_SIZE bytes however well the data compressed
+def inflate(chunks):
+    decompressor = zlib.decompressobj()
+    for chunk in chunks:
+        while chunk:
+            yield decompressor.decompress(chunk, CHUNK_SIZE)
+            chunk = decompressor.unconsumed_tail
+    yield decompressor.flush()
+
+# Reverses horizontal differencing, each sample having been stored as the difference
+# with the same sample of the pixel before it in the row
+def undo_horizontal_predictor(data, width, samples_per_pixel):
+    if np is not None:
+        samples = np.frombuffer(data, dtype=np.uint8).reshape(-1, width, samples_per_pixel)
+        return np.cumsum(samples, axis=1, dtype=np.uint8).tobytes()
+
+    data = bytearray(data)
+    row_size = width * samples_per_pixel
+    for row_start in range(0, len(data), row_size):
+        for index in range(row_start + samples_per_pixel, row_start + row_size):
+            data[index] = (data[index] + data[index - samples_per_pixel]) & 0xFF
+    return bytes(data)
+
+# Reads the strips or tiles of the first image of a baseline TIFF file one at a time
+# Only 8-bit chunky gray or RGB images, with or without alpha, are supported, which covers
+# the huge scans and renders streaming is meant for, anything else raises ValueError
+# Strips are decoded a few rows at a time and tiles one row of tiles at a time, so
+# memory stays bounded whatever the image size
+class TiffReader:
+    def __init__(self, file_name):
+        self.file_name = file_name
+        with open(file_name, 'rb') as file:
+            tags = self.read_directory(file)
+
+        self.width = self.tag(tags, TAG_WIDTH)
+        self.height = self.tag(tags, TAG_HEIGHT)
+        self.samples_per_pixel = self.tag(tags, TAG_SAMPLES_PER_PIXEL, 1)
+        self.compression = self.tag(tags, TAG_COMPRESSION, COMPRESSION_NONE)
+        self.predictor = self.tag(tags, TAG_PREDICTOR, PREDICTOR_NONE)
+        photometric = self.tag(tags, TAG_PHOTOMETRIC)
+        extra_samples = tags.get(TAG_EXTRA_SAMPLES, ())
+
+        if set(tags.get(TAG_BITS_PER_SAMPLE, (1,))) != {8}:
+            raise ValueError("Only 8-bit TIFF images can be streamed")
+        if set(tags.get(TAG_SAMPLE_FORMAT, (1,))) != {1}:
+            raise ValueError("Only unsigned integer TIFF samples can be streamed")
+        if self.tag(tags, TAG_PLANAR_CONFIGURATION, 1) != 1:
+            raise ValueError("Only chunky TIFF images can be streamed")
+        if photometric not in (PHOTOMETRIC_MIN_IS_BLACK, PHOTOMETRIC_RGB):
+            raise ValueError("Only gray and RGB TIFF images can be streamed")
+        if self.compression not in (COMPRESSION_NONE, COMPRESSION_PACKBITS) + COMPRESSION_DEFLATE:
+            raise ValueError(f"TIFF compression {self.compression} cannot be streamed")
+        if self.predictor not in (PREDICTOR_NONE, PREDICTOR_HORIZONTAL):
+            raise ValueError(f"TIFF predictor {self.predictor} cannot be streamed")
+
+        self.color_samples = 3 if photometric == PHOTOMETRIC_RGB else 1
+        if self.samples_per_pixel < self.color_samples:
+            raise ValueError("Missing TIFF color samples")
+        self.has_alpha = self.samples_per_pixel > self.color_samples and bool(extra_samples)
+        self.premultiplied = self.has_alpha and extra_samples[0] == EXTRA_SAMPLE_ASSOCIATED_ALPHA
+
+        # Strips are read as tiles as wide as the image
+        if TAG_TILE_OFFSETS in tags:
+            self.tile_width = self.tag(tags, TAG_TILE_WIDTH)
+            self.tile_height = self.tag(tags, TAG_TILE_HEIGHT)
+            self.offsets = tags[TAG_TILE_OFFSETS]
+            self.byte_counts = tags.get(TAG_TILE_BYTE_COUNTS)
+        else:
+            self.tile_width = self.width
+            self.tile_height = min(self.tag(tags, TAG_ROWS_PER_STRIP, self.height), self.height)
+            self.offsets = tags.get(TAG_STRIP_OFFSETS)
+            self.byte_counts = tags.get(TAG_STRIP_BYTE_COUNTS)
+        if not (self.width and self.height and self.tile_width and self.tile_height):
+            raise ValueError("Empty TIFF image")
+        self.tiles_across = -(-self.width // self.tile_width)
+        tiles_down = -(-self.height // self.tile_height)
+        if (not self.offsets or not self.byte_counts
+                or len(self.offsets) < self.tiles_across * tiles_down or len(self.byte_counts) < len(self.offsets)):
+            raise ValueError("Missing TIFF strip or tile offsets")
+
+    # Returns the single value of a tag
+    @staticmethod
+    def tag(tags, tag, default=None):
+        values = tags.get(tag)
+        if not values:
+            if default is None:
+                raise ValueError(f"Missing TIFF tag {tag}")
+            return default
+        return values[0]
+
+    # Reads the integer tags of the first image directory into a dict of value tuples
+    def read_directory(self, file):
+        header = file.read(16)
+        byte_order = TIFF_BYTE_ORDERS.get(header[:2])
+        if byte_order is None or len(header) < 8:
+            raise ValueError(f"'{self.file_name}' is not a TIFF file")
+
+        version = struct.unpack(byte_order + 'H', header[2:4])[0]
+        if version == CLASSIC_VERSION:
+            count_format, value_format, entry_size, inline_size = 'H', 'I', 12, 4
+            directory_offset = struct.unpack(byte_order + 'I', header[4:8])[0]
+        elif version == BIG_TIFF_VERSION:
+            count_format, value_format, entry_size, inline_size = 'Q', 'Q', 20, 8
+            directory_offset = struct.unpack(byte_order + 'Q', header[8:16])[0]
+        else:
+            raise ValueError(f"'{self.file_name}' is not a TIFF file")
+
+        file.seek(directory_offset)
+        count_size = struct.calcsize(count_format)
+        entry_count = struct.unpack(byte_order + count_format, file.read(count_size))[0]
+        entries = file.read(entry_count * entry_size)
+        if len(entries) < entry_count * entry_size:
+            raise ValueError(f"Truncated TIFF file '{self.file_name}'")
+
+        tags = {}
+        entry_format = struct.Struct(byte_order + 'HH' + value_format)
+        for start in range(0, len(entries), entry_size):
+            tag, field_type, count = entry_format.unpack_from(entries, start)
+            value_type = FIELD_TYPES.get(field_type)
+            if value_type is None or count == 0:
+                continue
+
+            size = struct.calcsize(value_type) * count
+            value_start = start + entry_format.size
+            if size <= inline_size:
+                data = entries[value_start:value_start + size]
+            else:
+                offset = struct.unpack_from(byte_order + value_format, entries, value_start)[0]
+                position = file.tell()
+                file.seek(offset)
+                data = file.read(size)
+                file.seek(position)
+                if len(data) < size:
+                    raise ValueError(f"Truncated TIFF file '{self.file_name}'")
+            tags[tag] = struct.unpack(f'{byte_order}{count}{value_type}', data)
+        return tags
+
+    # Yields the chunks of a strip or tile as stored in the file
+    def read_chunks(self, file, index):
+        offset, remaining = self.offsets[index], self.byte_counts[index]
+        while remaining > 0:
+            file.seek(offset)
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                return
+            yield chunk
+            offset += len(chunk)
+            remaining -= len(chunk)
+
+    # Yields the decoded samples of a strip or tile, a few whole rows at a time
+    def decode_rows(self, file, index):
+        chunks = self.read_chunks(file, index)
+        if self.compression in COMPRESSION_DEFLATE:
+            chunks = inflate(chunks)
+        elif self.compression == COMPRESSION_PACKBITS:
+            chunks = unpack_bits(chunks)
+
+        # The last strip may only hold the rows left in the image
+        row_size = self.tile_width * self.samples_per_pixel
+        rows_left = min(self.tile_height, self.height - self.tile_top(index))
+        pending = bytearray()
+        for chunk in chunks:
+            pending += chunk
+            rows = min(len(pending) // row_size, rows_left)
+            if not rows:
+                continue
+
+            samples = bytes(pending[:rows * row_size])
+            del pending[:rows * row_size]
+            if self.predictor == PREDICTOR_HORIZONTAL:
+                samples = undo_horizontal_predictor(samples, self.tile_width, self.samples_per_pixel)
+            yield samples
+            rows_left -= rows
+            if not rows_left:
+                return
+        raise ValueError(f"Truncated TIFF strip or tile in '{self.file_name}'")
+
+    # Returns the top row of a strip or tile
+    def tile_top(self, index):
+        return index // self.tiles_across * self.tile_height
+
+    # Converts 8-bit samples into native 32-bit ARGB pixels, keeping every step-th pixel
+    def to_argb(self, samples, step=1):
+        sample_step = self.samples_per_pixel * step
+        pixel_count = -(-len(samples) // sample_step)
+        pixels = bytearray(4 * pixel_count)
+        blue, green, red, alpha = ARGB_OFFSETS
+        if self.color_samples == 3:
+            pixels[red::4] = samples[0::sample_step]
+            pixels[green::4] = samples[1::sample_step]
+            pixels[blue::4] = samples[2::sample_step]
+        else:
+            gray = samples[0::sample_step]
+            pixels[red::4] = pixels[green::4] = pixels[blue::4] = gray
+        if self.has_alpha:
+            pixels[alpha::4] = samples[self.color_samples::sample_step]
+        else:
+            pixels[alpha::4] = b'\xff' * pixel_count
+        return pixels
+
+    # Yields bands of native 32-bit ARGB pixels, a few rows at a time
+    # Only every step-th row and every step-th pixel of those rows is kept
+    # Strips and tiles without a kept row are never read
+    def bands(self, step=1):
+        with open(self.file_name, 'rb') as file:
+            for top in range(0, self.height, self.tile_height):
+                rows = range(top + -top % step, min(top + self.tile_height, self.height), step)
+                if not rows:
+                    continue
+                if self.tile_width != self.width:
+                    yield self.tile_band(file, top, rows, step)
+                elif self.compression == COMPRESSION_NONE and self.predictor == PREDICTOR_NONE and step > 1:
+                    yield self.seek_band(file, top, rows, step)
+                else:
+                    yield from self.strip_bands(file, top, step)
+
+    # Returns the kept rows of a row of tiles, decoding each of its tiles whole
+    # Tiles are a few hundred pixels wide and high, so a row of them stays small
+    def tile_band(self, file, top, rows, step):
+        first_tile = top // self.tile_height * self.tiles_across
+        tiles = [b''.join(self.decode_rows(file, first_tile + column)) for column in range(self.tiles_across)]
+        tile_row_size = self.tile_width * self.samples_per_pixel
+        last_width = (self.width - (self.tiles_across - 1) * self.tile_width) * self.samples_per_pixel
+        band = []
+        for row in rows:
+            start = (row - top) * tile_row_size
+            samples = b''.join(tile[start:start + tile_row_size] for tile in tiles[:-1]) + tiles[-1][start:start + last_width]
+            band.append(self.to_argb(samples, step))
+        return b''.join(band)
+
+    # Returns the kept rows of an uncompressed strip, reading only those rows
+    def seek_band(self, file, top, rows, step):
+        strip = top // self.tile_height
+        row_size = self.tile_width * self.samples_per_pixel
+        band = []
+        for row in rows:
+            file.seek(self.offsets[strip] + (row - top) * row_size)
+            samples = file.read(row_size)
+            if len(samples) < row_size:
+                raise ValueError(f"Truncated TIFF strip in '{self.file_name}'")
+            band.append(self.to_argb(samples, step))
+        return b''.join(band)
+
+    # Yields the kept rows of a strip as it is decoded, so a strip holding the whole
+    # image is never held in memory at once
+    def strip_bands(self, file, top, step):
+        row_size = self.width * self.samples_per_pixel
+        row = top
+        for samples in self.decode_rows(file, top // self.tile_height):
+            count = len(samples) // row_size
+            if step == 1:
+                yield self.to_argb(samples)
+            else:
+                yield b''.join(self.to_argb(samples[(kept - row) * row_size:(kept - row + 1) * row_size], step)
+                               for kept in range(row + -row % step, row + count, step))
+            row += count
@@ -0,0 +1,71 @@
+from collections import Counter
+
+from .Bucketing import DEFAULT_PRECISION, EXACT_PRECISION, BucketTotals
+from .Histogram import PixelAccumulator
+from ..model.ColorHistogram import ColorHistogram
+
+# Color counts of a canvas kept per tile, so an edit only recounts the tiles it changed
+# Tiles are keyed by their (x, y) origin and identified by a checksum of their pixels
+# Tiles keep their exact colors so they can be subtracted, the totals are kept at the
+# precision, per color or per bucket, so updating them only costs the changed tiles
+class TileHistogram:
+    def __init__(self, precision=DEFAULT_PRECISION):
+        self.precision = precision
+        self.tiles = {}  # Tile key -> (checksum, ColorHistogram of the tile)
+        # Pixel count of every color, or the sums of every bucket, over all tiles
+        self.totals = Counter() if precision == EXACT_PRECISION else BucketTotals(precision)
+        self.total_colors = None  # Sorted histogram of the totals, built when first asked for after a change
+
+    # Returns whether the pixels of a tile differ from the ones counted
+    def is_dirty(self, key, checksum):
+        tile = self.tiles.get(key)
+        return tile is None or tile[0] != checksum
+
+    # Recounts the colors of one tile from its pixels, sampling every stride-th pixel
+    def update(self, key, checksum, pixels, stride=1):
+        accumulator = PixelAccumulator(skip_transparent=True)
+        accumulator.add(pixels, stride)
+        self.replace(key, checksum, accumulator.histogram())
+
+    # Replaces the counts of one tile
+    # Pixels changed between the sampled ones leave the colors, and the totals, as they were
+    def replace(self, key, checksum, histogram):
+        tile = self.tiles.get(key)
+        if tile is not None and tile[1] == histogram:
+            self.tiles[key] = (checksum, tile[1])
+            return
+
+        self.remove(key)
+        self.tiles[key] = (checksum, histogram)
+        self.add_totals(histogram, 1)
+
+    # Removes the counts of one tile, if it was counted
+    def remove(self, key):
+        tile = self.tiles.pop(key, None)
+        if tile is not None:
+            self.add_totals(tile[1], -1)
+
+    # Adds the colors of a tile to the totals, or takes them away with a sign of -1
+    def add_totals(self, histogram, sign):
+        self.total_colors = None
+        if self.precision != EXACT_PRECISION:
+            self.totals.add(histogram, sign)
+        elif sign > 0:
+            self.totals.update(dict(zip(histogram.colors, histogram.counts)))
+        else:
+            for color, count in histogram:
+                remaining = self.totals[color] - count
+                if remaining > 0:
+                    self.totals[color] = remaining
+                else:
+                    del self.totals[color]
+
+    # Returns a ColorHistogram of every tile, ordered from most to least common
+    # It is only built again once the tiles changed, so unchanged updates return the same histogram
+    def histogram(self):
+        if self.total_colors is None:
+            if self.precision == EXACT_PRECISION:
+                self.total_colors = ColorHistogram.from_pairs(self.totals.most_common())
+            else:
+                self.total_colors = self.totals.histogram()
+        return self.total_colors
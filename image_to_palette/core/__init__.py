@@ -0,0 +1,7 @@
+# Histogram imports NumPy, it is only loaded once count_pixels is first used
+# so registering the docker at Krita startup never pays for it
+def __getattr__(name):
+    if name == 'count_pixels':
+        from .Histogram import count_pixels
+        return count_pixels
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
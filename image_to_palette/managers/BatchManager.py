@@ -0,0 +1,184 @@
+from PyQt5.QtCore import QThread, QThreadPool, QTimer
+
+from ..core.ImageDecoder import is_krita_document
+from ..workers.BatchWorker import BatchWorker, save_batch_palette
+
+# Manages extracting palettes from many images at once on a bounded thread pool
+class BatchManager:
+    def __init__(self, parent):
+        self.parent = parent
+
+        # One thread per core, the remaining images wait in the pool's queue
+        self.thread_pool = QThreadPool()
+        self.thread_pool.setMaxThreadCount(max(QThread.idealThreadCount(), 1))
+
+        self.job_id = 0
+        self.workers = {}  # Job id -> worker of the current batch still queued or running
+        self.running_workers = {}  # Workers kept alive until their thread stops
+        self.total = 0
+        self.done = 0
+        self.failures = []
+        self.save_failures = []  # Images whose palette was extracted but could not be saved
+        self.documents = []  # Krita documents of the current batch not read yet
+
+        # Krita documents can only be opened from the GUI thread, one is read per
+        # event loop turn so progress is painted and cancelling stops the batch between them
+        self.document_timer = QTimer(parent)
+        self.document_timer.setSingleShot(True)
+        self.document_timer.setInterval(0)
+        self.document_timer.timeout.connect(self.read_next_document)
+
+    # Returns whether a batch is in progress
+    def is_running(self):
+        return bool(self.workers or self.documents)
+
+    # Starts extracting a palette from every given image
+    # Any batch or single extraction in progress is cancelled
+    def open_images(self, image_paths):
+        self.cancel()
+        self.parent.canvas_manager.set_follow_canvas(False)
+        self.parent.palette_manager.cancel_extraction()
+
+        # Reset history, the batch palettes replace it
+        self.parent.palette.palette_list.clear()
+        self.parent.palette.set_index(-1)
+
+        self.total = len(image_paths)
+        self.done = 0
+        self.failures = []
+        self.save_failures = []
+
+        settings_manager = self.parent.settings_manager
+        self.documents = [image_path for image_path in image_paths if is_krita_document(image_path)]
+        for image_path in image_paths:
+            if is_krita_document(image_path):
+                continue
+
+            # Late results of a cancelled batch are recognized by their job id no longer being tracked
+            self.job_id += 1
+            job_id = self.job_id
+            worker = BatchWorker(job_id, image_path, settings_manager.get_sample_size(),
+                                 self.parent.palette_manager.histogram_cache,
+                                 settings_manager.get_quantizer(), settings_manager.get_batch_autosave(),
+                                 settings_manager.get_precision(), settings_manager.get_min_distance(),
+                                 settings_manager.get_color_difference())
+            worker.signals.finished.connect(self.on_palette_finished)
+            worker.signals.failed.connect(self.on_palette_failed)
+            worker.signals.save_failed.connect(self.on_palette_save_failed)
+            worker.signals.stopped.connect(self.on_worker_stopped)
+
+            self.workers[job_id] = worker
+            self.running_workers[job_id] = worker
+            self.thread_pool.start(worker)
+
+        self.parent.image_name_label.setText(f"Processing {self.total} images...")
+        self.parent.ui_manager.set_progress(0, self.total)
+
+        # Documents are read while the workers run
+        if self.documents:
+            self.document_timer.start()
+
+    # Reads the next Krita document of the batch, then schedules the one after it
+    # The document stays in the list while it is read, so the batch still counts as running
+    # and a cancel made while Krita loads it drops its palette
+    def read_next_document(self):
+        documents = self.documents
+        if not documents:
+            return
+        image_path = documents[0]
+
+        try:
+            palette = self.parent.canvas_manager.extract_document_palette(image_path)
+        except Exception as e:
+            palette = None
+            message = str(e)
+        # Cancelling or starting another batch replaces the list
+        if self.documents is not documents:
+            return
+        documents.pop(0)
+        if documents:
+            self.document_timer.start()
+
+        if palette is None:
+            self.add_failure(image_path, message)
+            return
+        if self.parent.settings_manager.get_batch_autosave():
+            try:
+                save_batch_palette(image_path, palette)
+            except OSError as e:
+                self.save_failures.append(f"{image_path}: {e}")
+        self.add_palette(image_path, palette)
+
+    # Cancels every image of the current batch not processed yet
+    def cancel(self):
+        if self.is_running():
+            self.parent.ui_manager.set_busy(False)
+        self.document_timer.stop()
+        self.documents = []
+        for job_id, worker in self.workers.items():
+            worker.cancel()
+            if self.thread_pool.tryTake(worker):
+                self.running_workers.pop(job_id, None)
+        self.workers.clear()
+
+    # Adds a finished palette to the navigation history
+    def on_palette_finished(self, job_id, image_path, palette):
+        if self.workers.pop(job_id, None) is not None:
+            self.add_palette(image_path, palette)
+
+    # Records an image whose palette could not be extracted
+    def on_palette_failed(self, job_id, image_path, message):
+        if self.workers.pop(job_id, None) is not None:
+            self.add_failure(image_path, message)
+
+    # Records an image whose palette was extracted but could not be saved next to it
+    # Posted before the palette itself, so the worker is still tracked
+    def on_palette_save_failed(self, job_id, image_path, message):
+        if job_id in self.workers:
+            self.save_failures.append(f"{image_path}: {message}")
+
+    # Adds the palette of an image of the batch to the navigation history
+    def add_palette(self, image_path, palette):
+        palette_list = self.parent.palette.palette_list
+        palette_list.append(palette)
+        self.parent.library_manager.record_palette(palette, image_path)
+
+        # Display the first palette as soon as it is ready
+        if len(palette_list) == 1:
+            self.parent.palette.set_index(0)
+            self.parent.palette_manager.display_palette()
+            self.parent.ui_manager.enable_buttons()
+        self.parent.palette_manager.update_nav_buttons()
+
+        self.on_image_done()
+
+    # Records an image of the batch whose palette could not be extracted
+    def add_failure(self, image_path, message):
+        self.failures.append(f"{image_path}: {message}")
+        self.on_image_done()
+
+    # Releases a worker once its thread is done with it
+    def on_worker_stopped(self, job_id):
+        self.running_workers.pop(job_id, None)
+
+    # Updates the progress, reporting the failures once every image is processed
+    def on_image_done(self):
+        self.done += 1
+        self.parent.ui_manager.set_progress(self.done, self.total)
+        if self.done < self.total:
+            return
+
+        self.parent.ui_manager.set_busy(False)
+        succeeded = self.total - len(self.failures)
+        self.parent.image_name_label.setText(
+            self.parent.palette.image_name if succeeded else "No palette loaded")
+
+        if self.failures:
+            self.parent.ui_manager.show_error_popup(
+                "Error Opening Files",
+                f"{len(self.failures)} of {self.total} images could not be opened:\n" + "\n".join(self.failures))
+        if self.save_failures:
+            self.parent.ui_manager.show_error_popup(
+                "Error Saving Palettes",
+                f"{len(self.save_failures)} of {self.total} palettes could not be saved next to their image:\n"
+                + "\n".join(self.save_failures))
@@ -0,0 +1,287 @@
+import os
+
+from PyQt5.QtCore import QRect, QThreadPool, QTimer
+from krita import Krita
+
+from ..core.CanvasSampler import (SUPPORTED_COLOR_DEPTH, SUPPORTED_COLOR_MODEL, TileSweep, is_supported_color_space,
+                                   read_dirty_tiles, sample_canvas, sample_stride)
+from ..core.Extraction import PALETTE_SIZE, create_palette, generate_colors, new_seed
+from ..core.TileHistogram import TileHistogram
+from ..workers.TileUpdateWorker import TileUpdateWorker
+
+# Parts of the active document a palette can be created from, in menu order
+CANVAS_SCOPES = {
+    'document': 'Active Document',
+    'layer': 'Current Layer',
+    'selection': 'Selection',
+}
+
+# Interval between two checks of a followed canvas for changes
+FOLLOW_INTERVAL_MS = 400
+
+# Checks a followed canvas may keep changing before its palette is updated anyway
+MAX_PENDING_CHECKS = 5
+
+# Largest sample size of a followed canvas, as it is read again on every check
+FOLLOW_MAX_SAMPLE_SIZE = 1024
+
+# Pixels of a followed canvas a check reads besides the tiles around the changes found
+FOLLOW_PIXELS_PER_CHECK = 1024 * 1024
+
+# Profile documents of other color spaces are converted to before being read
+SRGB_PROFILE = 'sRGB-elle-V2-srgbtrc.icc'
+
+# Manages creating palettes straight from the pixels of the open Krita document
+# Pixels are read through the Krita API, which must be used from the GUI thread,
+# but only the sampled rows are copied out so large canvases stay fast
+class CanvasManager:
+    def __init__(self, parent):
+        self.parent = parent
+
+        # Follow canvas state
+        # Krita does not report which part of a document a stroke changed, so the
+        # canvas is polled instead and only the tiles whose checksum changed are recounted
+        # A check reads the tiles around the last changes and a slice of a sweep over the
+        # canvas, the whole canvas is only read when a document starts being followed
+        self.following = False
+        self.follow_timer = QTimer(parent)
+        self.follow_timer.setInterval(FOLLOW_INTERVAL_MS)
+        self.follow_timer.timeout.connect(self.check_followed_canvas)
+        self.thread_pool = QThreadPool()
+        self.tile_histogram = None
+        self.follow_key = None  # Document, bounds and stride the tile histogram was counted for
+        self.tile_sweep = None
+        self.pending_tiles = None  # Changed tiles waiting for the canvas to settle, with their pixels
+        self.pending_checks = 0
+        self.palette_shown = False  # Whether the palette of the followed document is displayed
+        self.update_worker = None
+        self.update_job_id = 0
+        self.running_workers = {}  # Workers kept alive until their thread stops
+
+    # Creates a new palette from the given scope of the active document
+    def create_palette_from_canvas(self, scope):
+        document = Krita.instance().activeDocument()
+        if document is None:
+            self.parent.ui_manager.show_error_popup("No Document", "Open a document to create a palette from it.")
+            return
+
+        # Any file extraction in progress would replace the canvas palette
+        self.set_follow_canvas(False)
+        self.parent.batch_manager.cancel()
+        self.parent.palette_manager.cancel_extraction()
+        self.parent.ui_manager.set_busy(False)
+
+        try:
+            name, total_colors = self.sample(document, scope)
+        except Exception as e:
+            self.parent.ui_manager.show_error_popup("Error Reading Canvas", f"An error occurred while reading the canvas: {e}")
+            return
+
+        self.parent.palette_manager.show_new_palette(name, total_colors)
+
+    # Creates a new palette from a document file only Krita can open, such as a .kra or .psd
+    def create_palette_from_document_file(self, file_name):
+        self.set_follow_canvas(False)
+        self.parent.batch_manager.cancel()
+        self.parent.palette_manager.cancel_extraction()
+        self.parent.ui_manager.set_busy(False)
+
+        self.parent.palette_manager.show_new_palette(file_name, self.read_document_file(file_name))
+
+    # Extracts a complete palette from a document file only Krita can open
+    def extract_document_palette(self, file_name):
+        total_colors = self.read_document_file(file_name)
+        seed = new_seed()
+        settings_manager = self.parent.settings_manager
+        method = settings_manager.get_quantizer()
+        palette_colors = generate_colors(total_colors, method, PALETTE_SIZE, seed,
+                                         settings_manager.get_min_distance(), settings_manager.get_color_difference())
+        return create_palette(file_name, total_colors, palette_colors, seed, method)
+
+    # Counts the colors of the merged image of a document file, opened through Krita's own loaders
+    # The document is never shown, and closed once read
+    def read_document_file(self, file_name):
+        document = Krita.instance().openDocument(file_name)
+        if document is None:
+            raise ValueError(f"Krita is unable to open '{file_name}'.")
+
+        try:
+            document.waitForDone()
+            # The document is a private copy, so it can be converted to a color space the sampler reads
+            if not is_supported_color_space(document.colorModel(), document.colorDepth()):
+                if not document.setColorSpace(SUPPORTED_COLOR_MODEL, SUPPORTED_COLOR_DEPTH, SRGB_PROFILE):
+                    raise ValueError(f"Unable to convert '{file_name}' to 8-bit RGBA.")
+                document.waitForDone()
+            return self.sample(document, 'document')[1]
+        finally:
+            document.close()
+
+    # Counts the colors of the given scope of a document
+    # Returns the name shown for the palette and its ColorHistogram
+    def sample(self, document, scope):
+        document_name = os.path.basename(document.fileName()) or document.name()
+        sample_size = self.parent.settings_manager.get_sample_size()
+        read_mask = None
+
+        if scope == 'layer':
+            node = document.activeNode()
+            if node is None:
+                raise ValueError("The document has no active layer.")
+            check_color_space(node.colorModel(), node.colorDepth())
+
+            # Layers may extend past the canvas, only the visible part is sampled
+            bounds = node.bounds().intersected(document.bounds())
+            read_pixels = node.projectionPixelData
+            name = f"{document_name} - {node.name()}"
+        elif scope == 'selection':
+            selection = document.selection()
+            if selection is None:
+                raise ValueError("The document has no selection.")
+            check_color_space(document.colorModel(), document.colorDepth())
+
+            bounds = QRect(selection.x(), selection.y(), selection.width(), selection.height()).intersected(document.bounds())
+            read_pixels = document.pixelData
+            read_mask = selection.pixelData
+            name = f"{document_name} - Selection"
+        else:
+            check_color_space(document.colorModel(), document.colorDepth())
+            bounds = document.bounds()
+            read_pixels = document.pixelData
+            name = document_name
+
+        if bounds.isEmpty():
+            raise ValueError("There are no pixels to sample.")
+
+        total_colors = sample_canvas(read_pixels, bounds.x(), bounds.y(), bounds.width(), bounds.height(),
+                                     sample_size, read_mask, precision=self.parent.settings_manager.get_precision())
+        if not total_colors:
+            raise ValueError("Every sampled pixel is transparent.")
+        return name, total_colors
+
+    # Turns following the active document on or off
+    # While followed, the palette is kept up to date with the painting
+    def set_follow_canvas(self, enabled):
+        if enabled == self.following:
+            return
+        self.following = enabled
+        self.parent.follow_canvas_action.setChecked(enabled)
+
+        self.tile_histogram = None
+        self.follow_key = None
+        self.tile_sweep = None
+        self.pending_tiles = None
+        self.pending_checks = 0
+        if self.update_worker is not None:
+            # Its result is ignored once the job id changes
+            self.update_job_id += 1
+            self.update_worker = None
+
+        if enabled:
+            self.parent.batch_manager.cancel()
+            self.parent.palette_manager.cancel_extraction()
+            self.parent.ui_manager.set_busy(False)
+            self.check_followed_canvas()
+            self.follow_timer.start()
+        else:
+            self.follow_timer.stop()
+
+    # Reads the followed canvas, recounting its changed tiles once it stops changing
+    def check_followed_canvas(self):
+        document = Krita.instance().activeDocument()
+        if document is None or self.update_worker is not None or not self.parent.isVisible():
+            return
+
+        try:
+            check_color_space(document.colorModel(), document.colorDepth())
+        except ValueError as e:
+            self.set_follow_canvas(False)
+            self.parent.ui_manager.show_error_popup("Error Reading Canvas", str(e))
+            return
+
+        bounds = document.bounds()
+        sample_size = self.parent.settings_manager.get_sample_size() or FOLLOW_MAX_SAMPLE_SIZE
+        stride = sample_stride(bounds.width(), bounds.height(), min(sample_size, FOLLOW_MAX_SAMPLE_SIZE))
+
+        # Another document, size or sample size invalidates every tile, the whole canvas is counted
+        precision = self.parent.settings_manager.get_precision()
+        follow_key = (document.fileName(), document.name(), bounds.width(), bounds.height(), stride, precision)
+        if follow_key != self.follow_key:
+            self.follow_key = follow_key
+            self.tile_histogram = TileHistogram(precision)
+            self.tile_sweep = TileSweep(bounds.width(), bounds.height(), stride)
+            self.pending_tiles = None
+            self.pending_checks = 0
+            self.palette_shown = False
+            self.start_tile_update(document, read_dirty_tiles(document.pixelData, self.tile_sweep.tiles,
+                                                              self.tile_histogram.is_dirty), stride)
+            return
+
+        # Pending tiles are read again on every check, so they are still dirty or were undone
+        pending = self.pending_tiles or {}
+        tiles = self.tile_sweep.next_tiles(pending, FOLLOW_PIXELS_PER_CHECK)
+        dirty_tiles = read_dirty_tiles(document.pixelData, tiles, self.tile_histogram.is_dirty)
+        if not dirty_tiles:
+            self.pending_tiles = None
+            self.pending_checks = 0
+            return
+
+        # Debounce, tiles are only recounted once a check finds the same changes as
+        # the previous one, or the canvas has been changing for too long
+        checksums = {key: checksum for key, (checksum, _) in dirty_tiles.items()}
+        pending_checksums = {key: checksum for key, (checksum, _) in pending.items()}
+        if checksums != pending_checksums and self.pending_checks < MAX_PENDING_CHECKS:
+            self.pending_tiles = dirty_tiles
+            self.pending_checks += 1
+            return
+        self.pending_tiles = None
+        self.pending_checks = 0
+        self.start_tile_update(document, dirty_tiles, stride)
+
+    # Recounts the changed tiles of the followed canvas on the thread pool
+    def start_tile_update(self, document, dirty_tiles, stride):
+        self.update_job_id += 1
+        name = os.path.basename(document.fileName()) or document.name()
+        worker = TileUpdateWorker(self.update_job_id, name, self.tile_histogram, dirty_tiles, stride)
+        worker.signals.finished.connect(self.on_update_finished)
+        worker.signals.failed.connect(self.on_update_failed)
+        worker.signals.stopped.connect(self.on_update_stopped)
+
+        self.update_worker = worker
+        self.running_workers[worker.job_id] = worker
+        self.thread_pool.start(worker)
+
+    # Shows the palette of the followed canvas once its changed tiles are recounted
+    def on_update_finished(self, job_id, name, total_colors):
+        if job_id != self.update_job_id or self.update_worker is None:
+            return
+        self.update_worker = None
+
+        # Recounted tiles whose sampled colors did not change give back the palette's own histogram
+        if not total_colors or (self.palette_shown and total_colors is self.parent.palette.total_colors):
+            return
+
+        # The first count of a document starts a new history, later ones keep the current palette's seed
+        if self.palette_shown:
+            self.parent.palette_manager.refresh_palette(total_colors)
+        else:
+            self.parent.palette_manager.show_new_palette(name, total_colors)
+            self.palette_shown = True
+
+    # Stops following a canvas whose tiles could not be recounted
+    def on_update_failed(self, job_id, name, message):
+        if job_id != self.update_job_id or self.update_worker is None:
+            return
+        self.update_worker = None
+
+        self.set_follow_canvas(False)
+        self.parent.ui_manager.show_error_popup("Error Reading Canvas", f"An error occurred while reading the canvas: {message}")
+
+    # Releases a worker once its thread is done with it
+    def on_update_stopped(self, job_id):
+        self.running_workers.pop(job_id, None)
+
+# Raises a ValueError if pixel data of the given color space cannot be counted
+def check_color_space(color_model, color_depth):
+    if not is_supported_color_space(color_model, color_depth):
+        raise ValueError(f"Only 8-bit RGBA images can be sampled, this one is {color_model} {color_depth}. "
+                         "Convert the image or create the palette from an exported file instead.")
@@ -0,0 +1,148 @@
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QTableWidget, QTableWidgetItem,
+                             QHeaderView, QAbstractItemView, QFileDialog)
+
+from ..core.Instrumentation import tracer
+
+# Interval the debug panel picks up the spans recorded in the meantime
+REFRESH_INTERVAL_MS = 500
+
+# Number of spans listed in the debug panel, newest first
+PANEL_ROWS = 100
+
+# Columns of the debug panel
+PANEL_COLUMNS = ['Stage', 'Time (ms)', 'Pixels', 'Peak Memory', 'Thread', 'Details']
+
+# Returns a byte size as a short human readable string
+def format_bytes(size):
+    if size is None:
+        return ''
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f'{size:.0f} {unit}'
+        size /= 1024
+    return f'{size:.1f} GB'
+
+# Panel listing the latest timed pipeline stages
+class DebugPanel(QWidget):
+    def __init__(self, debug_manager):
+        super().__init__()
+        self.debug_manager = debug_manager
+        self.last_event = None  # Newest span listed, so the table is only rebuilt when new ones come in
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(5, 0, 5, 5)
+
+        button_layout = QHBoxLayout()
+        self.memory_button = QPushButton('Track Memory')
+        self.memory_button.setCheckable(True)
+        self.memory_button.setToolTip('Measure the peak allocation of each stage, slowing them down')
+        self.memory_button.toggled.connect(tracer.set_track_memory)
+        clear_button = QPushButton('Clear')
+        clear_button.clicked.connect(self.clear)
+        save_button = QPushButton('Save Trace...')
+        save_button.clicked.connect(self.debug_manager.save_trace_dialog)
+        button_layout.addWidget(self.memory_button)
+        button_layout.addWidget(clear_button)
+        button_layout.addWidget(save_button)
+        layout.addLayout(button_layout)
+
+        # Time the docker took to register at Krita startup and to build when first shown
+        self.startup_label = QLabel()
+        self.startup_label.setWordWrap(True)
+        layout.addWidget(self.startup_label)
+
+        self.table = QTableWidget(0, len(PANEL_COLUMNS))
+        self.table.setHorizontalHeaderLabels(PANEL_COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setMinimumHeight(150)
+        layout.addWidget(self.table)
+
+    # Lists the newest spans when new ones were recorded
+    def refresh(self):
+        costs = ', '.join(f'{name} {seconds * 1000:.1f} ms' for name, seconds in tracer.startup_costs.items())
+        self.startup_label.setText(f'Startup: {costs}' if costs else '')
+
+        events = tracer.snapshot()
+        newest = events[-1] if events else None
+        if newest is self.last_event:
+            return
+        self.last_event = newest
+
+        rows = events[-PANEL_ROWS:][::-1]
+        self.table.setRowCount(len(rows))
+        for row, event in enumerate(rows):
+            fields = dict(event["fields"])
+            pixels = fields.pop("pixels", None)
+            if event["error"] is not None:
+                fields["error"] = event["error"]
+            values = [event["name"], f'{event["duration_ms"]:.1f}', f'{pixels:,}' if pixels is not None else '',
+                      format_bytes(event["peak_bytes"]), event["thread"],
+                      ', '.join(f'{name}={value}' for name, value in fields.items())]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+
+    # Drops the recorded spans
+    def clear(self):
+        tracer.clear()
+        self.refresh()
+
+# Manages the instrumentation of the pipeline and the panel showing it
+# While the panel is hidden spans are disabled, and cost a single check each
+class DebugManager:
+    def __init__(self, parent):
+        self.parent = parent
+        self.panel = None  # Created with the main widget
+
+        # The panel polls the tracer, spans are recorded from worker threads
+        self.refresh_timer = QTimer(parent)
+        self.refresh_timer.setInterval(REFRESH_INTERVAL_MS)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+        tracer.set_enabled(self.parent.settings_manager.get_debug_panel())
+
+    # Creates and returns the debug panel, shown if enabled in the settings
+    def create_panel(self):
+        self.panel = DebugPanel(self)
+        self.panel.setVisible(tracer.enabled)
+        if tracer.enabled:
+            self.refresh_timer.start()
+        return self.panel
+
+    # Shows or hides the debug panel, enabling the spans only while it is shown
+    def set_debug_panel(self, enabled):
+        self.parent.settings_manager.set_debug_panel(enabled)
+        tracer.set_enabled(enabled)
+        if self.panel is not None:
+            # Disabling the spans also stops tracing allocations
+            if not enabled:
+                self.panel.memory_button.setChecked(False)
+            self.panel.setVisible(enabled)
+        if enabled:
+            self.refresh_timer.start()
+        else:
+            self.refresh_timer.stop()
+
+    # Lists the spans recorded since the last refresh
+    def refresh(self):
+        if self.panel is not None:
+            self.panel.refresh()
+
+    # Opens a file dialog to save the recorded spans as a Chrome trace
+    def save_trace_dialog(self):
+        options = QFileDialog.Options()
+        file_name, _ = QFileDialog.getSaveFileName(
+            self.parent,
+            "Save Trace",
+            "image_to_palette_trace.json",
+            "Trace Files (*.json)",
+            options=options)
+
+        if file_name:
+            try:
+                tracer.dump(file_name)
+            except Exception as e:
+                self.parent.ui_manager.show_error_popup("Error Saving Trace", f"An error occurred while saving the trace: {e}")
@@ -1,68 +1,108 @@
-import json
-from PyQt5.QtWidgets import QFileDialog
-from .UIManager import UIManager
-from ..model.Palette import Palette
+import os
+import re
+from PyQt5.QtWidgets import QFileDialog, QMessageBox
+from ..core.ImageDecoder import KRITA_DOCUMENT_EXTENSIONS, image_extensions, is_krita_document
+from ..core.PaletteExport import ASE_EXTENSION, GPL_EXTENSION, KPL_EXTENSION, export_palettes, is_export_format
+from ..core.PaletteFile import BINARY_PALETTE_EXTENSION, load_palette_file, save_palette_file
+from ..core.PaletteLibrary import KIND_SAVED
+
+# File dialog filters of the supported palette files
+PALETTE_FILE_FILTER = f"Palette Files (*.json *{BINARY_PALETTE_EXTENSION})"
+JSON_FILE_FILTER = "JSON Files (*.json)"
+BINARY_FILE_FILTER = f"Binary Palette Files (*{BINARY_PALETTE_EXTENSION})"
+
+# File dialog filters of the palette formats of other applications, and their extensions
+EXPORT_FILE_FILTERS = {
+    f"Krita Palettes (*{KPL_EXTENSION})": KPL_EXTENSION,
+    f"GIMP Palettes (*{GPL_EXTENSION})": GPL_EXTENSION,
+    f"Adobe Swatch Exchange Files (*{ASE_EXTENSION})": ASE_EXTENSION,
+}
+
+# Returns the file dialog filter of every image and document palettes can be created from
+def image_file_filter():
+    patterns = ' '.join(f'*{extension}' for extension in sorted(set(image_extensions() + KRITA_DOCUMENT_EXTENSIONS)))
+    return f"Images ({patterns})"
 
 class FileManager:
     def __init__(self, parent):
         self.parent = parent
-        self.ui_manager = UIManager(parent)
 
-    # Opens a file dialog to select an image file
+    # Opens a file dialog to select one or more image files
     def open_image_dialog(self):
         options = QFileDialog.Options()
-        file_name, _ = QFileDialog.getOpenFileName(
+        file_names, _ = QFileDialog.getOpenFileNames(
             self.parent,
-            "Open Image File",
+            "Open Image Files",
             "",
-            "Images (*.png *.jpg *.bmp)",
+            image_file_filter(),
             options=options)
         
-        if file_name:
+        if file_names:
             try:
-                self.open_image(file_name)
+                self.open_images(file_names)
             except Exception as e:
-                self.ui_manager.show_error_popup("Error Opening File", f"An error occurred while opening the file: {e}")
+                self.parent.ui_manager.show_error_popup("Error Opening File", f"An error occurred while opening the file: {e}")
+
+    # Opens a single image, or a batch of images whose palettes are extracted in parallel
+    def open_images(self, file_names):
+        if len(file_names) == 1:
+            self.open_image(file_names[0])
+        else:
+            self.parent.batch_manager.open_images(file_names)
     
     # Opens a new palette from the loaded image
+    # The palette is displayed once its colors are collected in the background
     def open_image(self, file_name):
+        # Documents only Krita can open are read through Krita on the GUI thread
+        if is_krita_document(file_name):
+            self.parent.image_path = file_name
+            self.parent.canvas_manager.create_palette_from_document_file(file_name)
+            return
+
+        self.parent.canvas_manager.set_follow_canvas(False)
+        self.parent.batch_manager.cancel()
         self.parent.image_path = file_name
         self.parent.palette_manager.create_palette_from_image()
-        self.parent.image_name_label.setText(f"{self.parent.image_path.split('/')[-1]}")
+        self.parent.image_name_label.setText(f"Loading {self.parent.image_path.split('/')[-1]}...")
 
-    # Opens a file dialog to load a palette json file
+    # Creates a palette of each region of an image, decoding it only once
+    # Regions are Region rectangles, and the colors of an optional mask image
+    def open_image_regions(self, file_name, regions, mask_path=None):
+        self.parent.canvas_manager.set_follow_canvas(False)
+        self.parent.batch_manager.cancel()
+        self.parent.image_path = file_name
+        self.parent.palette_manager.create_palettes_from_regions(file_name, regions, mask_path)
+        self.parent.image_name_label.setText(f"Loading {file_name.split('/')[-1]}...")
+
+    # Opens a file dialog to load a palette json or binary file
     def load_palette_dialog(self):
         options = QFileDialog.Options()
         file_name, _ = QFileDialog.getOpenFileName(
             self.parent,
             "Open Palette File",
             "",
-            "JSON Files (*.json)",
+            ";;".join([PALETTE_FILE_FILTER, JSON_FILE_FILTER, BINARY_FILE_FILTER]),
             options=options)
         
         if file_name:
             try:
                 self.load_palette(file_name)
             except Exception as e:
-                self.ui_manager.show_error_popup("Error Loading File", f"An error occurred while loading the file: {e}")
+                self.parent.ui_manager.show_error_popup("Error Loading File", f"An error occurred while loading the file: {e}")
 
     # Loads a palette from a file and updates the UI
+    # Binary files only have their header read, the histogram is mapped when needed
     def load_palette(self, file_name):
-        with open(file_name, 'r') as file:
-            palette_data = json.load(file)
-        
-        # Initializes and displays the palette from the data
-        self.parent.palette.from_json(palette_data)
+        self.parent.canvas_manager.set_follow_canvas(False)
+        self.parent.batch_manager.cancel()
+        load_palette_file(file_name, self.parent.palette)
 
         # Reset palette navigation state
         self.parent.palette.palette_list.clear()
         self.parent.palette.set_index(-1)
 
         # Add loaded palette to history
-        palette_snapshot = Palette()
-        palette_snapshot.cur_colors = list(self.parent.palette.cur_colors)
-        palette_snapshot.total_colors = list(self.parent.palette.total_colors)
-        palette_snapshot.image_name = self.parent.palette.image_name
+        palette_snapshot = self.parent.palette.snapshot()
 
         self.parent.palette.palette_list.append(palette_snapshot)
         self.parent.palette.set_index(0)
@@ -73,7 +113,7 @@ class FileManager:
         self.parent.palette_manager.display_palette()
         
         # Get and update the origin image name of the palette
-        image_name = palette_data.get("image_name", "No image name.")
+        image_name = self.parent.palette.image_name or "No image name."
         self.parent.image_name_label.setText(image_name)
         
         # Update the Recent Palettes ComboBox to include the palette
@@ -82,27 +122,83 @@ class FileManager:
         # Enable save and regenerate buttons
         self.parent.ui_manager.enable_buttons()
 
-    # Opens a file dialog to save a palette json file
+    # Opens a file dialog to save a palette json or binary file
     def save_palette_dialog(self):
         options = QFileDialog.Options()
-        file_name, _ = QFileDialog.getSaveFileName(
+        file_name, selected_filter = QFileDialog.getSaveFileName(
             self.parent,
             "Save Palette File",
             "",
-            "JSON Files (*.json)",
+            ";;".join([JSON_FILE_FILTER, BINARY_FILE_FILTER, *EXPORT_FILE_FILTERS]),
             options=options)
         
         if file_name:
-            if not file_name.lower().endswith('.json'):
-                file_name += '.json'
+            extension = BINARY_PALETTE_EXTENSION if selected_filter == BINARY_FILE_FILTER else '.json'
+            extension = EXPORT_FILE_FILTERS.get(selected_filter, extension)
+            if not file_name.lower().endswith(('.json', BINARY_PALETTE_EXTENSION)) and not is_export_format(file_name):
+                file_name += extension
             try:
                 self.save_palette(file_name)
             except Exception as e:
-                self.ui_manager.show_error_popup("Error Saving File", f"An error occurred while saving the file: {e}")
+                self.parent.ui_manager.show_error_popup("Error Saving File", f"An error occurred while saving the file: {e}")
 
-    # Saves the current palette to a json file
+    # Saves the current palette to a json or binary file, depending on its extension
+    # Palettes exported to the formats of other applications can't be loaded back,
+    # they are left out of the recent palettes
     def save_palette(self, file_name):
-        with open(file_name, 'w') as file:
-            json.dump(self.parent.palette.to_json(), file)
+        if is_export_format(file_name):
+            export_palettes(file_name, [self.parent.palette])
+            return
+
+        save_palette_file(file_name, self.parent.palette)
         
-        self.parent.recent_palettes_manager.update_recent_palettes(file_name)
\ No newline at end of file
+        self.parent.recent_palettes_manager.update_recent_palettes(file_name)
+        self.parent.library_manager.record_palette(self.parent.palette, file_name, KIND_SAVED)
+
+    # Opens a file dialog to export palettes to a Krita, GIMP or Adobe palette file
+    # palettes is an iterable, each palette becomes a group of swatches of the file
+    def export_palettes_dialog(self, palettes, title="Export Palettes"):
+        options = QFileDialog.Options()
+        file_name, selected_filter = QFileDialog.getSaveFileName(
+            self.parent,
+            title,
+            "",
+            ";;".join(EXPORT_FILE_FILTERS),
+            options=options)
+
+        if file_name:
+            if not is_export_format(file_name):
+                file_name += EXPORT_FILE_FILTERS.get(selected_filter, KPL_EXTENSION)
+            try:
+                export_palettes(file_name, palettes)
+            except Exception as e:
+                self.parent.ui_manager.show_error_popup("Error Exporting Palettes", f"An error occurred while exporting the palettes: {e}")
+
+    # Exports every palette of the navigation history, which holds the palettes of a whole batch
+    def export_history_dialog(self):
+        self.export_palettes_dialog(self.parent.palette.palette_list, "Export Palette History")
+
+    # Writes the current palette as a Krita palette into Krita's palette resources
+    # Krita's scripting API can't register a resource while it runs, the palette is
+    # listed in the Palette docker once Krita restarts or the file is imported
+    def add_to_krita_palettes(self):
+        name = self.parent.palette.image_name or "Image Palette"
+        base_name = re.sub(r'[^\w\- ]+', '_', os.path.splitext(name)[0]).strip() or "palette"
+        file_name = os.path.join(self.parent.KRITA_PALETTES_DIR, f"{base_name}{KPL_EXTENSION}")
+        number = 1
+        while os.path.exists(file_name):
+            number += 1
+            file_name = os.path.join(self.parent.KRITA_PALETTES_DIR, f"{base_name} {number}{KPL_EXTENSION}")
+
+        try:
+            os.makedirs(self.parent.KRITA_PALETTES_DIR, exist_ok=True)
+            export_palettes(file_name, [self.parent.palette], name)
+        except Exception as e:
+            self.parent.ui_manager.show_error_popup("Error Exporting Palette", f"An error occurred while adding the palette to Krita: {e}")
+            return
+
+        QMessageBox.information(
+            self.parent,
+            "Palette Added",
+            f"The palette was saved to {file_name}.\n\nKrita lists it in the Palette docker after a restart, "
+            "or right away once imported with Settings > Manage Resources > Import Resources.")
\ No newline at end of file
@@ -0,0 +1,214 @@
+import os
+import sqlite3
+from datetime import datetime
+
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QSize, QThreadPool, QTimer
+from PyQt5.QtWidgets import QApplication, QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QListView, QColorDialog
+
+from ..core.PaletteLibrary import KIND_GENERATED, KIND_SAVED, PaletteLibrary, library_record
+from ..workers.LibraryWriter import LibraryWriter
+from .UIManager import create_swatch_icon
+
+# Size of the swatch strip shown for each library palette
+LIBRARY_ICON_SIZE = QSize(100, 16)
+
+# Delay merging the palettes recorded in a burst, such as a batch, into a single transaction
+LIBRARY_WRITE_DELAY_MS = 500
+
+# Lists library palettes, fetching them from the database one page at a time as
+# the view scrolls, so an unbounded history is never loaded into memory at once
+class LibraryModel(QAbstractListModel):
+    PAGE_SIZE = 50
+
+    def __init__(self, library):
+        super().__init__()
+        self.library = library
+        self.entries = []
+        self.search_results = None  # Palette ids of a color search, or None to browse the history
+        self.exhausted = False
+
+    # Browses every palette, newest first
+    def show_history(self):
+        self.beginResetModel()
+        self.entries = []
+        self.search_results = None
+        self.exhausted = False
+        self.endResetModel()
+
+    # Lists the palettes of a color search, closest first
+    def show_search_results(self, palette_ids):
+        self.beginResetModel()
+        self.entries = []
+        self.search_results = palette_ids
+        self.exhausted = False
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.entries)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self.entries[index.row()]
+        if role == Qt.DisplayRole:
+            created = datetime.fromtimestamp(entry.created).strftime('%Y-%m-%d %H:%M')
+            return f"{entry.image_name or 'No image name.'}\n{created} - {entry.kind}"
+        if role == Qt.DecorationRole:
+            return create_swatch_icon(entry.colors, LIBRARY_ICON_SIZE)
+        if role == Qt.ToolTipRole:
+            return entry.source
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+
+    # Reads the next page of palettes
+    def fetchMore(self, parent=QModelIndex()):
+        if self.search_results is None:
+            before_id = self.entries[-1].palette_id if self.entries else None
+            page = self.library.page(before_id, self.PAGE_SIZE)
+        else:
+            start = len(self.entries)
+            page = self.library.get(self.search_results[start:start + self.PAGE_SIZE])
+            if start + self.PAGE_SIZE >= len(self.search_results):
+                self.exhausted = True
+
+        if len(page) < self.PAGE_SIZE:
+            self.exhausted = True
+        if page:
+            self.beginInsertRows(QModelIndex(), len(self.entries), len(self.entries) + len(page) - 1)
+            self.entries.extend(page)
+            self.endInsertRows()
+
+# Dialog browsing the palette library and searching it by color
+class LibraryDialog(QDialog):
+    def __init__(self, library_manager, parent):
+        super().__init__(parent)
+        self.library_manager = library_manager
+        self.setWindowTitle('Palette Library')
+        self.resize(360, 480)
+
+        self.model = LibraryModel(library_manager.library)
+
+        layout = QVBoxLayout(self)
+        button_layout = QHBoxLayout()
+        find_button = QPushButton('Find Color...')
+        find_button.clicked.connect(self.find_color)
+        history_button = QPushButton('Show All')
+        history_button.clicked.connect(self.show_history)
+        export_button = QPushButton('Export...')
+        export_button.clicked.connect(self.export_palettes)
+        button_layout.addWidget(find_button)
+        button_layout.addWidget(history_button)
+        button_layout.addWidget(export_button)
+        layout.addLayout(button_layout)
+
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+
+        self.view = QListView()
+        self.view.setIconSize(LIBRARY_ICON_SIZE)
+        self.view.setUniformItemSizes(True)
+        self.view.setModel(self.model)
+        self.view.doubleClicked.connect(lambda index: self.library_manager.open_entry(self.model.entries[index.row()]))
+        layout.addWidget(self.view)
+
+        self.show_history()
+
+    # Lists every palette of the library
+    def show_history(self):
+        self.model.show_history()
+        self.status_label.setText(f"{self.library_manager.library.count()} palettes, double-click to open one.")
+
+    # Lists the palettes holding a color close to one picked by the user
+    def find_color(self):
+        color = QColorDialog.getColor(parent=self)
+        if not color.isValid():
+            return
+
+        results = self.library_manager.library.find_by_color(color.rgb())
+        self.model.show_search_results([palette_id for palette_id, _ in results])
+        self.status_label.setText(f"{len(results)} palettes with a color close to {color.name()}.")
+
+    # Exports the listed palettes, the whole library or the search results, to a palette file
+    # Palettes are read from the database as they are written rather than all at once
+    def export_palettes(self):
+        library = self.library_manager.library
+        self.library_manager.parent.file_manager.export_palettes_dialog(
+            library.iterate(self.model.search_results), "Export Library Palettes")
+
+# Manages the library of every palette generated or saved in the docker
+class LibraryManager:
+    def __init__(self, parent):
+        self.parent = parent
+        self.library = PaletteLibrary(self.parent.PALETTE_LIBRARY_FILE)
+        self.dialog = None  # Created the first time the library is shown
+        self.pending_records = []  # Palettes recorded but not written yet
+
+        # Records are written once they stop coming in, one transaction at a time, off the GUI thread
+        self.write_timer = QTimer(parent)
+        self.write_timer.setSingleShot(True)
+        self.write_timer.setInterval(LIBRARY_WRITE_DELAY_MS)
+        self.write_timer.timeout.connect(self.write_records)
+        self.writer_pool = QThreadPool()
+        self.writer_pool.setMaxThreadCount(1)
+
+        # Palettes still waiting for their write are not lost when Krita closes
+        QApplication.instance().aboutToQuit.connect(self.flush)
+
+    # Records a palette to be added to the library on the background writer
+    def record_palette(self, palette, source=None, kind=KIND_GENERATED):
+        self.pending_records.append(library_record(palette, source, kind))
+        self.write_timer.start()
+
+    # Writes the palettes recorded since the last write in a single transaction
+    def write_records(self):
+        if self.pending_records:
+            self.writer_pool.start(LibraryWriter(self.library.file_name, self.pending_records))
+            self.pending_records = []
+
+    # Writes any recorded palette right away and waits for the writer to finish
+    def flush(self):
+        self.write_timer.stop()
+        self.write_records()
+        self.writer_pool.waitForDone()
+
+    # Shows the library dialog
+    # Recorded palettes are written first, so the dialog lists them
+    def show_library(self):
+        self.flush()
+        try:
+            if self.dialog is None:
+                self.dialog = LibraryDialog(self, self.parent)
+            else:
+                self.dialog.show_history()
+        except (sqlite3.Error, OSError) as e:
+            self.parent.ui_manager.show_error_popup("Error Opening Library", f"An error occurred while opening the library: {e}")
+            return
+        self.dialog.show()
+        self.dialog.raise_()
+
+    # Opens a library palette in the docker
+    # Saved palettes are reloaded from their file when it still exists, so they can be regenerated
+    def open_entry(self, entry):
+        if entry.kind == KIND_SAVED and entry.source and os.path.isfile(entry.source):
+            try:
+                self.parent.file_manager.load_palette(entry.source)
+                return
+            except Exception as e:
+                print(f"Unable to reload '{entry.source}', showing the library colors: {e}")
+
+        self.parent.canvas_manager.set_follow_canvas(False)
+        self.parent.batch_manager.cancel()
+
+        # Only the colors are stored in the library, there is no histogram to regenerate from
+        self.parent.palette.from_json(entry.to_palette().to_json())
+        self.parent.palette.palette_list.clear()
+        self.parent.palette.palette_list.append(self.parent.palette.snapshot())
+        self.parent.palette.set_index(0)
+
+        self.parent.palette_manager.display_palette()
+        self.parent.palette_manager.update_nav_buttons()
+        self.parent.image_name_label.setText(self.parent.palette.image_name or "No image name.")
+        self.parent.button_save.setEnabled(True)
+        self.parent.button_regenerate.setEnabled(False)
@@ -1,68 +1,103 @@
-from collections import Counter
-from PyQt5.QtGui import QImage
-from PyQt5.QtCore import Qt
-import random
+from PyQt5.QtCore import QThreadPool
+from PyQt5.QtWidgets import QApplication
 
-from ..model.Palette import Palette
+from ..core.HistogramCache import HistogramCache
+from ..core.Extraction import PALETTE_SIZE, generate_colors, new_seed
+from ..workers.ExtractionWorker import ExtractionWorker
+from ..workers.RegionWorker import RegionWorker
+
+# Number of palettes kept in the history per image
+HISTORY_SIZE = 5
 
 # Manages the color palette creation and display
 class PaletteManager:
     def __init__(self, parent):
         self.parent = parent
+
+        # Background extraction state
+        self.thread_pool = QThreadPool()
+        self.extraction_worker = None
+        self.extraction_job_id = 0
+        self.running_workers = {}  # Workers kept alive until their thread stops
+        self.image_source = None  # Path or canvas name the current colors were collected from
+
+        # On-disk cache of image histograms so re-opened images skip decoding
+        settings_manager = self.parent.settings_manager
+        self.histogram_cache = HistogramCache(self.parent.HISTOGRAM_CACHE_DIR,
+                                              settings_manager.get_cache_budget(),
+                                              settings_manager.get_cache_content_hash())
+        QApplication.instance().aboutToQuit.connect(self.histogram_cache.flush)
     
     # Displays the current loaded palette
     def display_palette(self):
         self.parent.palette_layout.displayColorsInGrid(self.parent.palette)
 
-    # Collects and stores all of the most common colors in the given image
-    def collect_colors(self, image_path):
+    # Stores all of the most common colors collected from the given image
+    # Their sampling index was already built by the extraction worker
+    def collect_colors(self, image_path, total_colors):
         palette = self.parent.palette
         palette.image_name = image_path.split('/')[-1]
-        image = QImage(image_path)
-        image = image.scaled(100, 100, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-
-        color_counter = Counter()
-        for x in range(image.width()):
-            for y in range(image.height()):
-                color = image.pixelColor(x, y).rgb()
-                color_counter[color] += 1
-
-        most_common_colors = color_counter.most_common()
-        random.shuffle(most_common_colors)
-
-        palette.total_colors = most_common_colors
+        palette.source = image_path
+        palette.total_colors = total_colors
+        self.image_source = image_path
 
     # Generates a new palette from the current set of most common colors
     def generate_palette(self):
-        # Generate new palette
+        # Generate new palette, keeping the seed so it can be reproduced
         palette = self.parent.palette
-        random.shuffle(palette.total_colors)
-        num_colors = 10
-        step = len(palette.total_colors) // num_colors
-        palette_colors = [palette.total_colors[i * step][0] for i in range(num_colors)]
+        palette.seed = new_seed()
+        settings_manager = self.parent.settings_manager
+        palette.method = settings_manager.get_quantizer()
+        palette_colors = generate_colors(palette.total_colors, palette.method, PALETTE_SIZE, palette.seed,
+                                         settings_manager.get_min_distance(), settings_manager.get_color_difference())
 
         palette.clear_colors()
         for color in palette_colors:
-            palette.add_color(f'#{color:06x}')
+            palette.add_color(color)
 
         # Create a snapshot of the current palette
-        palette_snapshot = Palette()
-        palette_snapshot.cur_colors = list(self.parent.palette.cur_colors)
-        palette_snapshot.total_colors = list(self.parent.palette.total_colors)
-        palette_snapshot.image_name = self.parent.palette.image_name
+        palette_snapshot = self.parent.palette.snapshot()
 
-        # Add to list (up to 5)
-        self.parent.palette.palette_list.append(palette_snapshot)
-        if len(self.parent.palette.palette_list) > 5:
-            self.parent.palette.palette_list.pop(0)
+        # Add to list (up to 5 per image, so a batch keeps the palettes of its other images)
+        # Images are told apart by their full path, the name also tells apart the regions of an image
+        palette_list = self.parent.palette.palette_list
+        palette_list.append(palette_snapshot)
+        same_image = [index for index, snapshot in enumerate(palette_list)
+                      if snapshot.source == palette.source and snapshot.image_name == palette.image_name]
+        if len(same_image) > HISTORY_SIZE:
+            palette_list.pop(same_image[0])
 
         # Update index to last one
         self.parent.palette.set_index(len(self.parent.palette.palette_list) - 1)
 
+        # Index the palette in the library, with its source when it is the last collected image
+        source = self.image_source if self.image_source and self.image_source.split('/')[-1] == palette.image_name else None
+        self.parent.library_manager.record_palette(palette_snapshot, source)
+
         self.display_palette()
         self.update_nav_buttons()
         #self.update_index_label()
 
+    # Regenerates the current palette from updated colors of the same image
+    # The seed and method are kept, so the palette only changes as much as the colors did
+    def refresh_palette(self, total_colors):
+        palette = self.parent.palette
+        palette.total_colors = total_colors
+        settings_manager = self.parent.settings_manager
+        palette_colors = generate_colors(total_colors, palette.method, PALETTE_SIZE, palette.seed,
+                                         settings_manager.get_min_distance(), settings_manager.get_color_difference())
+
+        palette.clear_colors()
+        for color in palette_colors:
+            palette.add_color(color)
+
+        # Replace the current snapshot rather than growing the history
+        index = palette.get_index()
+        if 0 <= index < len(palette.palette_list):
+            palette.palette_list[index] = palette.snapshot()
+
+        self.display_palette()
+
     # Changes the current palette to the previous one in the list
     # If at the first palette, wrap to the last
     def show_previous_palette(self):
@@ -82,6 +117,7 @@ class PaletteManager:
         self.display_palette()
         self.update_nav_buttons()
         #self.update_index_label()
+        self.parent.image_name_label.setText(self.parent.palette.image_name or "No image name.")
 
 
     # Changes the current palette to the next one in the list
@@ -103,22 +139,116 @@ class PaletteManager:
         self.display_palette()
         self.update_nav_buttons()
         #self.update_index_label()
+        self.parent.image_name_label.setText(self.parent.palette.image_name or "No image name.")
 
-    # Creates and displays a new color palette from an image
+    # Starts collecting the colors of the current image on a background thread
+    # Any extraction still in progress is cancelled instead of queued
     def create_palette_from_image(self):
+        self.cancel_extraction()
+
+        self.extraction_job_id += 1
+        worker = ExtractionWorker(self.extraction_job_id, self.parent.image_path,
+                                  self.parent.settings_manager.get_sample_size(), self.histogram_cache,
+                                  self.parent.settings_manager.get_precision())
+        worker.signals.finished.connect(self.on_extraction_finished)
+        worker.signals.failed.connect(self.on_extraction_failed)
+        worker.signals.stopped.connect(self.on_extraction_stopped)
+
+        self.extraction_worker = worker
+        self.running_workers[worker.job_id] = worker
+        self.parent.ui_manager.set_busy(True)
+        self.thread_pool.start(worker)
+
+    # Starts collecting the colors of regions of an image on a background thread
+    # Regions are rectangles and the colors of an optional mask image, all counted from one decode
+    def create_palettes_from_regions(self, image_path, regions, mask_path=None):
+        self.cancel_extraction()
+
+        self.extraction_job_id += 1
+        worker = RegionWorker(self.extraction_job_id, image_path, regions, mask_path,
+                              self.parent.settings_manager.get_sample_size(), self.parent.settings_manager.get_precision())
+        worker.signals.finished.connect(self.on_regions_finished)
+        worker.signals.failed.connect(self.on_extraction_failed)
+        worker.signals.stopped.connect(self.on_extraction_stopped)
+
+        self.extraction_worker = worker
+        self.running_workers[worker.job_id] = worker
+        self.parent.ui_manager.set_busy(True)
+        self.thread_pool.start(worker)
+
+    # Cancels the running extraction, if any
+    def cancel_extraction(self):
+        if self.extraction_worker is not None:
+            self.extraction_worker.cancel()
+
+            # A worker that never started is dropped from the queue right away
+            if self.thread_pool.tryTake(self.extraction_worker):
+                self.running_workers.pop(self.extraction_worker.job_id, None)
+            self.extraction_worker = None
+
+    # Releases a worker once its thread is done with it
+    def on_extraction_stopped(self, job_id):
+        self.running_workers.pop(job_id, None)
+
+    # Returns whether the given job is the latest one started
+    def is_current_job(self, job_id):
+        return job_id == self.extraction_job_id and self.extraction_worker is not None
+
+    # Creates and displays a new color palette once the image colors are collected
+    def on_extraction_finished(self, job_id, image_path, total_colors):
+        # Ignore the results of a cancelled extraction
+        if not self.is_current_job(job_id):
+            return
+        self.extraction_worker = None
+        self.parent.ui_manager.set_busy(False)
+
+        self.show_new_palette(image_path, total_colors)
+
+    # Creates and displays a palette per region once the colors of every region are collected
+    def on_regions_finished(self, job_id, image_path, region_colors):
+        if not self.is_current_job(job_id):
+            return
+        self.extraction_worker = None
+        self.parent.ui_manager.set_busy(False)
+
+        if not region_colors:
+            self.parent.image_name_label.setText(self.parent.palette.image_name or "No image name.")
+            self.parent.ui_manager.show_error_popup("No Regions Found", "The mask does not cover any part of the image.")
+            return
+        self.show_region_palettes(image_path, region_colors)
+
+    # Replaces the palette history with one palette per region, named after the image and region
+    # Previous and Next then step through the regions
+    def show_region_palettes(self, image_path, region_colors):
+        palette = self.parent.palette
+        palette.palette_list.clear()
+        palette.set_index(-1)
+
+        image_name = image_path.split('/')[-1]
+        for name, total_colors in region_colors:
+            self.collect_colors(image_path, total_colors)
+            palette.image_name = f"{image_name} ({name})"
+            self.generate_palette()
+
+        palette.set_index(0)
+        self.display_palette()
+        self.update_nav_buttons()
+        self.parent.button_regenerate.setEnabled(True)
+        self.parent.button_save.setEnabled(True)
+        self.parent.image_name_label.setText(palette.image_name)
+
+    # Replaces the palette history with a new palette generated from the given colors
+    def show_new_palette(self, image_path, total_colors):
         # Reset history
         self.parent.palette.palette_list.clear()
         self.parent.palette.set_index(-1)
 
-        self.collect_colors(self.parent.image_path)
+        self.collect_colors(image_path, total_colors)
         self.generate_palette()
         self.display_palette()
 
         # Add the generated palette as the first snapshot
-        palette_snapshot = Palette()
-        palette_snapshot.cur_colors = list(self.parent.palette.cur_colors)
-        palette_snapshot.total_colors = list(self.parent.palette.total_colors)
-        palette_snapshot.image_name = self.parent.palette.image_name
+        palette_snapshot = self.parent.palette.snapshot()
 
         self.parent.palette.palette_list.append(palette_snapshot)
         self.parent.palette.set_index(0)
@@ -127,6 +257,18 @@ class PaletteManager:
         #self.update_index_label()
         self.parent.button_regenerate.setEnabled(True)
         self.parent.button_save.setEnabled(True)
+        self.parent.image_name_label.setText(self.parent.palette.image_name)
+
+    # Reports an extraction that could not be completed
+    def on_extraction_failed(self, job_id, image_path, message):
+        if not self.is_current_job(job_id):
+            return
+        self.extraction_worker = None
+        self.parent.ui_manager.set_busy(False)
+
+        # The label showed the extraction progress, show the palette still displayed again
+        self.parent.image_name_label.setText(self.parent.palette.image_name or "No image name.")
+        self.parent.ui_manager.show_error_popup("Error Opening File", f"An error occurred while opening the file: {message}")
 
     # Updates the state of the navigation buttons based on the number of palettes
     def update_nav_buttons(self):
@@ -1,21 +1,70 @@
-import json
 import os
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QFileSystemWatcher, QSize, QThreadPool, QTimer
+from PyQt5.QtWidgets import QApplication
+
+from ..core.RecentPalettes import MAX_RECENT_PALETTES, create_entry
+from ..workers.RecentPaletteRereader import RecentPaletteRereader
+from ..workers.RecentPalettesReader import RecentPalettesReader
+from ..workers.RecentPalettesWriter import RecentPalettesWriter
+from .UIManager import create_swatch_icon
+
+# Delay merging bursts of changes to the recent palettes into a single write
+SAVE_DELAY_MS = 500
+
+# Delay after the last resize before the recent palette names are elided again
+ELIDE_DELAY_MS = 100
+
+# Size of the swatch strip shown next to each recent palette
+SWATCH_ICON_SIZE = QSize(30, 10)
 
 # Manages the Recent Palettes ComboBox
 class RecentPalettesManager:
     def __init__(self, parent):
         self.parent = parent
-        self.recent_palettes = self.load_recent_palettes()
+        self.recent_palettes = []  # Entries, most recent first, filled once read from disk
+        self.reader = None  # Reader of the recent palettes file until its entries are loaded
+        self.swatch_icons = {}  # Swatch colors -> icon, so the combo never repaints them
+        self.rereaders = {}  # Path -> reader of a palette file changed outside the docker, until it is read
+
+        # Changes are written once they stop coming in, one write at a time, off the GUI thread
+        self.save_timer = QTimer(parent)
+        self.save_timer.setSingleShot(True)
+        self.save_timer.setInterval(SAVE_DELAY_MS)
+        self.save_timer.timeout.connect(self.write_recent_palettes)
+        self.writer_pool = QThreadPool()
+        self.writer_pool.setMaxThreadCount(1)
+
+        # A change still waiting for its write is not lost when Krita closes
+        QApplication.instance().aboutToQuit.connect(self.flush)
+
+        # Palette files are watched rather than checked on every refresh, the
+        # entries of deleted files are pruned from the list as soon as they go away
+        self.file_watcher = QFileSystemWatcher(parent)
+        self.file_watcher.fileChanged.connect(self.on_palette_file_changed)
+
+        # Resizing only elides the names again, once the size settles
+        self.elide_timer = QTimer(parent)
+        self.elide_timer.setSingleShot(True)
+        self.elide_timer.setInterval(ELIDE_DELAY_MS)
+        self.elide_timer.timeout.connect(self.elide_recent_palettes)
+
+        # The list is read on the writer thread, so it is always read before any write
+        self.reader = RecentPalettesReader(self.parent.RECENT_PALETTES_FILE, self.parent.LEGACY_RECENT_PALETTES_FILE)
+        self.reader.signals.loaded.connect(self.on_recent_palettes_loaded)
+        self.writer_pool.start(self.reader)
 
     # Loads the palette selected by the user from the recent palettes list
     def load_selected_recent_palette(self, index):
-        if 0 <= index < len(self.recent_palettes):
-            palette_path = self.recent_palettes.pop(index)
-            
-            # Load the palette from the file
-            self.parent.file_manager.load_palette(palette_path)
-            
+        entry_index = self.parent.recent_palettes_combo.itemData(index)
+        if entry_index is not None and 0 <= entry_index < len(self.recent_palettes):
+            palette_path = self.recent_palettes.pop(entry_index)["path"]
+
+            # Load the palette from the file, which adds it back to the top of the list
+            try:
+                self.parent.file_manager.load_palette(palette_path)
+            except Exception as e:
+                self.parent.ui_manager.show_error_popup("Error Loading File", f"An error occurred while loading the file: {e}")
+
             # Update the combo box and save changes
             self.update_recent_palettes_combo()
             self.save_recent_palettes()
@@ -23,52 +72,167 @@ class RecentPalettesManager:
             print(f"Index {index} is out of range for recent palettes.")
 
     # Updates the list of recent palettes with a new file
+    # The current palette is the one just loaded from or saved to the file
     def update_recent_palettes(self, file_name):
         # Remove the file if it is already in the list
-        if file_name in self.recent_palettes:
-            self.recent_palettes.remove(file_name)
-        
+        self.recent_palettes = [entry for entry in self.recent_palettes if entry["path"] != file_name]
+
         # Add the new file to the top of the list
-        self.recent_palettes.insert(0, file_name)
+        self.recent_palettes.insert(0, create_entry(file_name, self.parent.palette))
 
         # Keep the list length to a max of 5
-        if len(self.recent_palettes) > 5:
-            self.recent_palettes.pop()
-        
+        del self.recent_palettes[MAX_RECENT_PALETTES:]
+        self.watch_palette_files()
+
         # Update the combo box and save changes
         self.update_recent_palettes_combo()
         self.save_recent_palettes()
 
     # Updates the Recent Palettes ComboBox UI
+    # Every entry is known to exist, missing files are pruned when they go away
     def update_recent_palettes_combo(self):
         # Clear existing items
         self.parent.recent_palettes_combo.clear()
+        self.parent.recent_palettes_combo.setIconSize(SWATCH_ICON_SIZE)
+
+        for entry_index, entry in enumerate(self.recent_palettes):
+            self.parent.recent_palettes_combo.addItem(self.swatch_icon(entry.get("colors", [])), "", entry_index)
+        self.elide_recent_palettes()
 
+    # Elides the names of the recent palettes to the current width of the combo box
+    def elide_recent_palettes(self):
         # Get font metrics for text
         font_metrics = self.parent.recent_palettes_combo.fontMetrics()
-        
+
         # Get the current width of the combo box
         combo_width = self.parent.recent_palettes_combo.width()
-        
-        for palette_path in self.recent_palettes:
-            # Check if the palette file exists
-            if os.path.exists(palette_path) and os.path.isfile(palette_path):
-                file_name = os.path.basename(palette_path)
-                elided_text = font_metrics.elidedText(file_name, Qt.ElideRight, combo_width - 20)
-                self.parent.recent_palettes_combo.addItem(elided_text)
-        
+
+        for index in range(self.parent.recent_palettes_combo.count()):
+            file_name = os.path.basename(self.recent_palettes[self.parent.recent_palettes_combo.itemData(index)]["path"])
+            elided_text = font_metrics.elidedText(file_name, Qt.ElideRight, combo_width - SWATCH_ICON_SIZE.width() - 30)
+            self.parent.recent_palettes_combo.setItemText(index, elided_text)
+
         # Setting the default text of the box
         self.parent.recent_palettes_combo.lineEdit().setText("Recent Palettes")
 
-    # Saves the list of recent palettes to the krita_recent_palettes json file
-    def save_recent_palettes(self):
-        with open(self.parent.RECENT_PALETTES_FILE, 'w') as file:
-            json.dump(self.recent_palettes, file)
+    # Elides the names again once the docker stops being resized
+    def schedule_elide(self):
+        self.elide_timer.start()
 
-    # Loads the list of recent palettes from the krita_recent_palettes json file
-    def load_recent_palettes(self):
+    # Watches the files of the recent palettes, and only those
+    def watch_palette_files(self):
+        paths = {entry["path"] for entry in self.recent_palettes}
+        watched = set(self.file_watcher.files())
+        if watched - paths:
+            self.file_watcher.removePaths(list(watched - paths))
+        if paths - watched:
+            self.file_watcher.addPaths(list(paths - watched))
+
+    # Removes the entries whose palette file no longer exists from the list
+    # Returns whether any entry was removed
+    def prune_missing_palettes(self):
+        entries = [entry for entry in self.recent_palettes if os.path.isfile(entry["path"])]
+        pruned = len(entries) != len(self.recent_palettes)
+        self.recent_palettes = entries
+        self.watch_palette_files()
+        return pruned
+
+    # Prunes the entry of a palette file that was deleted or renamed,
+    # and reads the file again when it was changed outside the docker
+    def on_palette_file_changed(self, path):
+        if os.path.isfile(path):
+            # Files replaced by a rename stop being watched, watch the new file
+            if path not in self.file_watcher.files():
+                self.file_watcher.addPath(path)
+            self.reread_palette_file(path)
+            return
+
+        if self.prune_missing_palettes():
+            self.update_recent_palettes_combo()
+            self.save_recent_palettes()
+
+    # Reads the swatches and name of a changed palette file again on the background pool
+    # Files the docker saved itself already have an up to date entry and are skipped
+    def reread_palette_file(self, path):
+        entry = next((entry for entry in self.recent_palettes if entry["path"] == path), None)
+        if entry is None or path in self.rereaders:
+            return
         try:
-            with open(self.parent.RECENT_PALETTES_FILE, 'r') as file:
-                return json.load(file)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
\ No newline at end of file
+            if os.path.getmtime(path) == entry.get("modified"):
+                return
+        except OSError:
+            return
+
+        self.forget_swatch_icon(entry.get("colors", []))
+        rereader = self.rereaders[path] = RecentPaletteRereader(dict(entry))
+        rereader.signals.reread.connect(self.on_palette_file_reread)
+        self.writer_pool.start(rereader)
+
+    # Replaces the entry of a palette file read again, unless it left the list meanwhile
+    # Files that could not be read, such as ones still being written, keep their entry
+    def on_palette_file_reread(self, path, updated):
+        self.rereaders.pop(path, None)
+        if updated is None:
+            return
+        for index, entry in enumerate(self.recent_palettes):
+            if entry["path"] == path:
+                self.recent_palettes[index] = updated
+                self.update_recent_palettes_combo()
+                self.save_recent_palettes()
+                return
+
+    # Drops the cached icon of swatch colors no entry shows anymore
+    def forget_swatch_icon(self, colors):
+        key = tuple(colors)
+        if sum(tuple(entry.get("colors", [])) == key for entry in self.recent_palettes) <= 1:
+            self.swatch_icons.pop(key, None)
+
+    # Returns an icon painting the cached swatch colors of a recent palette side by side
+    def swatch_icon(self, colors):
+        key = tuple(colors)
+        icon = self.swatch_icons.get(key)
+        if icon is None:
+            icon = self.swatch_icons[key] = create_swatch_icon(colors, SWATCH_ICON_SIZE)
+        return icon
+
+    # Schedules saving the list of recent palettes, merging the changes made in the meantime
+    def save_recent_palettes(self):
+        self.save_timer.start()
+
+    # Writes a snapshot of the list of recent palettes on the background writer
+    # Until the file is read the list misses its entries, it is then written once they are merged
+    def write_recent_palettes(self):
+        if self.reader is not None:
+            return
+        entries = [dict(entry) for entry in self.recent_palettes]
+        self.writer_pool.start(RecentPalettesWriter(self.parent.RECENT_PALETTES_FILE, entries))
+
+    # Writes any scheduled change right away and waits for the writer to finish
+    # Entries read but not delivered yet are merged first, so the write keeps them
+    def flush(self):
+        if self.reader is not None:
+            self.writer_pool.waitForDone()
+            if self.reader.entries is not None:
+                self.on_recent_palettes_loaded(self.reader.entries, self.reader.pruned)
+        if self.save_timer.isActive():
+            self.save_timer.stop()
+            self.write_recent_palettes()
+        self.writer_pool.waitForDone()
+
+    # Shows the entries read from the recent palettes file
+    # Palettes opened or saved while they were read stay on top of the list
+    # The list is saved if it changed, either by those palettes or by pruning missing files
+    def on_recent_palettes_loaded(self, entries, pruned):
+        # Already merged when flushed before the signal was delivered
+        if self.reader is None:
+            return
+        self.reader = None
+        paths = {entry["path"] for entry in self.recent_palettes}
+        changed = bool(paths) or pruned
+        self.recent_palettes += [entry for entry in entries if entry["path"] not in paths]
+        del self.recent_palettes[MAX_RECENT_PALETTES:]
+
+        self.watch_palette_files()
+        self.update_recent_palettes_combo()
+        if changed:
+            self.save_recent_palettes()
@@ -0,0 +1,227 @@
+import os
+
+from PyQt5.QtCore import Qt, QPoint, QRect, pyqtSignal
+from PyQt5.QtGui import QColor, QPainter, QPen, QPixmap
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QListWidget, QListWidgetItem,
+                             QFileDialog)
+
+from ..core.ImageDecoder import image_extensions, is_image_file, is_krita_document, load_sample
+from ..core.Regions import PREVIEW_SIZE, Region
+
+# Smallest rectangle drawn on the preview taken as a region, in preview pixels
+MIN_REGION_SIZE = 4
+
+# Color regions are outlined with on the preview
+REGION_COLOR = QColor(255, 64, 64)
+
+# Returns the file dialog filter of the images regions can be drawn on
+# Krita documents are only read through Krita, as a whole
+def region_image_filter():
+    patterns = ' '.join(f'*{extension}' for extension in sorted(image_extensions()))
+    return f"Images ({patterns})"
+
+# Preview of an image on which regions are drawn by dragging rectangles
+# Rectangles are kept in fractions of the preview, matching Region
+class RegionView(QLabel):
+    region_drawn = pyqtSignal(float, float, float, float)  # Left, top, right and bottom fractions
+
+    def __init__(self):
+        super().__init__()
+        self.setAlignment(Qt.AlignLeft | Qt.AlignTop)
+        self.setCursor(Qt.CrossCursor)
+        self.regions = []  # (left, top, right, bottom) fractions of every region
+        self.origin = None  # Point a rectangle is being dragged from
+        self.dragged = QRect()
+
+    # Shows a new image preview, dropping the regions of the previous one
+    def set_image(self, image):
+        self.setPixmap(QPixmap.fromImage(image))
+        self.setFixedSize(image.size())
+        self.set_regions([])
+
+    # Replaces the outlined regions
+    def set_regions(self, regions):
+        self.regions = list(regions)
+        self.update()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton and self.pixmap() is not None:
+            self.origin = event.pos()
+            self.dragged = QRect(self.origin, self.origin)
+
+    def mouseMoveEvent(self, event):
+        if self.origin is not None:
+            self.dragged = QRect(self.origin, event.pos()).normalized().intersected(self.rect())
+            self.update()
+
+    def mouseReleaseEvent(self, event):
+        if self.origin is None:
+            return
+        rect = self.dragged
+        self.origin = None
+        self.dragged = QRect()
+        self.update()
+
+        if rect.width() >= MIN_REGION_SIZE and rect.height() >= MIN_REGION_SIZE:
+            width, height = self.width(), self.height()
+            self.region_drawn.emit(rect.left() / width, rect.top() / height,
+                                   (rect.right() + 1) / width, (rect.bottom() + 1) / height)
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        painter = QPainter(self)
+        painter.setPen(QPen(REGION_COLOR, 2))
+        width, height = self.width(), self.height()
+        for number, (left, top, right, bottom) in enumerate(self.regions, 1):
+            rect = QRect(QPoint(int(left * width), int(top * height)),
+                         QPoint(int(right * width) - 1, int(bottom * height) - 1))
+            painter.drawRect(rect)
+            painter.drawText(rect.adjusted(4, 2, 0, 0), Qt.AlignLeft | Qt.AlignTop, str(number))
+        if not self.dragged.isNull():
+            painter.setPen(QPen(REGION_COLOR, 1, Qt.DashLine))
+            painter.drawRect(self.dragged)
+        painter.end()
+
+# Dialog drawing the regions of an image, or picking a mask image, to create a palette of each
+class RegionDialog(QDialog):
+    def __init__(self, region_manager, parent):
+        super().__init__(parent)
+        self.region_manager = region_manager
+        self.setWindowTitle('Create Palettes from Regions')
+        self.image_path = None
+        self.mask_path = None
+
+        layout = QVBoxLayout(self)
+        button_layout = QHBoxLayout()
+        open_button = QPushButton('Open Image...')
+        open_button.clicked.connect(self.open_image_dialog)
+        mask_button = QPushButton('Load Mask...')
+        mask_button.setToolTip('Use an image painted with one color per region')
+        mask_button.clicked.connect(self.load_mask_dialog)
+        clear_button = QPushButton('Clear')
+        clear_button.clicked.connect(self.clear_regions)
+        button_layout.addWidget(open_button)
+        button_layout.addWidget(mask_button)
+        button_layout.addWidget(clear_button)
+        layout.addLayout(button_layout)
+
+        self.status_label = QLabel()
+        self.status_label.setWordWrap(True)
+        layout.addWidget(self.status_label)
+
+        self.view = RegionView()
+        self.view.region_drawn.connect(self.add_region)
+        layout.addWidget(self.view, alignment=Qt.AlignCenter)
+
+        # Region names can be edited, they are shown after the image name of each palette
+        self.region_list = QListWidget()
+        self.region_list.setMaximumHeight(100)
+        self.region_list.itemChanged.connect(lambda item: self.update_status())
+        layout.addWidget(self.region_list)
+
+        bottom_layout = QHBoxLayout()
+        remove_button = QPushButton('Remove Region')
+        remove_button.clicked.connect(self.remove_region)
+        self.create_button = QPushButton('Create Palettes')
+        self.create_button.clicked.connect(self.create_palettes)
+        bottom_layout.addWidget(remove_button)
+        bottom_layout.addStretch()
+        bottom_layout.addWidget(self.create_button)
+        layout.addLayout(bottom_layout)
+
+        self.update_status()
+
+    # Previews an image, dropping the regions drawn on the previous one
+    def set_image(self, image_path):
+        self.view.set_image(load_sample(image_path, PREVIEW_SIZE))
+        self.image_path = image_path
+        self.mask_path = None
+        self.region_list.clear()
+        self.update_status()
+        self.adjustSize()
+
+    # Opens a file dialog to pick the image regions are drawn on
+    def open_image_dialog(self):
+        file_name, _ = QFileDialog.getOpenFileName(self, "Open Image File", "", region_image_filter())
+        if file_name:
+            try:
+                self.set_image(file_name)
+            except Exception as e:
+                self.region_manager.parent.ui_manager.show_error_popup("Error Opening File", f"An error occurred while opening the file: {e}")
+
+    # Opens a file dialog to pick a mask image, each of its colors making one region
+    def load_mask_dialog(self):
+        file_name, _ = QFileDialog.getOpenFileName(self, "Load Mask Image", "", region_image_filter())
+        if file_name:
+            self.mask_path = file_name
+            self.update_status()
+
+    # Adds a region drawn on the preview
+    def add_region(self, left, top, right, bottom):
+        item = QListWidgetItem(f'Region {self.region_list.count() + 1}')
+        item.setFlags(item.flags() | Qt.ItemIsEditable)
+        item.setData(Qt.UserRole, (left, top, right, bottom))
+        self.region_list.addItem(item)
+        self.update_regions()
+
+    # Removes the selected region
+    def remove_region(self):
+        row = self.region_list.currentRow()
+        if row >= 0:
+            self.region_list.takeItem(row)
+            self.update_regions()
+
+    # Removes every region and the mask
+    def clear_regions(self):
+        self.region_list.clear()
+        self.mask_path = None
+        self.update_regions()
+
+    # Outlines the listed regions on the preview
+    def update_regions(self):
+        self.view.set_regions(self.region_list.item(row).data(Qt.UserRole) for row in range(self.region_list.count()))
+        self.update_status()
+
+    # Returns the listed regions
+    def regions(self):
+        regions = []
+        for row in range(self.region_list.count()):
+            item = self.region_list.item(row)
+            regions.append(Region(item.text() or f'Region {row + 1}', *item.data(Qt.UserRole)))
+        return regions
+
+    # Describes what palettes will be created
+    def update_status(self):
+        if self.image_path is None:
+            self.status_label.setText("Open an image to draw regions on.")
+        else:
+            mask = f" and the colors of {os.path.basename(self.mask_path)}" if self.mask_path else ""
+            self.status_label.setText(f"Drag on the image to add a region. {self.region_list.count()} regions{mask}.")
+        self.create_button.setEnabled(self.image_path is not None and (self.region_list.count() > 0 or self.mask_path is not None))
+
+    # Creates a palette of every region
+    def create_palettes(self):
+        self.region_manager.parent.file_manager.open_image_regions(self.image_path, self.regions(), self.mask_path)
+        self.hide()
+
+# Manages the dialog creating palettes from regions of an image
+class RegionManager:
+    def __init__(self, parent):
+        self.parent = parent
+        self.dialog = None  # Created the first time it is shown
+
+    # Shows the region dialog, on the current image when it has one
+    def show_regions(self):
+        if self.dialog is None:
+            self.dialog = RegionDialog(self, self.parent)
+
+        image_path = self.parent.image_path
+        if (image_path and image_path != self.dialog.image_path and os.path.isfile(image_path)
+                and is_image_file(image_path) and not is_krita_document(image_path)):
+            try:
+                self.dialog.set_image(image_path)
+            except ValueError as e:
+                print(f"Unable to preview '{image_path}': {e}")
+
+        self.dialog.show()
+        self.dialog.raise_()
@@ -0,0 +1,230 @@
+import os
+import sqlite3
+
+from PyQt5.QtCore import Qt, QSize, QThreadPool, QTimer, QFileSystemWatcher
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QListWidget, QListWidgetItem,
+                             QFileDialog)
+
+from ..core.PaletteIndex import PaletteIndex, image_signature, palette_signature
+from ..workers.IndexWorker import IndexWorker
+from .UIManager import create_swatch_icon
+
+# Size of the swatch strip shown for each search result
+RESULT_ICON_SIZE = QSize(100, 16)
+
+# Delay between a change in an indexed folder and the index update, so a burst of
+# saved files is read in a single update
+UPDATE_DELAY_MS = 1000
+
+# Dialog finding the indexed palette files closest to the current palette or image
+class SearchDialog(QDialog):
+    def __init__(self, search_manager, parent):
+        super().__init__(parent)
+        self.search_manager = search_manager
+        self.setWindowTitle('Find Similar Palettes')
+        self.resize(360, 480)
+
+        layout = QVBoxLayout(self)
+        folder_layout = QHBoxLayout()
+        add_button = QPushButton('Add Folder...')
+        add_button.clicked.connect(self.add_folder_dialog)
+        remove_button = QPushButton('Remove Folder')
+        remove_button.clicked.connect(self.remove_folder)
+        folder_layout.addWidget(add_button)
+        folder_layout.addWidget(remove_button)
+        layout.addLayout(folder_layout)
+
+        self.folder_list = QListWidget()
+        self.folder_list.setMaximumHeight(80)
+        layout.addWidget(self.folder_list)
+
+        search_layout = QHBoxLayout()
+        self.palette_button = QPushButton('Match Palette')
+        self.palette_button.setToolTip('Find the palettes closest to the swatches of the current palette')
+        self.palette_button.clicked.connect(self.search_manager.search_palette)
+        self.image_button = QPushButton('Match Image')
+        self.image_button.setToolTip('Find the palettes closest to all the colors of the current image')
+        self.image_button.clicked.connect(self.search_manager.search_image)
+        search_layout.addWidget(self.palette_button)
+        search_layout.addWidget(self.image_button)
+        layout.addLayout(search_layout)
+
+        self.status_label = QLabel()
+        self.status_label.setWordWrap(True)
+        layout.addWidget(self.status_label)
+
+        self.result_list = QListWidget()
+        self.result_list.setIconSize(RESULT_ICON_SIZE)
+        self.result_list.itemDoubleClicked.connect(lambda item: self.search_manager.open_result(item.data(Qt.UserRole)))
+        layout.addWidget(self.result_list)
+
+    # Opens a folder dialog to add a folder of palette files to the index
+    def add_folder_dialog(self):
+        folder = QFileDialog.getExistingDirectory(self, "Add Palette Folder")
+        if folder:
+            self.search_manager.add_folder(folder)
+
+    # Removes the selected folder from the index
+    def remove_folder(self):
+        item = self.folder_list.currentItem()
+        if item is not None:
+            self.search_manager.remove_folder(item.text())
+
+    # Lists the indexed folders
+    def show_folders(self, folders):
+        self.folder_list.clear()
+        self.folder_list.addItems(folders)
+
+    # Lists search results, most similar first
+    def show_results(self, entries, description):
+        self.result_list.clear()
+        for entry in entries:
+            item = QListWidgetItem(create_swatch_icon(entry.colors, RESULT_ICON_SIZE),
+                                   f"{entry.similarity * 100:.0f}% - {entry.image_name or os.path.basename(entry.path)}")
+            item.setToolTip(entry.path)
+            item.setData(Qt.UserRole, entry.path)
+            self.result_list.addItem(item)
+        self.status_label.setText(description)
+
+# Manages the index of palette folders and the searches over it
+# The index is updated in the background when the dialog is shown and whenever
+# a file changes in an indexed folder, only reading the files added or changed
+class SearchManager:
+    def __init__(self, parent):
+        self.parent = parent
+        self.index = PaletteIndex(self.parent.PALETTE_INDEX_FILE)
+        self.dialog = None  # Created the first time it is shown
+
+        # A single update runs at a time, changes made meanwhile schedule another one
+        self.thread_pool = QThreadPool()
+        self.thread_pool.setMaxThreadCount(1)
+        self.worker = None
+        self.update_pending = False
+
+        # Indexed folders are watched once the dialog was first shown
+        self.watcher = None
+        self.update_timer = QTimer(parent)
+        self.update_timer.setSingleShot(True)
+        self.update_timer.setInterval(UPDATE_DELAY_MS)
+        self.update_timer.timeout.connect(self.update_index)
+
+    # Shows the search dialog, updating the index in the background
+    def show_search(self):
+        try:
+            if self.dialog is None:
+                self.dialog = SearchDialog(self, self.parent)
+                self.watcher = QFileSystemWatcher(self.parent)
+                self.watcher.directoryChanged.connect(lambda path: self.update_timer.start())
+            self.dialog.show_folders(self.index.folders())
+        except (sqlite3.Error, OSError) as e:
+            self.parent.ui_manager.show_error_popup("Error Opening Index", f"An error occurred while opening the palette index: {e}")
+            return
+
+        self.update_status()
+        self.update_index()
+        self.dialog.show()
+        self.dialog.raise_()
+
+    # Adds a folder of palette files to the index
+    def add_folder(self, folder):
+        try:
+            indexed = self.index.add_folder(folder)
+            self.dialog.show_folders(self.index.folders())
+        except (sqlite3.Error, OSError) as e:
+            self.parent.ui_manager.show_error_popup("Error Adding Folder", f"An error occurred while adding the folder: {e}")
+            return
+        if os.path.normcase(indexed) != os.path.normcase(os.path.abspath(folder)):
+            self.dialog.status_label.setText(f"{folder} is already indexed as part of {indexed}.")
+            return
+        self.update_index()
+
+    # Removes a folder and its palette files from the index
+    def remove_folder(self, folder):
+        try:
+            self.index.remove_folder(folder)
+            self.dialog.show_folders(self.index.folders())
+        except (sqlite3.Error, OSError) as e:
+            self.parent.ui_manager.show_error_popup("Error Removing Folder", f"An error occurred while removing the folder: {e}")
+            return
+        self.update_status()
+
+    # Starts updating the index on a background thread, or once the running update is done
+    def update_index(self):
+        if self.worker is not None:
+            self.update_pending = True
+            return
+
+        self.update_pending = False
+        self.worker = IndexWorker(self.parent.PALETTE_INDEX_FILE)
+        self.worker.signals.finished.connect(self.on_update_finished)
+        self.worker.signals.failed.connect(self.on_update_failed)
+        self.dialog.status_label.setText("Updating the index...")
+        self.thread_pool.start(self.worker)
+
+    # Reloads the signatures and watches the scanned folders once an update is done
+    def on_update_finished(self, result):
+        self.worker = None
+        if result is not None:
+            read, removed, directories = result
+            if read or removed:
+                self.index.invalidate()
+            watched = set(self.watcher.directories())
+            added = [directory for directory in directories if directory not in watched]
+            unwatched = list(watched - set(directories))
+            if added:
+                self.watcher.addPaths(added)
+            if unwatched:
+                self.watcher.removePaths(unwatched)
+
+        if self.update_pending:
+            self.update_index()
+        else:
+            self.update_status()
+
+    # Reports an update that could not be completed
+    def on_update_failed(self, message):
+        self.worker = None
+        self.dialog.status_label.setText(f"Unable to update the index: {message}")
+
+    # Shows the number of indexed palettes
+    def update_status(self):
+        try:
+            count = self.index.count()
+        except sqlite3.Error as e:
+            self.dialog.status_label.setText(f"Unable to read the index: {e}")
+            return
+        self.dialog.status_label.setText(f"{count} palettes indexed, double-click a result to open it.")
+        self.dialog.palette_button.setEnabled(count > 0)
+        self.dialog.image_button.setEnabled(count > 0)
+
+    # Lists the indexed palettes closest to the swatches of the current palette
+    def search_palette(self):
+        palette = self.parent.palette
+        if not palette.cur_colors:
+            self.dialog.status_label.setText("Open or create a palette to match first.")
+            return
+        self.search(palette_signature(palette), f"closest to the palette of {palette.image_name or 'no image'}")
+
+    # Lists the indexed palettes closest to every color of the current image, weighted by pixel count
+    def search_image(self):
+        palette = self.parent.palette
+        if not palette.total_colors:
+            self.dialog.status_label.setText("Open an image to match first.")
+            return
+        self.search(image_signature(palette.total_colors), f"closest to the colors of {palette.image_name or 'no image'}")
+
+    # Lists the indexed palettes closest to a signature
+    def search(self, signature, description):
+        try:
+            entries = self.index.search(signature)
+        except sqlite3.Error as e:
+            self.parent.ui_manager.show_error_popup("Error Searching", f"An error occurred while searching the palette index: {e}")
+            return
+        self.dialog.show_results(entries, f"{len(entries)} palettes {description}.")
+
+    # Opens a palette file of the search results in the docker
+    def open_result(self, path):
+        try:
+            self.parent.file_manager.load_palette(path)
+        except Exception as e:
+            self.parent.ui_manager.show_error_popup("Error Loading Palette", f"An error occurred while loading the palette: {e}")
@@ -0,0 +1,121 @@
+from krita import Krita
+
+from ..core.Bucketing import DEFAULT_PRECISION, PRECISIONS
+from ..core.ColorDistance import COLOR_DIFFERENCES, DEFAULT_COLOR_DIFFERENCE, DEFAULT_MIN_DISTANCE
+from ..core.HistogramCache import DEFAULT_CACHE_BUDGET
+from ..core.ImageDecoder import DEFAULT_SAMPLE_SIZE
+from ..core.Quantizers import DEFAULT_QUANTIZER, QUANTIZERS
+
+# Group of the plugin settings in the Krita configuration file
+SETTINGS_GROUP = 'image_to_palette'
+
+# Selectable sample resolutions, 0 samples the image at its full resolution
+SAMPLE_SIZE_OPTIONS = [100, 256, 512, 1024, 0]
+
+# Selectable histogram cache budgets in bytes, 0 disables the cache
+CACHE_BUDGET_OPTIONS = [0, 16 * 1024 * 1024, DEFAULT_CACHE_BUDGET, 256 * 1024 * 1024]
+
+# Selectable minimum color differences between palette colors, 0 disables the constraint
+MIN_DISTANCE_OPTIONS = [DEFAULT_MIN_DISTANCE, 5, 10, 15, 20]
+
+# Manages the plugin settings stored in the Krita configuration
+class SettingsManager:
+    def __init__(self, parent):
+        self.parent = parent
+
+    # Reads an integer setting, falling back to the default if missing or invalid
+    def read_int(self, name, default):
+        value = Krita.instance().readSetting(SETTINGS_GROUP, name, str(default))
+        try:
+            return int(value)
+        except ValueError:
+            return default
+
+    # Reads a boolean setting
+    def read_bool(self, name, default):
+        value = Krita.instance().readSetting(SETTINGS_GROUP, name, str(default))
+        return value.lower() == 'true'
+
+    # Writes a setting
+    def write(self, name, value):
+        Krita.instance().writeSetting(SETTINGS_GROUP, name, str(value))
+
+    # Returns the size of the box images are scaled into before counting their colors
+    def get_sample_size(self):
+        sample_size = self.read_int('sample_size', DEFAULT_SAMPLE_SIZE)
+        return sample_size if sample_size in SAMPLE_SIZE_OPTIONS else DEFAULT_SAMPLE_SIZE
+
+    # Sets the size of the box images are scaled into before counting their colors
+    def set_sample_size(self, sample_size):
+        self.write('sample_size', sample_size)
+
+
+    # Returns the precision image colors are counted at
+    def get_precision(self):
+        precision = Krita.instance().readSetting(SETTINGS_GROUP, 'precision', DEFAULT_PRECISION)
+        return precision if precision in PRECISIONS else DEFAULT_PRECISION
+
+    # Sets the precision image colors are counted at
+    def set_precision(self, precision):
+        self.write('precision', precision)
+
+    # Returns the byte budget of the histogram cache
+    def get_cache_budget(self):
+        return self.read_int('cache_budget', DEFAULT_CACHE_BUDGET)
+
+    # Sets the byte budget of the histogram cache
+    def set_cache_budget(self, budget):
+        self.write('cache_budget', budget)
+        self.parent.palette_manager.histogram_cache.set_budget(budget)
+
+    # Returns whether histogram cache keys also include a hash of the image content
+    def get_cache_content_hash(self):
+        return self.read_bool('cache_content_hash', False)
+
+    # Sets whether histogram cache keys also include a hash of the image content
+    def set_cache_content_hash(self, content_hash):
+        self.write('cache_content_hash', content_hash)
+        self.parent.palette_manager.histogram_cache.content_hash = content_hash
+
+    # Returns the name of the quantizer picking the palette colors
+    def get_quantizer(self):
+        name = Krita.instance().readSetting(SETTINGS_GROUP, 'quantizer', DEFAULT_QUANTIZER)
+        return name if name in QUANTIZERS else DEFAULT_QUANTIZER
+
+    # Sets the name of the quantizer picking the palette colors
+    def set_quantizer(self, name):
+        self.write('quantizer', name)
+
+    # Returns the smallest color difference allowed between two palette colors
+    def get_min_distance(self):
+        min_distance = self.read_int('min_distance', DEFAULT_MIN_DISTANCE)
+        return min_distance if min_distance in MIN_DISTANCE_OPTIONS else DEFAULT_MIN_DISTANCE
+
+    # Sets the smallest color difference allowed between two palette colors
+    def set_min_distance(self, min_distance):
+        self.write('min_distance', min_distance)
+
+    # Returns the formula the difference between palette colors is measured with
+    def get_color_difference(self):
+        metric = Krita.instance().readSetting(SETTINGS_GROUP, 'color_difference', DEFAULT_COLOR_DIFFERENCE)
+        return metric if metric in COLOR_DIFFERENCES else DEFAULT_COLOR_DIFFERENCE
+
+    # Sets the formula the difference between palette colors is measured with
+    def set_color_difference(self, metric):
+        self.write('color_difference', metric)
+
+    # Returns whether batch palettes are saved as json files next to their images
+    def get_batch_autosave(self):
+        return self.read_bool('batch_autosave', False)
+
+    # Sets whether batch palettes are saved as json files next to their images
+    def set_batch_autosave(self, autosave):
+        self.write('batch_autosave', autosave)
+
+    # Returns whether the pipeline stages are timed and shown in the debug panel
+    def get_debug_panel(self):
+        return self.read_bool('debug_panel', False)
+
+    # Sets whether the pipeline stages are timed and shown in the debug panel
+    def set_debug_panel(self, enabled):
+        self.write('debug_panel', enabled)
\ No newline at end of file
@@ -1,8 +1,16 @@
-from PyQt5.QtWidgets import QVBoxLayout, QWidget, QHBoxLayout, QComboBox, QLabel, QSizePolicy, QPushButton, QGridLayout,  QFileDialog, QMessageBox
+from PyQt5.QtWidgets import QVBoxLayout, QWidget, QHBoxLayout, QComboBox, QLabel, QSizePolicy, QPushButton, QGridLayout,  QFileDialog, QMessageBox, QProgressBar, QMenu, QActionGroup
 from PyQt5.QtCore import Qt, QVariantAnimation
-from PyQt5.QtGui import QColor, QDragEnterEvent, QDropEvent
+from PyQt5.QtGui import QColor, QDragEnterEvent, QDropEvent, QIcon, QPainter, QPixmap
 from krita import ManagedColor, Krita
 from ..model.Palette import Palette
+from ..core.Bucketing import PRECISIONS
+from ..core.ColorDistance import COLOR_DIFFERENCES
+from ..core.Quantizers import QUANTIZERS
+from ..core.ImageDecoder import is_image_file, is_krita_document
+from ..core.Instrumentation import span
+from ..core.PaletteFile import BINARY_PALETTE_EXTENSION
+from .SettingsManager import SAMPLE_SIZE_OPTIONS, CACHE_BUDGET_OPTIONS, MIN_DISTANCE_OPTIONS
+from .CanvasManager import CANVAS_SCOPES
 
 # Represents a square button with an icon and hovering tool description
 class Button(QPushButton):
@@ -18,38 +26,76 @@ class Button(QPushButton):
             QPushButton:hover {
                 border: 1px solid #5e5e5e;
             }
+            QPushButton::menu-indicator {
+                image: none;
+            }
         """)
 
+# Represents a single color of the palette, painted directly without a stylesheet
+class ColorSwatch(QWidget):
+    def __init__(self, on_click):
+        super().__init__()
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+        self.on_click = on_click
+        self.color = 0
+        self.qcolor = QColor()
+        self.selectable = False
+
+    # Changes the displayed color, repainting only if it changed
+    def setColor(self, color, selectable):
+        self.selectable = selectable
+        if color != self.color or not self.qcolor.isValid():
+            self.color = color
+            self.qcolor = QColor.fromRgb(color)
+            self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), self.qcolor)
+
+    def mousePressEvent(self, event):
+        if self.selectable:
+            self.on_click(event, self.color)
+
 # Represents the grid displaying the selectable colors in the palette
+# The swatches are created once and recolored whenever a palette is displayed
 class PaletteGrid(QGridLayout):
+    NUM_COLS = 5
+    NUM_ROWS = 2
+
     def __init__(self):
         super().__init__()
         self.setAlignment(Qt.AlignTop)
         self.setContentsMargins(5, 3, 5, 5)
         self.setSpacing(5)
 
-    # Displays the color labels in the grid
-    def displayColorsInGrid(self, palette, selectable=True):
-        colors = [int(color.lstrip('#'), 16) for color in palette.cur_colors]
-        num_cols = 5
-        num_rows = 2
-
-        # Iterates through each color and makes it a label
-        for i, color in enumerate(colors):
-            row, col = divmod(i, num_cols)
-            color_label = QLabel()
-            color_label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-            color_label.setStyleSheet(f"background-color: #{color:06x};")
-            if selectable:
-                color_label.mousePressEvent = lambda event, c=color: self.setFGColor(event, c)
-            self.addWidget(color_label, row, col)
-
-        for r in range(num_rows):
+        self.swatches = []
+        for i in range(self.NUM_COLS * self.NUM_ROWS):
+            row, col = divmod(i, self.NUM_COLS)
+            swatch = ColorSwatch(self.setFGColor)
+            self.swatches.append(swatch)
+            self.addWidget(swatch, row, col)
+
+        for r in range(self.NUM_ROWS):
             self.setRowStretch(r, 1)
 
-        for c in range(num_cols):
+        for c in range(self.NUM_COLS):
             self.setColumnStretch(c, 1)
 
+    # Displays the palette colors in the grid
+    def displayColorsInGrid(self, palette, selectable=True):
+        colors = palette.cur_colors
+
+        # Recolors each swatch, hiding those without a color
+        with span('display palette', colors=len(colors)):
+            for i, swatch in enumerate(self.swatches):
+                if i < len(colors):
+                    swatch.setColor(colors[i], selectable)
+                    swatch.setVisible(True)
+                else:
+                    swatch.setVisible(False)
+
     # Sets the current foreground color of the canvas
     def setFGColor(self, event, color):
         activeView = Krita.instance().activeWindow().activeView()
@@ -72,6 +118,19 @@ class PaletteGrid(QGridLayout):
 # =========================================================================================================================== #
 
 
+# Returns an icon painting the given colors side by side, such as hex strings of a palette
+def create_swatch_icon(colors, size):
+    pixmap = QPixmap(size)
+    pixmap.fill(Qt.transparent)
+    if colors:
+        painter = QPainter(pixmap)
+        width = size.width() / len(colors)
+        for index, color in enumerate(colors):
+            left = round(index * width)
+            painter.fillRect(left, 0, round((index + 1) * width) - left, size.height(), QColor(color))
+        painter.end()
+    return QIcon(pixmap)
+
 # Manages the UI display of the docker
 class UIManager:
     def __init__(self, parent):
@@ -91,6 +150,14 @@ class UIManager:
         self.parent.image_name_label.setContentsMargins(5, 5, 5, 5)
         main_layout.addWidget(self.parent.image_name_label)
 
+        # Busy indicator shown while an image is being processed in the background
+        self.parent.busy_indicator = QProgressBar()
+        self.parent.busy_indicator.setRange(0, 0)
+        self.parent.busy_indicator.setTextVisible(False)
+        self.parent.busy_indicator.setFixedHeight(4)
+        self.parent.busy_indicator.setVisible(False)
+        main_layout.addWidget(self.parent.busy_indicator)
+
         # 10-color palette grid inside a widget to fix layout stretching
         palette_widget = QWidget()
         palette_layout = QVBoxLayout(palette_widget)
@@ -106,6 +173,9 @@ class UIManager:
         # Bottom-most row of buttons
         bottom_button_layout = self.create_bottom_button_layout()
         main_layout.addLayout(bottom_button_layout)
+
+        # Timings of the pipeline stages, only shown when debugging
+        main_layout.addWidget(self.parent.debug_manager.create_panel())
         main_layout.addStretch()
 
         main_widget.setLayout(main_layout)
@@ -121,6 +191,14 @@ class UIManager:
         # Button for loading a new palette from an image
         self.parent.button_load = self.create_button('folder-pictures', 'Create Palette from Image',
                                                      self.parent.file_manager.open_image_dialog)
+
+        # Button for creating a palette from the active document, a layer or the selection
+        self.parent.button_canvas = Button('krita_tool_color_sampler', 'Create Palette from Canvas')
+        self.parent.button_canvas.setMenu(self.create_canvas_menu())
+
+        # Button for creating a palette of each region of an image, drawn or given by a mask
+        self.parent.button_regions = self.create_button('tool_rect_selection', 'Create Palettes from Image Regions',
+                                                        self.parent.region_manager.show_regions)
         
         # Button for loading a pre-existing palette from a palette json file
         self.parent.button_load_palette = self.create_button('document-open', 'Load Palette',
@@ -140,9 +218,12 @@ class UIManager:
         self.parent.recent_palettes_combo.view().setTextElideMode(Qt.ElideRight)
         self.parent.recent_palettes_combo.lineEdit().setText("Recent Palettes")
         self.parent.recent_palettes_combo.activated.connect(self.parent.recent_palettes_manager.load_selected_recent_palette)
+        self.parent.recent_palettes_manager.update_recent_palettes_combo()
 
         # Adding components to the layout
         button_layout.addWidget(self.parent.button_load)
+        button_layout.addWidget(self.parent.button_canvas)
+        button_layout.addWidget(self.parent.button_regions)
         button_layout.addWidget(self.parent.button_load_palette)
         button_layout.addWidget(self.parent.button_save)
         button_layout.addWidget(self.parent.recent_palettes_combo)
@@ -188,13 +269,139 @@ class UIManager:
         button_layout.addWidget(self.parent.button_next)
         #button_layout.addWidget(index_label_widget)
 
-        # Align the buttons to the left
+        # Button opening the library of every generated and saved palette
+        self.parent.button_library = self.create_button('view-list-details', 'Palette Library',
+                                                        self.parent.library_manager.show_library)
+
+        # Button finding the palette files closest to the current palette or image
+        self.parent.button_search = self.create_button('edit-find', 'Find Similar Palettes',
+                                                       self.parent.search_manager.show_search)
+
+        # Button opening the settings menu
+        self.parent.button_settings = Button('configure', 'Settings')
+        self.parent.button_settings.setMenu(self.create_settings_menu())
+
+        # Align the buttons to the left, settings on the right
         button_layout.addStretch()
+        button_layout.addWidget(self.parent.button_library)
+        button_layout.addWidget(self.parent.button_search)
+        button_layout.addWidget(self.parent.button_settings)
         button_layout.setAlignment(Qt.AlignLeft)
 
         return button_layout
 
 
+    # Creates and returns the menu of the parts of the canvas palettes can be created from
+    def create_canvas_menu(self):
+        menu = QMenu(self.parent)
+        for scope, label in CANVAS_SCOPES.items():
+            menu.addAction(label, lambda s=scope: self.parent.canvas_manager.create_palette_from_canvas(s))
+
+        # Keeps the palette up to date with the active document while painting
+        menu.addSeparator()
+        self.parent.follow_canvas_action = menu.addAction('Follow Canvas')
+        self.parent.follow_canvas_action.setCheckable(True)
+        self.parent.follow_canvas_action.toggled.connect(self.parent.canvas_manager.set_follow_canvas)
+        return menu
+
+    # Creates and returns the settings menu
+    def create_settings_menu(self):
+        menu = QMenu(self.parent)
+
+        # Method picking the palette colors, applied from the next regeneration
+        quantizer_menu = menu.addMenu('Palette Method')
+        quantizer_group = QActionGroup(quantizer_menu)
+        current_quantizer = self.parent.settings_manager.get_quantizer()
+        for name, quantizer in QUANTIZERS.items():
+            action = quantizer_menu.addAction(quantizer.label)
+            action.setCheckable(True)
+            action.setChecked(name == current_quantizer)
+            action.triggered.connect(lambda checked, n=name: self.parent.settings_manager.set_quantizer(n))
+            quantizer_group.addAction(action)
+
+        # Smallest difference kept between palette colors, applied from the next regeneration
+        distance_menu = menu.addMenu('Minimum Color Difference')
+        distance_group = QActionGroup(distance_menu)
+        current_distance = self.parent.settings_manager.get_min_distance()
+        for min_distance in MIN_DISTANCE_OPTIONS:
+            action = distance_menu.addAction(f'Delta E {min_distance}' if min_distance > 0 else 'Off')
+            action.setCheckable(True)
+            action.setChecked(min_distance == current_distance)
+            action.triggered.connect(lambda checked, d=min_distance: self.parent.settings_manager.set_min_distance(d))
+            distance_group.addAction(action)
+
+        distance_menu.addSeparator()
+        metric_group = QActionGroup(distance_menu)
+        current_metric = self.parent.settings_manager.get_color_difference()
+        for metric, label in COLOR_DIFFERENCES.items():
+            action = distance_menu.addAction(label)
+            action.setCheckable(True)
+            action.setChecked(metric == current_metric)
+            action.triggered.connect(lambda checked, m=metric: self.parent.settings_manager.set_color_difference(m))
+            metric_group.addAction(action)
+
+        # Resolution images are sampled at, applied to the next opened image
+        sample_size_menu = menu.addMenu('Sample Resolution')
+        sample_size_group = QActionGroup(sample_size_menu)
+        current_sample_size = self.parent.settings_manager.get_sample_size()
+        for sample_size in SAMPLE_SIZE_OPTIONS:
+            label = f'{sample_size} x {sample_size}' if sample_size > 0 else 'Full Resolution'
+            action = sample_size_menu.addAction(label)
+            action.setCheckable(True)
+            action.setChecked(sample_size == current_sample_size)
+            action.triggered.connect(lambda checked, s=sample_size: self.parent.settings_manager.set_sample_size(s))
+            sample_size_group.addAction(action)
+
+        # How finely colors are told apart, coarser precisions merge near identical shades
+        precision_menu = menu.addMenu('Color Precision')
+        precision_group = QActionGroup(precision_menu)
+        current_precision = self.parent.settings_manager.get_precision()
+        for precision, label in PRECISIONS.items():
+            action = precision_menu.addAction(label)
+            action.setCheckable(True)
+            action.setChecked(precision == current_precision)
+            action.triggered.connect(lambda checked, p=precision: self.parent.settings_manager.set_precision(p))
+            precision_group.addAction(action)
+
+        # Disk space kept for the histograms of previously opened images
+        cache_menu = menu.addMenu('Histogram Cache')
+        cache_budget_group = QActionGroup(cache_menu)
+        current_budget = self.parent.settings_manager.get_cache_budget()
+        for budget in CACHE_BUDGET_OPTIONS:
+            label = f'{budget // (1024 * 1024)} MB' if budget > 0 else 'Disabled'
+            action = cache_menu.addAction(label)
+            action.setCheckable(True)
+            action.setChecked(budget == current_budget)
+            action.triggered.connect(lambda checked, b=budget: self.parent.settings_manager.set_cache_budget(b))
+            cache_budget_group.addAction(action)
+
+        cache_menu.addSeparator()
+        content_hash_action = cache_menu.addAction('Verify Image Content')
+        content_hash_action.setCheckable(True)
+        content_hash_action.setChecked(self.parent.settings_manager.get_cache_content_hash())
+        content_hash_action.toggled.connect(self.parent.settings_manager.set_cache_content_hash)
+        cache_menu.addAction('Clear Cache', self.parent.palette_manager.histogram_cache.clear)
+
+        # Whether the palettes of dropped or opened image batches are also written to disk
+        autosave_action = menu.addAction('Save Batch Palettes Next to Images')
+        autosave_action.setCheckable(True)
+        autosave_action.setChecked(self.parent.settings_manager.get_batch_autosave())
+        autosave_action.toggled.connect(self.parent.settings_manager.set_batch_autosave)
+
+        # Exports to the palette formats of Krita and other applications
+        menu.addSeparator()
+        menu.addAction('Add to Krita Palettes', self.parent.file_manager.add_to_krita_palettes)
+        menu.addAction('Export Palette History...', self.parent.file_manager.export_history_dialog)
+
+        # Panel timing each stage of the pipeline, to find what makes an image slow
+        menu.addSeparator()
+        debug_action = menu.addAction('Show Debug Panel')
+        debug_action.setCheckable(True)
+        debug_action.setChecked(self.parent.settings_manager.get_debug_panel())
+        debug_action.toggled.connect(self.parent.debug_manager.set_debug_panel)
+
+        return menu
+
     # Creates and returns a button with the given icon, tooltip, function call, and enabled state
     def create_button(self, icon_name, tooltip, callback, enabled=True):
         button = Button(icon_name=icon_name, tooltip=tooltip)
@@ -207,54 +414,71 @@ class UIManager:
         self.parent.button_save.setEnabled(True)
         self.parent.button_regenerate.setEnabled(True)
 
+    # Shows or hides the busy indicator
+    def set_busy(self, busy):
+        self.parent.busy_indicator.setRange(0, 0)
+        self.parent.busy_indicator.setVisible(busy)
+
+    # Shows the number of processed images of a batch in the busy indicator
+    def set_progress(self, done, total):
+        self.parent.busy_indicator.setRange(0, total)
+        self.parent.busy_indicator.setValue(done)
+        self.parent.busy_indicator.setVisible(done < total)
+
     # Creates the default palette grid out of gray, unselectable color labels
     def create_default_grid(self):
         placeholder_palette = Palette()
         for _ in range(10):
-            placeholder_palette.add_color("#919191")
+            placeholder_palette.add_color(0xFF919191)
         self.parent.palette_layout.displayColorsInGrid(placeholder_palette, selectable=False)
 
+    # Returns whether a dropped file is an image or document palettes can be created from
+    def is_image_drop(self, file_path):
+        return is_image_file(file_path) or is_krita_document(file_path)
+
     # Handles the event where the user drags an image or palette json file over the docker
     def handle_drag_enter(self, event: QDragEnterEvent):
         if event.mimeData().hasUrls():
             urls = event.mimeData().urls()
             for url in urls:
-                if url.isLocalFile() and url.toLocalFile().lower().endswith(('.png', '.jpg', '.bmp', '.json')):
+                if url.isLocalFile() and (self.is_image_drop(url.toLocalFile()) or url.toLocalFile().lower().endswith(('.json', BINARY_PALETTE_EXTENSION))):
                     self.animate_background_color(QColor('#636363'))
                     event.acceptProposedAction()
                     return
         event.ignore()
 
-    # Handles the event where the user drops an image or palette json file into the docker
+    # Handles the event where the user drops images or a palette json file into the docker
+    # Several dropped images are extracted as a batch
     def handle_drop_event(self, event: QDropEvent):
         urls = event.mimeData().urls()
         if urls:
-            for url in urls:
-                if url.isLocalFile():
-                    file_path = url.toLocalFile()
-                    
-                    # User drops an image file to create a new palette
-                    if file_path.endswith(('.png', '.jpg', '.bmp')):
-                        try:
-                            self.parent.file_manager.open_image(file_path)
-                            event.acceptProposedAction()
-                            self.animate_background_color(self.parent.original_bg_color)
-                            return
-                        except Exception as e:
-                            self.show_error_popup("Error Loading File", f"An error occurred while loading the file: {e}")
-                            self.set_background_color(self.parent.original_bg_color)  # Ensure background color is reset
-                            return
-                    # User drops a pre-existing palette json file
-                    elif file_path.endswith('.json'):
-                        try:
-                            self.parent.file_manager.load_palette(file_path)
-                            event.acceptProposedAction()
-                            self.animate_background_color(self.parent.original_bg_color)
-                            return
-                        except Exception as e:
-                            self.show_error_popup("Error Loading Palette", f"An error occurred while loading the palette: {e}")
-                            self.set_background_color(self.parent.original_bg_color)  # Ensure background color is reset
-                            return
+            file_paths = [url.toLocalFile() for url in urls if url.isLocalFile()]
+
+            # User drops image files to create new palettes
+            image_paths = [file_path for file_path in file_paths if self.is_image_drop(file_path)]
+            if image_paths:
+                try:
+                    self.parent.file_manager.open_images(image_paths)
+                    event.acceptProposedAction()
+                    self.animate_background_color(self.parent.original_bg_color)
+                    return
+                except Exception as e:
+                    self.show_error_popup("Error Loading File", f"An error occurred while loading the file: {e}")
+                    self.set_background_color(self.parent.original_bg_color)  # Ensure background color is reset
+                    return
+
+            for file_path in file_paths:
+                # User drops a pre-existing palette json or binary file
+                if file_path.lower().endswith(('.json', BINARY_PALETTE_EXTENSION)):
+                    try:
+                        self.parent.file_manager.load_palette(file_path)
+                        event.acceptProposedAction()
+                        self.animate_background_color(self.parent.original_bg_color)
+                        return
+                    except Exception as e:
+                        self.show_error_popup("Error Loading Palette", f"An error occurred while loading the palette: {e}")
+                        self.set_background_color(self.parent.original_bg_color)  # Ensure background color is reset
+                        return
 
         # Invalid file type or path so ignore
         self.set_background_color(self.parent.original_bg_color)
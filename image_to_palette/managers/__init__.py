@@ -1,4 +1,11 @@
 from .UIManager import UIManager
 from .RecentPalettesManager import RecentPalettesManager
 from .PaletteManager import PaletteManager
-from .FileManager import FileManager
\ No newline at end of file
+from .FileManager import FileManager
+from .SettingsManager import SettingsManager
+from .BatchManager import BatchManager
+from .CanvasManager import CanvasManager
+from .LibraryManager import LibraryManager
+from .DebugManager import DebugManager
+from .RegionManager import RegionManager
+from .SearchManager import SearchManager
\ No newline at end of file
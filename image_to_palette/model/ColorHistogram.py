@@ -0,0 +1,37 @@
+from array import array
+
+# Represents the colors found in an image and their pixel counts, stored as two
+# packed arrays of 32-bit values ordered from most to least common
+# A histogram is never modified once created, so palette snapshots share it
+# Arrays or 'I' memoryviews (such as a memory mapped file) are used without copying
+class ColorHistogram:
+    __slots__ = ('colors', 'counts', 'sampling_index', 'lab_index')
+
+    def __init__(self, colors=(), counts=()):
+        self.colors = colors if isinstance(colors, (array, memoryview)) else array('I', colors)  # 0xAARRGGBB colors
+        self.counts = counts if isinstance(counts, (array, memoryview)) else array('I', counts)  # Pixel count of each color
+        self.sampling_index = None  # Cumulative pixel count table, built on first use
+        self.lab_index = None  # Lab colors and their grid, built on first use
+
+    # Creates a histogram from (rgb, count) pairs
+    @classmethod
+    def from_pairs(cls, pairs):
+        pairs = list(pairs)
+        return cls(array('I', (color for color, _ in pairs)), array('I', (count for _, count in pairs)))
+
+    # Returns the histogram as a list of (rgb, count) pairs
+    def to_pairs(self):
+        return list(zip(self.colors, self.counts))
+
+    def __len__(self):
+        return len(self.colors)
+
+    def __iter__(self):
+        return zip(self.colors, self.counts)
+
+    def __getitem__(self, index):
+        return self.colors[index], self.counts[index]
+
+    def __eq__(self, other):
+        return (isinstance(other, ColorHistogram) and len(self) == len(other)
+                and list(self.colors) == list(other.colors) and list(self.counts) == list(other.counts))
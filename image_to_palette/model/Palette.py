@@ -1,9 +1,22 @@
+from array import array
+
+from .ColorHistogram import ColorHistogram
+
+# Alpha bits stored with every palette color
+OPAQUE_ALPHA = 0xFF000000
+
 # Represents a set of dominant colors in an image
+# Colors are kept as packed 0xAARRGGBB integers, hex strings only exist in the json data
 class Palette:
+    __slots__ = ('image_name', 'source', 'cur_colors', 'total_colors', 'seed', 'method', 'palette_list', 'palette_index')
+
     def __init__(self):
         self.image_name = None  # Name of the original image source
-        self.cur_colors = []  # List of the current displayed colors
-        self.total_colors = []  # List of the total colors found in the image
+        self.source = None  # Full path or canvas name of the image source, None for loaded palettes
+        self.cur_colors = array('I')  # Current displayed colors
+        self.total_colors = ColorHistogram()  # Total colors found in the image, shared between snapshots
+        self.seed = None  # Seed the current colors were generated with, reproducing them from total_colors
+        self.method = None  # Name of the method the current colors were generated with
 
         self.palette_list = []  # List of all palettes generated from the image
         self.palette_index = -1 # Index of the current palette
@@ -14,20 +27,37 @@ class Palette:
 
     # Clears the current list of colors
     def clear_colors(self):
-        self.cur_colors = []
+        self.cur_colors = array('I')
+
+    # Creates a copy of the current colors for the navigation history
+    # The histogram is shared rather than copied, it is never modified
+    def snapshot(self):
+        palette_snapshot = Palette()
+        palette_snapshot.cur_colors = array('I', self.cur_colors)
+        palette_snapshot.total_colors = self.total_colors
+        palette_snapshot.image_name = self.image_name
+        palette_snapshot.source = self.source
+        palette_snapshot.seed = self.seed
+        palette_snapshot.method = self.method
+        return palette_snapshot
 
     # Initializes the palette from a json file
     def from_json(self, data):
         self.image_name = data.get("image_name", "")
-        self.cur_colors = data.get("current_colors", [])
-        self.total_colors = [(color, count) for color, count in data.get("total_colors", [])]
+        self.source = None
+        self.cur_colors = array('I', (int(color.lstrip('#'), 16) | OPAQUE_ALPHA for color in data.get("current_colors", [])))
+        self.total_colors = ColorHistogram.from_pairs(data.get("total_colors", []))
+        self.seed = data.get("seed")
+        self.method = data.get("method")
     
     # Converts the palette to a json file
     def to_json(self):
         return {
-            "current_colors": self.cur_colors,
-            "total_colors": [(color, count) for color, count in self.total_colors],
-            "image_name": self.image_name
+            "current_colors": [f'#{color:06x}' for color in self.cur_colors],
+            "total_colors": self.total_colors.to_pairs(),
+            "image_name": self.image_name,
+            "seed": self.seed,
+            "method": self.method
         }
     
     def get_index(self):
@@ -38,5 +68,9 @@ class Palette:
         if index >= 0 and index < len(self.palette_list):
             self.cur_colors = self.palette_list[index].cur_colors
             self.image_name = self.palette_list[index].image_name
+            self.source = self.palette_list[index].source
+            self.seed = self.palette_list[index].seed
+            self.method = self.palette_list[index].method
+            self.total_colors = self.palette_list[index].total_colors
         else:
             print("Index out of range.")
\ No newline at end of file
@@ -0,0 +1,79 @@
+import json
+import os
+
+from PyQt5.QtCore import pyqtSignal
+
+from .ExtractionWorker import ExtractionSignals, ExtractionWorker
+from ..core.Bucketing import DEFAULT_PRECISION
+from ..core.ColorDistance import DEFAULT_COLOR_DIFFERENCE, DEFAULT_MIN_DISTANCE
+from ..core.Extraction import extract_palette
+from ..core.PaletteFile import save_palette_file
+
+# Added to the full image file name, so the palette never takes the name of another file of the image
+BATCH_PALETTE_SUFFIX = '.palette'
+
+# Returns whether the given file is a palette saved by a batch for the given image, which can be replaced
+def is_batch_palette(file_name, image_path):
+    try:
+        with open(file_name, 'r') as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return False
+    return (isinstance(data, dict) and 'current_colors' in data and 'total_colors' in data
+            and data.get('image_name') == os.path.basename(image_path))
+
+# Returns the path a batch palette is saved to, next to its image
+# Files the batch did not write are never replaced, the palette is numbered instead
+def batch_palette_path(image_path):
+    stem = image_path + BATCH_PALETTE_SUFFIX
+    file_name = stem + '.json'
+    number = 1
+    while os.path.exists(file_name) and not is_batch_palette(file_name, image_path):
+        number += 1
+        file_name = f'{stem}-{number}.json'
+    return file_name
+
+# Saves a batch palette next to its image
+def save_batch_palette(image_path, palette):
+    save_palette_file(batch_palette_path(image_path), palette)
+
+# Signals of a batch worker, saving errors are reported apart since the palette was still extracted
+class BatchSignals(ExtractionSignals):
+    save_failed = pyqtSignal(int, str, str)  # Job id, image path, error message
+
+# Extracts a complete palette from one image of a batch on a thread pool thread
+# The finished signal carries the generated Palette instead of the histogram
+class BatchWorker(ExtractionWorker):
+    def __init__(self, job_id, image_path, sample_size, histogram_cache, method, save_next_to_image,
+                 precision=DEFAULT_PRECISION, min_distance=DEFAULT_MIN_DISTANCE, metric=DEFAULT_COLOR_DIFFERENCE):
+        super().__init__(job_id, image_path, sample_size, histogram_cache, precision)
+        self.signals = BatchSignals()
+        self.method = method
+        self.save_next_to_image = save_next_to_image
+        self.min_distance = min_distance
+        self.metric = metric
+
+    # Extracts the palette, saving it next to its image if requested
+    def extract(self):
+        if self.cancelled:
+            return
+
+        try:
+            palette = extract_palette(self.image_path, self.sample_size, self.method, self.histogram_cache,
+                                      precision=self.precision, min_distance=self.min_distance,
+                                      metric=self.metric)
+        except Exception as e:
+            if not self.cancelled:
+                self.signals.failed.emit(self.job_id, self.image_path, str(e))
+            return
+
+        # Posted before the palette, so the batch knows of it when the palette completes it
+        if self.save_next_to_image and not self.cancelled:
+            try:
+                save_batch_palette(self.image_path, palette)
+            except OSError as e:
+                if not self.cancelled:
+                    self.signals.save_failed.emit(self.job_id, self.image_path, str(e))
+
+        if not self.cancelled:
+            self.signals.finished.emit(self.job_id, self.image_path, palette)
@@ -0,0 +1,59 @@
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+from ..core.Bucketing import DEFAULT_PRECISION
+from ..core.Extraction import extract_colors
+from ..core.ImageDecoder import DEFAULT_SAMPLE_SIZE
+from ..core.SamplingIndex import get_sampling_index
+
+# Signals posted from the worker thread back to the GUI thread
+class ExtractionSignals(QObject):
+    finished = pyqtSignal(int, str, object)  # Job id, image path, total colors histogram
+    failed = pyqtSignal(int, str, str)  # Job id, image path, error message
+    stopped = pyqtSignal(int)  # Job id, posted last whether cancelled or not
+
+# Decodes an image and counts its colors on a thread pool thread
+class ExtractionWorker(QRunnable):
+    def __init__(self, job_id, image_path, sample_size=DEFAULT_SAMPLE_SIZE, histogram_cache=None,
+                 precision=DEFAULT_PRECISION):
+        super().__init__()
+        # Kept alive by its owner so it can still be cancelled while running
+        self.setAutoDelete(False)
+
+        self.job_id = job_id
+        self.image_path = image_path
+        self.sample_size = sample_size
+        self.histogram_cache = histogram_cache
+        self.precision = precision
+        self.cancelled = False
+        self.signals = ExtractionSignals()
+
+    # Requests the worker to stop, its results are then never posted
+    def cancel(self):
+        self.cancelled = True
+
+    # Runs the extraction, then reports that the worker has stopped
+    def run(self):
+        try:
+            self.extract()
+        finally:
+            self.signals.stopped.emit(self.job_id)
+
+    # Extracts the image colors, checking for cancellation between each stage
+    def extract(self):
+        if self.cancelled:
+            return
+
+        try:
+            total_colors = extract_colors(self.image_path, self.sample_size, self.histogram_cache,
+                                          lambda: self.cancelled, self.precision)
+            if total_colors is None or self.cancelled:
+                return
+
+            # Built once per image here, so regenerating never scans the histogram
+            get_sampling_index(total_colors)
+        except Exception as e:
+            if not self.cancelled:
+                self.signals.failed.emit(self.job_id, self.image_path, str(e))
+            return
+
+        self.signals.finished.emit(self.job_id, self.image_path, total_colors)
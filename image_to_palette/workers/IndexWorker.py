@@ -0,0 +1,36 @@
+import sqlite3
+
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+from ..core.PaletteIndex import PaletteIndex
+
+# Signals posted from the index thread back to the GUI thread
+class IndexWorkerSignals(QObject):
+    finished = pyqtSignal(object)  # (files read, files removed, directories scanned), or None if cancelled
+    failed = pyqtSignal(str)  # Error message
+
+# Updates the palette index on a thread pool thread, with its own database connection
+class IndexWorker(QRunnable):
+    def __init__(self, index_file):
+        super().__init__()
+        # Kept alive by its owner until its signals are delivered
+        self.setAutoDelete(False)
+
+        self.index_file = index_file
+        self.cancelled = False
+        self.signals = IndexWorkerSignals()
+
+    # Requests the worker to stop after the files being read
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        index = PaletteIndex(self.index_file)
+        try:
+            result = index.update(lambda: self.cancelled)
+        except (sqlite3.Error, OSError) as e:
+            self.signals.failed.emit(str(e))
+            return
+        finally:
+            index.close()
+        self.signals.finished.emit(result)
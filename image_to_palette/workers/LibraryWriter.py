@@ -0,0 +1,23 @@
+import sqlite3
+
+from PyQt5.QtCore import QRunnable
+
+from ..core.PaletteLibrary import PaletteLibrary
+
+# Writes recorded palettes to the library on a thread pool thread, in a single transaction
+# The writer opens its own connection, SQLite connections stay on the thread that opened them
+class LibraryWriter(QRunnable):
+    def __init__(self, file_name, records):
+        super().__init__()
+        self.file_name = file_name
+        self.records = records
+
+    def run(self):
+        library = PaletteLibrary(self.file_name)
+        try:
+            library.add_records(self.records)
+        except (sqlite3.Error, OSError) as e:
+            # A failure never stops the palettes from being used, they are only missing from the library
+            print(f"Unable to add {len(self.records)} palettes to the library: {e}")
+        finally:
+            library.close()
@@ -0,0 +1,20 @@
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+from ..core.RecentPalettes import reread_entry
+
+# Signal posted from the reader thread back to the GUI thread
+class RecentPaletteRereaderSignals(QObject):
+    reread = pyqtSignal(str, object)  # Path of the palette file, its updated entry or None if unreadable
+
+# Reads a recent palette file changed outside the docker again on a thread pool thread
+class RecentPaletteRereader(QRunnable):
+    def __init__(self, entry):
+        super().__init__()
+        # Kept alive by its owner until its signal is delivered
+        self.setAutoDelete(False)
+
+        self.entry = entry
+        self.signals = RecentPaletteRereaderSignals()
+
+    def run(self):
+        self.signals.reread.emit(self.entry["path"], reread_entry(self.entry))
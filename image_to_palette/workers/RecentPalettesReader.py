@@ -0,0 +1,24 @@
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+from ..core.RecentPalettes import load_recent_palettes
+
+# Signal posted from the reader thread back to the GUI thread
+class RecentPalettesReaderSignals(QObject):
+    loaded = pyqtSignal(object, bool)  # Entries of the existing palette files, most recent first, whether any was pruned
+
+# Reads the recent palette entries on a thread pool thread, so startup never waits on the disk
+class RecentPalettesReader(QRunnable):
+    def __init__(self, file_name, legacy_file_name):
+        super().__init__()
+        # Kept alive by its owner until its signal is delivered
+        self.setAutoDelete(False)
+
+        self.file_name = file_name
+        self.legacy_file_name = legacy_file_name
+        self.entries = None  # Kept once read, so they can be merged before the signal is delivered
+        self.pruned = False
+        self.signals = RecentPalettesReaderSignals()
+
+    def run(self):
+        self.entries, self.pruned = load_recent_palettes(self.file_name, self.legacy_file_name)
+        self.signals.loaded.emit(self.entries, self.pruned)
@@ -0,0 +1,17 @@
+from PyQt5.QtCore import QRunnable
+
+from ..core.RecentPalettes import write_recent_palettes
+
+# Writes a snapshot of the recent palette entries on a thread pool thread
+class RecentPalettesWriter(QRunnable):
+    def __init__(self, file_name, entries):
+        super().__init__()
+        self.file_name = file_name
+        self.entries = entries
+
+    def run(self):
+        try:
+            write_recent_palettes(self.file_name, self.entries)
+        except OSError as e:
+            # The list is still in memory, it is written again on the next change
+            print(f"Unable to save the recent palettes: {e}")
@@ -0,0 +1,34 @@
+from .ExtractionWorker import ExtractionWorker
+from ..core.Bucketing import DEFAULT_PRECISION
+from ..core.ImageDecoder import DEFAULT_SAMPLE_SIZE
+from ..core.Regions import extract_region_colors
+from ..core.SamplingIndex import get_sampling_index
+
+# Decodes an image once and counts the colors of each of its regions on a thread pool thread
+# The finished signal carries (region name, histogram) pairs instead of a single histogram
+class RegionWorker(ExtractionWorker):
+    def __init__(self, job_id, image_path, regions, mask_path=None, sample_size=DEFAULT_SAMPLE_SIZE,
+                 precision=DEFAULT_PRECISION):
+        super().__init__(job_id, image_path, sample_size, None, precision)
+        self.regions = regions
+        self.mask_path = mask_path
+
+    # Extracts the colors of every region, checking for cancellation between each stage
+    def extract(self):
+        if self.cancelled:
+            return
+
+        try:
+            region_colors = extract_region_colors(self.image_path, self.regions, self.mask_path, self.sample_size,
+                                                  lambda: self.cancelled, self.precision)
+            if region_colors is None or self.cancelled:
+                return
+
+            for _, total_colors in region_colors:
+                get_sampling_index(total_colors)
+        except Exception as e:
+            if not self.cancelled:
+                self.signals.failed.emit(self.job_id, self.image_path, str(e))
+            return
+
+        self.signals.finished.emit(self.job_id, self.image_path, region_colors)
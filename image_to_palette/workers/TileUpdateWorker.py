@@ -0,0 +1,33 @@
+from PyQt5.QtCore import QRunnable
+
+from .ExtractionWorker import ExtractionSignals
+from ..core.Instrumentation import span
+
+# Recounts the changed tiles of a followed canvas on a thread pool thread
+# The finished signal carries the updated histogram of the whole canvas
+class TileUpdateWorker(QRunnable):
+    def __init__(self, job_id, name, tile_histogram, dirty_tiles, stride):
+        super().__init__()
+        # Kept alive by its owner until its thread stops
+        self.setAutoDelete(False)
+
+        self.job_id = job_id
+        self.name = name
+        self.tile_histogram = tile_histogram
+        self.dirty_tiles = dirty_tiles
+        self.stride = stride
+        self.signals = ExtractionSignals()
+
+    # Recounts the tiles, then reports that the worker has stopped
+    def run(self):
+        try:
+            with span('update tiles', tiles=len(self.dirty_tiles)):
+                for key, (checksum, pixels) in self.dirty_tiles.items():
+                    self.tile_histogram.update(key, checksum, pixels, self.stride)
+                total_colors = self.tile_histogram.histogram()
+        except Exception as e:
+            self.signals.failed.emit(self.job_id, self.name, str(e))
+        else:
+            self.signals.finished.emit(self.job_id, self.name, total_colors)
+        finally:
+            self.signals.stopped.emit(self.job_id)
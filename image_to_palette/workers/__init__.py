@@ -0,0 +1,7 @@
+from .ExtractionWorker import ExtractionWorker
+from .BatchWorker import BatchWorker
+from .TileUpdateWorker import TileUpdateWorker
+from .RecentPalettesWriter import RecentPalettesWriter
+from .RecentPalettesReader import RecentPalettesReader
+from .RegionWorker import RegionWorker
+from .IndexWorker import IndexWorker
\ No newline at end of file
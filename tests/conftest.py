@@ -0,0 +1,63 @@
+import os
+import sys
+
+import pytest
+
+# The tests import the package from the repository, and Qt never needs a display
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from image_to_palette.model.ColorHistogram import ColorHistogram
+from image_to_palette.model.Palette import Palette
+
+# Returns a histogram of random opaque colors, ordered from most to least common
+def random_histogram(rng, length, bits=8):
+    mask = ((0xFF << (8 - bits)) & 0xFF) * 0x010101
+    counts = {}
+    while len(counts) < length:
+        counts[0xFF000000 | (rng.getrandbits(24) & mask)] = rng.randrange(1, 1000)
+    return ColorHistogram.from_pairs(sorted(counts.items(), key=lambda pair: -pair[1]))
+
+# Returns the (color, count) pairs of a histogram regardless of the order of equal counts
+def histogram_pairs(histogram):
+    return sorted(zip(histogram.colors, histogram.counts))
+
+# Returns a palette with the given swatches and a small histogram
+def make_palette(image_name, colors, seed=7, method='random'):
+    palette = Palette()
+    palette.image_name = image_name
+    palette.seed = seed
+    palette.method = method
+    for color in colors:
+        palette.add_color(0xFF000000 | color)
+    palette.total_colors = ColorHistogram.from_pairs((0xFF000000 | color, 10 * (index + 1))
+                                                     for index, color in reversed(list(enumerate(colors))))
+    return palette
+
+# Skips a test without NumPy, only needed to compare the NumPy and pure Python paths
+@pytest.fixture
+def numpy():
+    return pytest.importorskip('numpy')
+
+# Application Qt needs before decoding or painting images
+@pytest.fixture(scope='session')
+def qt_app():
+    QtGui = pytest.importorskip('PyQt5.QtGui')
+    return QtGui.QGuiApplication.instance() or QtGui.QGuiApplication([])
+
+# Writes an opaque RGB image with a few known colors, returning its path and pixel counts
+@pytest.fixture
+def image_file(qt_app, tmp_path):
+    from PyQt5.QtGui import QColor, QImage
+
+    image = QImage(40, 30, QImage.Format_RGB32)
+    image.fill(QColor('#102030'))
+    for y in range(10):
+        for x in range(40):
+            image.setPixelColor(x, y, QColor('#c04000'))
+    for y in range(10, 30):
+        for x in range(30, 40):
+            image.setPixelColor(x, y, QColor('#00ff80'))
+    path = str(tmp_path / 'image.png')
+    assert image.save(path)
+    return path, {0xFFC04000: 400, 0xFF102030: 600, 0xFF00FF80: 200}
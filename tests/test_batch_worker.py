@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+from conftest import make_palette
+
+pytest.importorskip('PyQt5')
+
+from image_to_palette.workers.BatchWorker import batch_palette_path, save_batch_palette
+
+def test_palettes_are_named_after_the_whole_image_file_name(tmp_path):
+    png, jpg = str(tmp_path / 'photo.png'), str(tmp_path / 'photo.jpg')
+
+    assert batch_palette_path(png) == png + '.palette.json'
+    assert batch_palette_path(png) != batch_palette_path(jpg)
+
+def test_files_not_written_by_a_batch_are_kept(tmp_path):
+    image = str(tmp_path / 'photo.png')
+    other = tmp_path / 'photo.png.palette.json'
+    other.write_text('{"settings": true}')
+
+    save_batch_palette(image, make_palette('photo.png', [0x123456]))
+    save_batch_palette(image, make_palette('photo.png', [0x654321]))
+
+    assert other.read_text() == '{"settings": true}'
+    assert sorted(os.listdir(str(tmp_path))) == ['photo.png.palette-2.json', 'photo.png.palette.json']
@@ -0,0 +1,58 @@
+import random
+from array import array
+
+import pytest
+
+from image_to_palette.core import Bucketing
+from image_to_palette.core.Bucketing import (EXACT_PRECISION, LAB_PRECISION, PRECISIONS, bucket_histogram,
+                                             create_accumulator)
+from image_to_palette.core.Histogram import count_pixels
+from image_to_palette.model.ColorHistogram import ColorHistogram
+from conftest import histogram_pairs, random_histogram
+
+def test_exact_precision_keeps_the_histogram():
+    histogram = ColorHistogram.from_pairs([(0xFF010203, 4)])
+
+    assert bucket_histogram(histogram, EXACT_PRECISION) is histogram
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+def test_rgb_buckets_hold_the_weighted_mean_color(use_numpy, monkeypatch):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(Bucketing, 'np', None)
+    # Both colors fall into the same 5-bit bucket, far from the third one
+    histogram = ColorHistogram.from_pairs([(0xFF000000, 3), (0xFF040404, 1), (0xFFFFFFFF, 2)])
+
+    bucketed = bucket_histogram(histogram, 'rgb555')
+
+    assert histogram_pairs(bucketed) == [(0xFF010101, 4), (0xFFFFFFFF, 2)]
+
+@pytest.mark.parametrize('precision', [precision for precision in PRECISIONS if precision != EXACT_PRECISION])
+def test_numpy_and_python_buckets_match(precision, numpy, monkeypatch):
+    rng = random.Random(11)
+    for length in (1, 50, 3000):
+        histogram = random_histogram(rng, length)
+        expected = bucket_histogram(histogram, precision)
+        with monkeypatch.context() as patch:
+            patch.setattr(Bucketing, 'np', None)
+            assert histogram_pairs(bucket_histogram(histogram, precision)) == histogram_pairs(expected)
+
+def test_lab_buckets_merge_close_shades(numpy):
+    histogram = ColorHistogram.from_pairs([(0xFF808080, 5), (0xFF818181, 5), (0xFF2040C0, 1)])
+
+    bucketed = bucket_histogram(histogram, LAB_PRECISION)
+
+    assert len(bucketed) == 2
+    assert list(bucketed.counts) == [10, 1]
+
+@pytest.mark.parametrize('precision', [precision for precision in PRECISIONS if precision != EXACT_PRECISION])
+def test_accumulator_matches_bucketed_exact_counts(precision):
+    rng = random.Random(2)
+    colors = array('I', (0xFF000000 | rng.getrandbits(24) for _ in range(5000)))
+    accumulator = create_accumulator(precision=precision)
+    for start in range(0, len(colors), 700):
+        accumulator.add(colors[start:start + 700].tobytes())
+
+    expected = bucket_histogram(count_pixels(colors.tobytes()), precision)
+    assert histogram_pairs(accumulator.histogram()) == histogram_pairs(expected)
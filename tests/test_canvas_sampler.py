@@ -0,0 +1,57 @@
+from array import array
+
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from image_to_palette.core.CanvasSampler import TILE_SIZE, TileSweep, read_dirty_tiles, sample_canvas, sample_tiles
+
+def test_sample_tiles_cover_the_region_once():
+    tiles = list(sample_tiles(0, 0, 600, 300, 1))
+
+    assert sum(width * height for _, _, width, height in tiles) == 600 * 300
+    assert tiles[0] == (0, 0, TILE_SIZE, TILE_SIZE) and tiles[-1] == (512, 256, 88, 44)
+
+def test_sample_canvas_counts_every_tile():
+    def read_pixels(x, y, width, height):
+        return array('I', [0xFF000000 | (x // TILE_SIZE)] * (width * height)).tobytes()
+
+    histogram = sample_canvas(read_pixels, 0, 0, 300, 10, sample_size=0)
+
+    assert sorted(zip(histogram.colors, histogram.counts)) == [(0xFF000000, 2560), (0xFF000001, 440)]
+
+def test_only_changed_tiles_are_kept():
+    tiles = list(sample_tiles(0, 0, 512, 256, 1))
+    counted = {}
+    read_pixels = lambda x, y, width, height: bytes([x // TILE_SIZE]) * (4 * width * height)
+
+    dirty = read_dirty_tiles(read_pixels, tiles, lambda key, checksum: counted.get(key) != checksum)
+    counted.update((key, checksum) for key, (checksum, _) in dirty.items())
+
+    assert sorted(dirty) == [(0, 0), (256, 0)]
+    assert read_dirty_tiles(read_pixels, tiles, lambda key, checksum: counted.get(key) != checksum) == {}
+
+def test_sweep_reads_about_the_pixel_budget_and_goes_round():
+    sweep = TileSweep(TILE_SIZE * 8, TILE_SIZE * 8, 1)
+    seen = []
+    for _ in range(16):
+        tiles = sweep.next_tiles({}, 4 * TILE_SIZE * TILE_SIZE)
+        assert len(tiles) == 4
+        seen += tiles
+
+    assert sorted(seen) == sorted(sweep.tiles)
+
+def test_sweep_reads_the_tiles_around_changes_first():
+    sweep = TileSweep(TILE_SIZE * 8, TILE_SIZE * 8, 1)
+
+    tiles = sweep.next_tiles({(TILE_SIZE * 3, TILE_SIZE * 3): None}, 1)
+
+    around = {(TILE_SIZE * x, TILE_SIZE * y) for x in (2, 3, 4) for y in (2, 3, 4)}
+    assert around <= {tile[:2] for tile in tiles}
+    assert len(tiles) == 10
+
+def test_downsampled_sweep_reads_rows():
+    sweep = TileSweep(1000, 400, 4)
+
+    assert len(sweep.tiles) == 100
+    assert {height for _, _, _, height in sweep.next_tiles({}, 5000)} == {1}
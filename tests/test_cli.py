@@ -0,0 +1,68 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from image_to_palette.__main__ import find_images, main
+from image_to_palette.core.PaletteFile import load_palette_file
+from image_to_palette.model.Palette import Palette
+
+# Writes a folder of images, one of them in a subfolder
+@pytest.fixture
+def image_folder(qt_app, tmp_path):
+    from PyQt5.QtGui import QColor, QImage
+
+    folder = tmp_path / 'images'
+    (folder / 'nested').mkdir(parents=True)
+    for relative_path, color in (('red.png', '#ff0000'), ('blue.jpg', '#0000ff'), ('nested/green.png', '#00ff00')):
+        image = QImage(16, 16, QImage.Format_RGB32)
+        image.fill(QColor(color))
+        assert image.save(str(folder / relative_path))
+    (folder / 'notes.txt').write_text('not an image')
+    return str(folder)
+
+def test_find_images_mirrors_the_folders(image_folder, tmp_path):
+    output = str(tmp_path / 'out')
+
+    jobs = sorted(find_images([image_folder], output, True, '.json'))
+
+    assert [os.path.relpath(palette, output) for _, palette in jobs] == [
+        'blue.json', os.path.join('nested', 'green.json'), 'red.json']
+    assert len(list(find_images([image_folder], None, False, '.json'))) == 2
+
+def test_palettes_are_written_for_every_image(image_folder, tmp_path):
+    output = tmp_path / 'out'
+
+    assert main([image_folder, '-r', '-o', str(output), '-j', '1', '--seed', '5']) == 0
+
+    palette = Palette()
+    load_palette_file(str(output / 'nested' / 'green.json'), palette)
+    assert palette.image_name == 'green.png'
+    assert len(palette.cur_colors) == 10
+    assert {color & 0xFFFFFF for color in palette.cur_colors} == {0x00FF00}
+
+def test_seeded_runs_are_reproducible(image_folder, tmp_path):
+    for name in ('first', 'second'):
+        assert main([image_folder, '-o', str(tmp_path / name), '-j', '2', '--seed', 'reference', '-f', 'binary']) == 0
+
+    for file_name in ('red.itpal', 'blue.itpal'):
+        first = (tmp_path / 'first' / file_name).read_bytes()
+        assert first == (tmp_path / 'second' / file_name).read_bytes()
+
+def test_existing_palettes_can_be_skipped(image_folder, tmp_path):
+    output = tmp_path / 'out'
+    output.mkdir()
+    (output / 'red.json').write_text('{"kept": true}')
+
+    assert main([image_folder, '-o', str(output), '-j', '1', '--skip-existing']) == 0
+
+    assert json.loads((output / 'red.json').read_text()) == {"kept": True}
+    assert (output / 'blue.json').exists()
+
+def test_failures_set_the_exit_status(qt_app, tmp_path):
+    broken = tmp_path / 'broken.png'
+    broken.write_bytes(b'not an image')
+
+    assert main([str(broken), '-j', '1']) == 1
@@ -0,0 +1,69 @@
+import random
+
+import pytest
+
+from image_to_palette.core.ColorDistance import (CIEDE2000, DistinctPicker, LabIndex, delta_e_76, delta_e_2000,
+                                                 delta_e_2000_array)
+from image_to_palette.core.ColorSpace import rgb_to_lab
+from image_to_palette.model.ColorHistogram import ColorHistogram
+from conftest import random_histogram
+
+# Test pairs and differences from Sharma, Wu and Dalal, "The CIEDE2000 Color-Difference Formula:
+# Implementation Notes, Supplementary Test Data, and Mathematical Observations" (2005)
+SHARMA_PAIRS = [
+    ((50.0000, 2.6772, -79.7751), (50.0000, 0.0000, -82.7485), 2.0425),
+    ((50.0000, 3.1571, -77.2803), (50.0000, 0.0000, -82.7485), 2.8615),
+    ((50.0000, 2.8361, -74.0200), (50.0000, 0.0000, -82.7485), 3.4412),
+    ((50.0000, -1.3802, -84.2814), (50.0000, 0.0000, -82.7485), 1.0000),
+    ((50.0000, 0.0000, 0.0000), (50.0000, -1.0000, 2.0000), 2.3669),
+    ((50.0000, 2.4900, -0.0010), (50.0000, -2.4900, 0.0009), 7.1792),
+    ((50.0000, 2.4900, -0.0010), (50.0000, -2.4900, 0.0011), 7.2195),
+    ((50.0000, 2.5000, 0.0000), (73.0000, 25.0000, -18.0000), 27.1492),
+    ((50.0000, 2.5000, 0.0000), (61.0000, -5.0000, 29.0000), 22.8977),
+    ((50.0000, 2.5000, 0.0000), (56.0000, -27.0000, -3.0000), 31.9030),
+    ((50.0000, 2.5000, 0.0000), (58.0000, 24.0000, 15.0000), 19.4535),
+    ((60.2574, -34.0099, 36.2677), (60.4626, -34.1751, 39.4387), 1.2644),
+    ((63.0109, -31.0961, -5.8663), (62.8187, -29.7946, -4.0864), 1.2630),
+    ((22.7233, 20.0904, -46.6940), (23.0331, 14.9730, -42.5619), 2.0373),
+    ((90.8027, -2.0831, 1.4410), (91.1528, -1.6435, 0.0447), 1.4441),
+    ((2.0776, 0.0795, -1.1350), (0.9033, -0.0636, -0.5514), 0.9082),
+]
+
+@pytest.mark.parametrize('lab1, lab2, expected', SHARMA_PAIRS)
+def test_delta_e_2000_matches_sharma(lab1, lab2, expected):
+    assert delta_e_2000(lab1, lab2) == pytest.approx(expected, abs=1e-4)
+    assert delta_e_2000(lab2, lab1) == pytest.approx(expected, abs=1e-4)
+
+def test_delta_e_2000_array_matches_scalar(numpy):
+    first = numpy.array([pair[0] for pair in SHARMA_PAIRS])
+    for lab1, lab2, expected in SHARMA_PAIRS:
+        differences = delta_e_2000_array(first, lab2)
+        assert differences.tolist() == pytest.approx([delta_e_2000(lab, lab2) for lab in first.tolist()], abs=1e-9)
+
+def test_delta_e_76_is_the_lab_distance():
+    assert delta_e_76((50, 0, 0), (53, 4, 0)) == pytest.approx(5.0)
+
+def test_rgb_to_lab_of_white_and_black():
+    assert rgb_to_lab(0xFFFFFF) == pytest.approx((100.0, 0.0, 0.0), abs=1e-3)
+    assert rgb_to_lab(0x000000) == pytest.approx((0.0, 0.0, 0.0), abs=1e-3)
+
+@pytest.mark.parametrize('metric', ['cie76', CIEDE2000])
+def test_lab_index_finds_every_color_within_the_distance(metric):
+    histogram = random_histogram(random.Random(12), 2000)
+    index = LabIndex(histogram)
+    difference = delta_e_2000 if metric == CIEDE2000 else delta_e_76
+    center = rgb_to_lab(0x808080)
+
+    found = set(index.within(center, 12, metric))
+
+    expected = {i for i, color in enumerate(histogram.colors) if difference(center, rgb_to_lab(color & 0xFFFFFF)) < 12}
+    assert expected <= found
+
+def test_picker_fills_from_the_most_common_colors_left():
+    histogram = ColorHistogram.from_pairs([(0xFF808080, 10), (0xFF818181, 5), (0xFF828282, 1)])
+    picker = DistinctPicker(histogram, 3, 20)
+
+    picker.offer_indices(range(len(histogram)))
+
+    assert picker.chosen == [0xFF808080]
+    assert picker.fill() == [0xFF808080, 0xFF818181, 0xFF828282]
@@ -0,0 +1,49 @@
+import random
+
+import pytest
+
+from image_to_palette.core.HistogramCache import HistogramCache
+from conftest import histogram_pairs
+
+pytest.importorskip('PyQt5')
+
+from image_to_palette.core.Extraction import extract_colors, extract_palette, generate_colors
+
+def test_extract_colors_counts_every_pixel(image_file):
+    path, counts = image_file
+
+    histogram = extract_colors(path, sample_size=0)
+
+    assert histogram_pairs(histogram) == sorted(counts.items())
+    assert list(histogram.counts) == sorted(counts.values(), reverse=True)
+
+def test_extract_colors_reads_the_cache(image_file, tmp_path):
+    path, _ = image_file
+    cache = HistogramCache(str(tmp_path / 'cache'))
+    histogram = extract_colors(path, 0, cache)
+
+    assert cache.get(path, 'sample=0') == histogram
+    assert extract_colors(path, 0, cache, is_cancelled=lambda: True) == histogram
+
+def test_unwritable_cache_never_fails_an_extraction(image_file, tmp_path, capsys):
+    path, counts = image_file
+    directory = tmp_path / 'cache'
+    directory.write_bytes(b'')
+
+    histogram = extract_colors(path, 0, HistogramCache(str(directory)))
+
+    assert histogram_pairs(histogram) == sorted(counts.items())
+    assert 'Unable to cache' in capsys.readouterr().out
+
+def test_cancelled_extraction_returns_none(image_file):
+    assert extract_colors(image_file[0], 0, is_cancelled=lambda: True) is None
+
+def test_extract_palette_is_reproducible(image_file):
+    path, counts = image_file
+
+    palette = extract_palette(path, 0, 'median_cut', seed=3)
+
+    assert palette.image_name == 'image.png'
+    assert palette.source == path
+    assert sorted(set(palette.cur_colors)) == sorted(counts)
+    assert list(palette.cur_colors) == generate_colors(palette.total_colors, 'median_cut', seed=3)
@@ -0,0 +1,80 @@
+import random
+from array import array
+
+import pytest
+
+from image_to_palette.core import Histogram
+from image_to_palette.core.Histogram import (OPAQUE_ALPHA, PixelAccumulator, count_pixels, merge_histograms,
+                                             unpremultiply)
+from image_to_palette.model.ColorHistogram import ColorHistogram
+from conftest import histogram_pairs
+
+# Forces the pure Python path of the histogram functions
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(Histogram, 'np', None)
+    return request.param
+
+def pixels(colors):
+    return array('I', colors).tobytes()
+
+def test_count_pixels_orders_colors_by_count(backend):
+    histogram = count_pixels(pixels([0xFF112233] * 3 + [0xFF445566] * 5 + [0xFF778899]))
+
+    assert list(histogram.colors) == [0xFF445566, 0xFF112233, 0xFF778899]
+    assert list(histogram.counts) == [5, 3, 1]
+
+def test_count_pixels_forces_opaque_alpha(backend):
+    histogram = count_pixels(pixels([0x00112233, 0x80112233, 0xFF112233]))
+
+    assert histogram_pairs(histogram) == [(0xFF112233, 3)]
+
+def test_premultiplied_pixels_collapse_to_their_color(backend):
+    # Half transparent 0x804020 is stored premultiplied as 0x402010
+    histogram = count_pixels(pixels([0x80402010, 0xFF804020]), premultiplied=True)
+
+    assert histogram_pairs(histogram) == [(0xFF804020, 2)]
+
+def test_unpremultiply_rounds_like_qt():
+    assert unpremultiply(0x80402010) == 0xFF804020
+    assert unpremultiply(0x01010101) == 0xFFFFFFFF
+    assert unpremultiply(0x00123456) == 0xFF123456
+
+def test_unpremultiply_numpy_matches_unpremultiply(numpy):
+    rng = random.Random(5)
+    colors = []
+    for _ in range(5000):
+        alpha = rng.randrange(256)
+        colors.append((alpha << 24) | (rng.randrange(alpha + 1) << 16) | (rng.randrange(alpha + 1) << 8) | rng.randrange(alpha + 1))
+
+    result = Histogram.unpremultiply_numpy(numpy.array(colors, dtype=numpy.uint32))
+
+    assert result.tolist() == [unpremultiply(color) for color in colors]
+
+def test_accumulator_counts_strided_and_masked_pixels(backend):
+    accumulator = PixelAccumulator(skip_transparent=True)
+    accumulator.add(pixels([0xFF000001, 0xFF000002] * 4), stride=2)
+    accumulator.add(pixels([0xFF000003, 0xFF000004, 0x00000005]), mask=bytes([1, 0, 1]))
+
+    assert histogram_pairs(accumulator.histogram()) == [(0xFF000001, 4), (0xFF000003, 1)]
+
+def test_accumulator_matches_count_pixels_over_tiles(backend):
+    rng = random.Random(3)
+    colors = [OPAQUE_ALPHA | rng.randrange(64) for _ in range(4000)]
+    accumulator = PixelAccumulator()
+    for start in range(0, len(colors), 512):
+        accumulator.add(pixels(colors[start:start + 512]))
+
+    assert histogram_pairs(accumulator.histogram()) == histogram_pairs(count_pixels(pixels(colors)))
+
+def test_merge_histograms_adds_counts(backend):
+    first = ColorHistogram.from_pairs([(0xFF000001, 5), (0xFF000002, 1)])
+    second = ColorHistogram.from_pairs([(0xFF000002, 7), (0xFF000003, 2)])
+
+    merged = merge_histograms([first, ColorHistogram(), second])
+
+    assert list(merged.colors) == [0xFF000002, 0xFF000001, 0xFF000003]
+    assert list(merged.counts) == [8, 5, 2]
@@ -0,0 +1,135 @@
+import json
+import os
+
+import pytest
+
+from image_to_palette.core.HistogramCache import INDEX_FILE_NAME, INDEX_SAVE_INTERVAL, HistogramCache
+from image_to_palette.model.ColorHistogram import ColorHistogram
+
+HISTOGRAM = ColorHistogram.from_pairs([(0xFF102030, 50), (0xFF405060, 20), (0xFF708090, 1)])
+
+# Creates files standing in for images, the cache only reads their path and stat
+@pytest.fixture
+def images(tmp_path):
+    paths = []
+    for name in ('a.png', 'b.png', 'c.png'):
+        path = tmp_path / name
+        path.write_bytes(name.encode('utf-8'))
+        paths.append(str(path))
+    return paths
+
+def read_index(directory):
+    with open(os.path.join(directory, INDEX_FILE_NAME)) as file:
+        return json.load(file)
+
+def entry_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.bin'))
+
+def test_round_trip(tmp_path, images):
+    cache = HistogramCache(str(tmp_path / 'cache'))
+    cache.put(images[0], HISTOGRAM, 'sample=100')
+
+    assert HistogramCache(str(tmp_path / 'cache')).get(images[0], 'sample=100') == HISTOGRAM
+    assert cache.get(images[0], 'sample=0') is None
+
+def test_changed_image_misses(tmp_path, images):
+    cache = HistogramCache(str(tmp_path / 'cache'))
+    cache.put(images[0], HISTOGRAM)
+    with open(images[0], 'ab') as file:
+        file.write(b'more')
+
+    assert cache.get(images[0]) is None
+
+def test_hits_save_the_index_in_batches(tmp_path, images):
+    directory = str(tmp_path / 'cache')
+    cache = HistogramCache(directory)
+    cache.put(images[0], HISTOGRAM)
+    cache.put(images[1], HISTOGRAM)
+    saved = read_index(directory)
+
+    for _ in range(INDEX_SAVE_INTERVAL - 1):
+        assert cache.get(images[0]) == HISTOGRAM
+    assert read_index(directory) == saved
+
+    cache.flush()
+    assert [key for key, _ in read_index(directory)] == [saved[1][0], saved[0][0]]
+
+def test_least_recently_used_entries_are_evicted(tmp_path, images):
+    directory = str(tmp_path / 'cache')
+    cache = HistogramCache(directory)
+    for image in images:
+        cache.put(image, HISTOGRAM)
+    cache.get(images[0])
+
+    entry_size = read_index(directory)[0][1]
+    cache.set_budget(2 * entry_size)
+
+    assert cache.get(images[1]) is None
+    assert cache.get(images[0]) == HISTOGRAM
+    assert cache.get(images[2]) == HISTOGRAM
+    assert len(entry_files(directory)) == 2
+
+def test_entries_left_out_of_the_index_are_evicted_first(tmp_path, images):
+    directory = str(tmp_path / 'cache')
+    cache = HistogramCache(directory)
+    cache.put(images[0], HISTOGRAM)
+    cache.put(images[1], HISTOGRAM)
+    entry_size = read_index(directory)[0][1]
+    os.remove(os.path.join(directory, INDEX_FILE_NAME))
+
+    cache = HistogramCache(directory, budget=2 * entry_size)
+    cache.put(images[2], HISTOGRAM)
+    assert len(entry_files(directory)) == 2
+    assert cache.get(images[2]) == HISTOGRAM
+
+    cache.set_budget(entry_size)
+    assert len(entry_files(directory)) == 1
+    assert cache.get(images[2]) == HISTOGRAM
+
+def test_corrupt_entries_are_dropped(tmp_path, images):
+    directory = str(tmp_path / 'cache')
+    cache = HistogramCache(directory)
+    cache.put(images[0], HISTOGRAM)
+    for name in entry_files(directory):
+        with open(os.path.join(directory, name), 'wb') as file:
+            file.write(b'ITPH')
+
+    assert cache.get(images[0]) is None
+    assert entry_files(directory) == []
+
+def test_clear_removes_every_entry(tmp_path, images):
+    directory = str(tmp_path / 'cache')
+    cache = HistogramCache(directory)
+    for image in images:
+        cache.put(image, HISTOGRAM)
+
+    cache.clear()
+
+    assert entry_files(directory) == []
+    assert read_index(directory) == []
+
+def test_unwritable_cache_raises_os_errors(tmp_path, images):
+    # A file where the cache directory should be
+    directory = tmp_path / 'cache'
+    directory.write_bytes(b'')
+    cache = HistogramCache(str(directory))
+
+    assert cache.get(images[0]) is None
+    with pytest.raises(OSError):
+        cache.put(images[0], HISTOGRAM)
+
+def test_unsaved_index_never_fails_a_read(tmp_path, images, capsys):
+    directory = str(tmp_path / 'cache')
+    cache = HistogramCache(directory)
+    cache.put(images[0], HISTOGRAM)
+    # A directory in the way of the saved index makes every save fail
+    os.mkdir(os.path.join(directory, INDEX_FILE_NAME + '.tmp'))
+
+    for _ in range(INDEX_SAVE_INTERVAL + 1):
+        assert cache.get(images[0]) == HISTOGRAM
+    assert 'Unable to save the histogram cache index' in capsys.readouterr().out
+
+def test_missing_images_miss(tmp_path, images):
+    cache = HistogramCache(str(tmp_path / 'cache'))
+
+    assert cache.get(str(tmp_path / 'missing.png')) is None
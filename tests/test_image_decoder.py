@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+from conftest import histogram_pairs
+from tiff_writer import write_tiff
+
+pytest.importorskip('PyQt5')
+
+from image_to_palette.core import ImageDecoder
+from image_to_palette.core.ImageDecoder import (image_colors, is_image_file, is_streamable, load_sample,
+                                                sample_stride, stream_colors)
+
+def test_sample_stride_fits_the_sample_size():
+    assert sample_stride(1000, 500, 100) == 10
+    assert sample_stride(1001, 500, 100) == 11
+    assert sample_stride(50, 50, 100) == 1
+    assert sample_stride(5000, 5000, 0) == 1
+
+def test_load_sample_fits_the_sample_size(image_file):
+    image = load_sample(image_file[0], 20)
+
+    assert (image.width(), image.height()) == (20, 15)
+    assert load_sample(image_file[0], 0).width() == 40
+
+def test_unreadable_images_raise_value_errors(qt_app, tmp_path):
+    path = tmp_path / 'broken.png'
+    path.write_bytes(b'not an image')
+
+    with pytest.raises(ValueError):
+        load_sample(str(path))
+
+def test_image_colors_counts_every_pixel(image_file):
+    path, counts = image_file
+
+    assert histogram_pairs(image_colors(load_sample(path, 0))) == sorted(counts.items())
+
+def test_is_image_file_checks_the_extension(qt_app):
+    assert is_image_file('photo.PNG')
+    assert not is_image_file('palette.json')
+
+# Writes an RGB TIFF of random pixels of a few colors, returning its path and samples
+def write_rgb_tiff(path, width, height, **layout):
+    rng = random.Random(4)
+    colors = [bytes(rng.randrange(256) for _ in range(3)) for _ in range(6)]
+    samples = b''.join(rng.choice(colors) for _ in range(width * height))
+    write_tiff(path, width, height, samples, 3, compression=8, predictor=2, **layout)
+    return path
+
+def test_only_huge_tiffs_are_streamed(tmp_path, monkeypatch):
+    path = write_rgb_tiff(str(tmp_path / 'image.tif'), 64, 48)
+
+    assert not is_streamable(path)
+    monkeypatch.setattr(ImageDecoder, 'STREAMING_PIXEL_THRESHOLD', 64 * 48 - 1)
+    assert is_streamable(path)
+    assert not is_streamable(str(tmp_path / 'missing.tif'))
+
+@pytest.mark.parametrize('layout', [{}, {'rows_per_strip': 7}, {'tile': (16, 16)}])
+def test_streamed_colors_match_qt(qt_app, tmp_path, layout):
+    path = write_rgb_tiff(str(tmp_path / 'image.tif'), 64, 48, **layout)
+
+    expected = image_colors(load_sample(path, 0))
+    assert histogram_pairs(stream_colors(path, 0)) == histogram_pairs(expected)
+
+def test_streamed_colors_are_sampled(qt_app, tmp_path):
+    path = write_rgb_tiff(str(tmp_path / 'image.tif'), 64, 48, tile=(16, 16))
+
+    # Every 4th pixel of every 4th row
+    assert sum(stream_colors(path, 16).counts) == 16 * 12
+    assert stream_colors(path, 16, is_cancelled=lambda: True) is None
@@ -0,0 +1,68 @@
+import os
+import struct
+import zipfile
+
+import pytest
+
+from image_to_palette.core.PaletteExport import KPL_MIMETYPE, export_palettes, is_export_format
+from conftest import make_palette
+
+PALETTES = [make_palette('sky.png', [0x87CEEB, 0x4682B4]), make_palette(None, [0xFFFFFF])]
+
+def test_gpl_lists_every_swatch_under_its_palette(tmp_path):
+    path = str(tmp_path / 'history.gpl')
+
+    assert export_palettes(path, PALETTES) == 2
+
+    lines = open(path, encoding='utf-8').read().splitlines()
+    assert lines[:2] == ['GIMP Palette', 'Name: history']
+    assert lines[4:] == ['# sky.png', '135 206 235\tsky.png 1', ' 70 130 180\tsky.png 2',
+                         '# Palette 2', '255 255 255\tPalette 2 1']
+
+def test_kpl_is_a_krita_colorset(tmp_path):
+    path = str(tmp_path / 'history.kpl')
+    export_palettes(path, PALETTES, 'History')
+
+    with zipfile.ZipFile(path) as archive:
+        assert archive.namelist()[0] == 'mimetype'
+        assert archive.read('mimetype').decode() == KPL_MIMETYPE
+        colorset = archive.read('colorset.xml').decode('utf-8')
+    assert 'name="History"' in colorset
+    assert colorset.count('<Group ') == 2
+    assert colorset.count('<ColorSetEntry ') == 3
+
+def test_single_palette_kpl_has_no_groups(tmp_path):
+    path = str(tmp_path / 'sky.kpl')
+    export_palettes(path, PALETTES[:1])
+
+    with zipfile.ZipFile(path) as archive:
+        colorset = archive.read('colorset.xml').decode('utf-8')
+    assert '<Group ' not in colorset
+    assert 'rows="1"' in colorset
+
+def test_ase_counts_its_blocks(tmp_path):
+    path = str(tmp_path / 'history.ase')
+    export_palettes(path, iter(PALETTES))
+
+    data = open(path, 'rb').read()
+    assert data[:4] == b'ASEF'
+    # A group start and end per palette, and one block per swatch
+    assert struct.unpack('>HHI', data[4:12]) == (1, 0, 2 * 2 + 3)
+
+def test_unknown_formats_are_refused(tmp_path):
+    assert not is_export_format('palette.json')
+    with pytest.raises(ValueError):
+        export_palettes(str(tmp_path / 'palette.txt'), PALETTES)
+
+def test_failed_exports_leave_no_partial_file(tmp_path):
+    path = tmp_path / 'history.gpl'
+    path.write_text('kept')
+
+    def palettes():
+        yield PALETTES[0]
+        raise OSError('No space left on device')
+
+    with pytest.raises(OSError):
+        export_palettes(str(path), palettes())
+    assert path.read_text() == 'kept'
+    assert os.listdir(str(tmp_path)) == ['history.gpl']
@@ -0,0 +1,121 @@
+import os
+import types
+from array import array
+
+import pytest
+
+from image_to_palette.core import PaletteFile
+from image_to_palette.core.PaletteFile import (FILE_HEADER, MappedColorHistogram, load_palette_file,
+                                               release_mapped_histograms, save_palette_file, write_palette)
+from image_to_palette.model.Palette import Palette
+from conftest import make_palette
+
+COLORS = [0x112233, 0x445566, 0x778899, 0xAABBCC]
+
+def assert_same_palette(loaded, palette):
+    assert loaded.image_name == palette.image_name
+    assert list(loaded.cur_colors) == list(palette.cur_colors)
+    assert loaded.seed == palette.seed
+    assert loaded.method == palette.method
+    assert loaded.total_colors.to_pairs() == palette.total_colors.to_pairs()
+
+def test_json_round_trip(tmp_path):
+    palette = make_palette('photo.png', COLORS)
+    path = str(tmp_path / 'palette.json')
+
+    save_palette_file(path, palette)
+    loaded = Palette()
+    load_palette_file(path, loaded)
+
+    assert_same_palette(loaded, palette)
+
+def test_binary_round_trip_maps_the_histogram(tmp_path):
+    palette = make_palette('photo.png', COLORS)
+    path = str(tmp_path / 'palette.itpal')
+
+    save_palette_file(path, palette)
+    loaded = Palette()
+    load_palette_file(path, loaded)
+
+    assert isinstance(loaded.total_colors, MappedColorHistogram)
+    assert_same_palette(loaded, palette)
+    _, _, _, _, offset, length = FILE_HEADER.unpack(open(path, 'rb').read(FILE_HEADER.size))
+    assert offset % 8 == 0 and length == len(COLORS)
+
+def test_big_endian_files_are_read_byte_swapped(tmp_path, monkeypatch):
+    palette = make_palette('photo.png', COLORS)
+    path = str(tmp_path / 'palette.itpal')
+    save_palette_file(path, palette)
+
+    # A big-endian machine reads the little-endian file by swapping every value
+    monkeypatch.setattr(PaletteFile, 'sys', types.SimpleNamespace(byteorder='big'))
+    loaded = Palette()
+    load_palette_file(path, loaded)
+
+    swapped = array('I', palette.total_colors.colors)
+    swapped.byteswap()
+    assert list(loaded.total_colors.colors) == list(swapped)
+    assert loaded.total_colors.mapping is None
+
+def test_big_endian_writes_are_read_back(tmp_path, monkeypatch):
+    palette = make_palette('photo.png', COLORS)
+    path = str(tmp_path / 'palette.itpal')
+    monkeypatch.setattr(PaletteFile, 'sys', types.SimpleNamespace(byteorder='big'))
+
+    save_palette_file(path, palette)
+    loaded = Palette()
+    load_palette_file(path, loaded)
+
+    assert loaded.total_colors.to_pairs() == palette.total_colors.to_pairs()
+
+def test_released_histogram_stays_readable_once_unmapped(tmp_path):
+    path = str(tmp_path / 'palette.itpal')
+    save_palette_file(path, make_palette('photo.png', COLORS))
+    loaded = Palette()
+    load_palette_file(path, loaded)
+    pairs = loaded.total_colors.to_pairs()
+    assert loaded.total_colors.mapping is not None
+
+    release_mapped_histograms(os.path.join(str(tmp_path), '.', 'palette.itpal'))
+
+    assert loaded.total_colors.mapping is None
+    assert loaded.total_colors.to_pairs() == pairs
+
+def test_saving_over_the_mapped_file_keeps_its_histogram(tmp_path, monkeypatch):
+    path = str(tmp_path / 'palette.itpal')
+    save_palette_file(path, make_palette('photo.png', COLORS))
+    loaded = Palette()
+    load_palette_file(path, loaded)
+    pairs = loaded.total_colors.to_pairs()
+
+    # Windows can't replace a mapped file, the histogram is unmapped before the file is replaced
+    monkeypatch.setattr(PaletteFile.os, 'name', 'nt')
+    write_palette(path, loaded)
+    monkeypatch.undo()
+
+    assert loaded.total_colors.mapping is None
+    assert loaded.total_colors.to_pairs() == pairs
+    reloaded = Palette()
+    load_palette_file(path, reloaded)
+    assert reloaded.total_colors.to_pairs() == pairs
+
+@pytest.mark.parametrize('size', [FILE_HEADER.size - 1, FILE_HEADER.size + 4, -4])
+def test_truncated_files_are_refused_on_load(tmp_path, size):
+    path = tmp_path / 'palette.itpal'
+    save_palette_file(str(path), make_palette('photo.png', COLORS))
+    data = path.read_bytes()
+    path.write_bytes(data[:size])
+
+    with pytest.raises(ValueError):
+        load_palette_file(str(path), Palette())
+
+def test_histogram_offset_inside_the_header_is_refused(tmp_path):
+    path = tmp_path / 'palette.itpal'
+    save_palette_file(str(path), make_palette('photo.png', COLORS))
+    data = bytearray(path.read_bytes())
+    magic, version, reserved, header_size, offset, length = FILE_HEADER.unpack_from(data)
+    FILE_HEADER.pack_into(data, 0, magic, version, reserved, header_size, FILE_HEADER.size, length)
+    path.write_bytes(bytes(data))
+
+    with pytest.raises(ValueError):
+        load_palette_file(str(path), Palette())
@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from image_to_palette.core.PaletteFile import save_palette_file
+from image_to_palette.core.PaletteIndex import PaletteIndex, is_within, palette_signature, similarity
+from conftest import make_palette
+
+# Writes a palette file, creating its folder
+def write_palette(path, colors):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    save_palette_file(path, make_palette(os.path.basename(path), colors))
+
+@pytest.fixture
+def index(tmp_path):
+    index = PaletteIndex(str(tmp_path / 'index.sqlite'))
+    yield index
+    index.close()
+
+@pytest.fixture
+def palettes(tmp_path):
+    root = tmp_path / 'palettes'
+    write_palette(str(root / 'reds.json'), [0xFF0000, 0xE00000, 0xC01010])
+    write_palette(str(root / 'nested' / 'blues.itpal'), [0x0000FF, 0x0000E0])
+    write_palette(str(root / 'nested' / 'greens.json'), [0x00FF00, 0x10E010])
+    (root / 'notes.txt').write_text('not a palette')
+    return str(root)
+
+def test_update_only_reads_changed_files(index, palettes):
+    index.add_folder(palettes)
+
+    read, removed, directories = index.update()
+    assert (read, removed) == (3, 0)
+    assert sorted(directories) == [palettes, os.path.join(palettes, 'nested')]
+    assert index.update()[:2] == (0, 0)
+
+    os.remove(os.path.join(palettes, 'reds.json'))
+    write_palette(os.path.join(palettes, 'nested', 'greens.json'), [0x00FF00])
+    assert index.update()[:2] == (1, 1)
+    assert index.count() == 2
+
+def test_files_that_are_not_palettes_are_skipped(index, palettes):
+    with open(os.path.join(palettes, 'broken.json'), 'w') as file:
+        file.write('{')
+    index.add_folder(palettes)
+    index.update()
+
+    assert index.count() == 3
+
+def test_search_ranks_the_closest_palette_first(index, palettes):
+    index.add_folder(palettes)
+    index.update()
+
+    results = index.search(palette_signature(make_palette('query', [0x0000F0, 0x0000FF])), k=2)
+
+    assert len(results) == 2
+    assert os.path.basename(results[0].path) == 'blues.itpal'
+    assert results[0].image_name == 'blues.itpal'
+    assert results[0].similarity > results[1].similarity
+
+def test_folder_inside_an_indexed_folder_is_already_covered(index, palettes):
+    index.add_folder(palettes)
+    index.update()
+
+    assert index.add_folder(os.path.join(palettes, 'nested')) == os.path.abspath(palettes)
+    assert index.folders() == [os.path.abspath(palettes)]
+    assert index.update()[:2] == (0, 0)
+    assert index.count() == 3
+
+def test_indexed_folders_are_merged_into_a_new_parent(index, palettes):
+    nested = os.path.join(palettes, 'nested')
+    index.add_folder(nested)
+    index.update()
+
+    assert index.add_folder(palettes) == os.path.abspath(palettes)
+    assert index.folders() == [os.path.abspath(palettes)]
+    assert index.update()[:2] == (1, 0)
+    assert index.count() == 3
+
+    index.remove_folder(os.path.abspath(palettes))
+    assert index.count() == 0
+    assert index.search(palette_signature(make_palette('query', [0x0000FF]))) == []
+
+def test_is_within_compares_whole_path_components(tmp_path):
+    folder = str(tmp_path / 'palettes')
+
+    assert is_within(os.path.join(folder, 'nested'), folder)
+    assert is_within(folder, folder)
+    assert not is_within(folder + '-old', folder)
+
+def test_signatures_of_equal_palettes_are_most_similar():
+    reds = palette_signature(make_palette('a', [0xFF0000, 0xE00000]))
+    blues = palette_signature(make_palette('b', [0x0000FF]))
+
+    assert similarity(reds, reds) == pytest.approx(1.0, abs=1e-5)
+    assert similarity(reds, blues) < 0.5
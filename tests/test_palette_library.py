@@ -0,0 +1,66 @@
+import pytest
+
+from image_to_palette.core.PaletteLibrary import KIND_SAVED, PaletteLibrary, library_record
+from conftest import make_palette
+
+@pytest.fixture
+def library(tmp_path):
+    library = PaletteLibrary(str(tmp_path / 'library' / 'library.sqlite'))
+    yield library
+    library.close()
+
+def test_palettes_are_listed_newest_first(library):
+    ids = [library.add_palette(make_palette(f'image{index}.png', [0x102030 * index])) for index in range(1, 6)]
+
+    assert library.count() == 5
+    first_page = library.page(limit=2)
+    assert [entry.palette_id for entry in first_page] == ids[:2:-1][:2]
+    assert [entry.palette_id for entry in library.page(first_page[-1].palette_id, limit=10)] == ids[2::-1]
+
+def test_entries_keep_the_palette(library):
+    palette = make_palette('photo.png', [0xFF0000, 0x00FF00])
+    palette_id = library.add_palette(palette, '/images/photo.png', KIND_SAVED)
+
+    entry, = library.get([palette_id])
+    restored = entry.to_palette()
+
+    assert (entry.image_name, entry.source, entry.kind) == ('photo.png', '/images/photo.png', KIND_SAVED)
+    assert [color & 0xFFFFFF for color in restored.cur_colors] == [0xFF0000, 0x00FF00]
+    assert (restored.seed, restored.method) == (palette.seed, palette.method)
+
+def test_find_by_color_returns_the_closest_palettes_first(library):
+    red = library.add_palette(make_palette('red.png', [0xFF0000, 0x000000]))
+    close = library.add_palette(make_palette('close.png', [0xF80404]))
+    library.add_palette(make_palette('blue.png', [0x0000FF]))
+
+    matches = library.find_by_color(0xFF0000, max_distance=10)
+
+    assert [palette_id for palette_id, _ in matches] == [red, close]
+    assert matches[0][1] == pytest.approx(0)
+
+def test_removed_palettes_are_no_longer_found(library):
+    palette_id = library.add_palette(make_palette('red.png', [0xFF0000]))
+
+    library.remove_palette(palette_id)
+
+    assert library.count() == 0
+    assert library.find_by_color(0xFF0000) == []
+
+def test_iterate_reads_the_whole_library_in_pages(library):
+    for index in range(7):
+        library.add_palette(make_palette(f'image{index}.png', [index]))
+
+    names = [palette.image_name for palette in library.iterate(page_size=3)]
+
+    assert names == [f'image{index}.png' for index in range(6, -1, -1)]
+
+def test_records_keep_the_palette_as_it_was_recorded(library):
+    palette = make_palette('photo.png', [0xFF0000])
+    records = [library_record(palette, '/images/photo.png'), library_record(make_palette('sky.png', [0x87CEEB]))]
+    palette.image_name = 'changed.png'
+    palette.add_color(0xFF00FF00)
+
+    ids = library.add_records(records)
+
+    assert [entry.image_name for entry in library.get(ids)] == ['photo.png', 'sky.png']
+    assert len(library.get(ids[:1])[0].colors) == 1
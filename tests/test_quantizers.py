@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+from image_to_palette.core.ColorDistance import CIE76, CIEDE2000, color_difference
+from image_to_palette.core.ColorSpace import rgb_to_lab
+from image_to_palette.core.Quantizers import (QUANTIZERS, MedianCutQuantizer, OctreeQuantizer, create_quantizer,
+                                              weighted_mean)
+from image_to_palette.model.ColorHistogram import ColorHistogram
+from conftest import random_histogram
+
+# Three colors far apart, each covering a different share of the image
+DISTINCT = ColorHistogram.from_pairs([(0xFFE02010, 500), (0xFF10E020, 300), (0xFF2010E0, 200)])
+
+def test_weighted_mean_weighs_by_count():
+    assert weighted_mean([(0xFF000000, 3), (0xFF040404, 1)]) == 0xFF010101
+
+@pytest.mark.parametrize('name', list(QUANTIZERS))
+def test_distinct_colors_are_all_picked(name):
+    colors = create_quantizer(name).quantize(DISTINCT, 3, random.Random(1))
+
+    assert sorted(colors) == sorted(DISTINCT.colors)
+
+@pytest.mark.parametrize('name', list(QUANTIZERS))
+def test_palette_is_filled_by_repeating_colors(name):
+    colors = create_quantizer(name).quantize(DISTINCT, 7, random.Random(1))
+
+    assert len(colors) == 7
+    assert set(colors) <= set(DISTINCT.colors)
+
+@pytest.mark.parametrize('name', list(QUANTIZERS))
+def test_same_seed_picks_the_same_colors(name):
+    histogram = random_histogram(random.Random(4), 2000)
+    quantizer = create_quantizer(name)
+
+    assert quantizer.quantize(histogram, 10, random.Random(9)) == quantizer.quantize(histogram, 10, random.Random(9))
+
+@pytest.mark.parametrize('name', list(QUANTIZERS))
+@pytest.mark.parametrize('metric', [CIE76, CIEDE2000])
+def test_min_distance_keeps_colors_apart(name, metric):
+    histogram = random_histogram(random.Random(8), 3000)
+    difference = color_difference(metric)
+
+    colors = create_quantizer(name).quantize(histogram, 10, random.Random(2), min_distance=15, metric=metric)
+
+    labs = [rgb_to_lab(color & 0xFFFFFF) for color in colors]
+    assert len(set(colors)) == 10
+    assert all(difference(labs[i], labs[j]) >= 15 for i in range(10) for j in range(i))
+
+def test_empty_histogram_has_no_palette():
+    assert create_quantizer('kmeans').quantize(ColorHistogram(), 10, random.Random(1)) == []
+
+@pytest.mark.parametrize('quantizer', [MedianCutQuantizer(), OctreeQuantizer()])
+def test_numpy_and_python_versions_pick_the_same_colors(quantizer, numpy):
+    rng = random.Random(21)
+    for length, bits in ((5, 8), (300, 8), (4000, 8), (4000, 4)):
+        histogram = random_histogram(rng, length, bits)
+        for num_colors in (1, 10, 32):
+            assert quantizer.select_numpy(histogram, num_colors) == quantizer.select_python(histogram, num_colors)
+
+def test_kmeans_centers_land_on_the_clusters():
+    rng = random.Random(6)
+    pairs = {}
+    for center in (0x202020, 0xE0E0E0):
+        for _ in range(200):
+            pairs[0xFF000000 | (center + rng.randrange(8) * 0x010101)] = rng.randrange(1, 50)
+    histogram = ColorHistogram.from_pairs(sorted(pairs.items(), key=lambda pair: -pair[1]))
+
+    colors = create_quantizer('kmeans').quantize(histogram, 2, random.Random(3))
+
+    assert sorted(color & 0xFF for color in colors) == [pytest.approx(0x23, abs=4), pytest.approx(0xE3, abs=4)]
@@ -0,0 +1,56 @@
+import json
+
+from image_to_palette.core.PaletteFile import save_palette_file
+from image_to_palette.core.RecentPalettes import (MAX_RECENT_PALETTES, create_entry, load_recent_palettes,
+                                                  reread_entry, write_recent_palettes)
+from conftest import make_palette
+
+def test_missing_palette_files_are_pruned(tmp_path):
+    kept = tmp_path / 'kept.json'
+    kept.write_text('{}')
+    file_name = str(tmp_path / 'recent.json')
+    write_recent_palettes(file_name, [{"path": str(kept)}, {"path": str(tmp_path / 'gone.json')}])
+
+    entries, pruned = load_recent_palettes(file_name, str(tmp_path / 'legacy.json'))
+
+    assert [entry["path"] for entry in entries] == [str(kept)]
+    assert pruned
+
+def test_legacy_list_is_migrated_once(tmp_path):
+    paths = []
+    for index in range(MAX_RECENT_PALETTES + 2):
+        path = tmp_path / f'palette{index}.json'
+        path.write_text('{}')
+        paths.append(str(path))
+    legacy = tmp_path / 'legacy.json'
+    legacy.write_text(json.dumps(paths))
+    file_name = str(tmp_path / 'recent' / 'recent.json')
+
+    entries, pruned = load_recent_palettes(file_name, str(legacy))
+
+    assert [entry["path"] for entry in entries] == paths[:MAX_RECENT_PALETTES]
+    assert not pruned
+    assert load_recent_palettes(file_name, str(tmp_path / 'missing.json')) == (entries, False)
+
+def test_entries_keep_the_swatches(tmp_path):
+    entry = create_entry(str(tmp_path / 'sky.json'), make_palette('sky.png', [0x87CEEB]))
+
+    assert (entry["path"], entry["image_name"], entry["modified"]) == (str(tmp_path / 'sky.json'), 'sky.png', None)
+    assert len(entry["colors"]) == 1
+
+def test_changed_files_are_read_again_in_place(tmp_path):
+    path = str(tmp_path / 'sky.itpal')
+    save_palette_file(path, make_palette('sky.png', [0x87CEEB]))
+    entry = create_entry(path, make_palette('sky.png', [0x87CEEB]))
+    save_palette_file(path, make_palette('sea.png', [0x4682B4, 0x000080]))
+
+    updated = reread_entry(entry)
+
+    assert (updated["image_name"], updated["colors"]) == ('sea.png', ['#ff4682b4', '#ff000080'])
+    assert updated["opened"] == entry["opened"]
+
+def test_unreadable_files_are_not_read_again(tmp_path):
+    path = tmp_path / 'sky.json'
+    path.write_text('{"current')
+
+    assert reread_entry({"path": str(path)}) is None
@@ -0,0 +1,48 @@
+import random
+from collections import Counter
+
+import pytest
+
+from image_to_palette.core import SamplingIndex as sampling
+from image_to_palette.core.SamplingIndex import BUCKET_MASK, SamplingIndex, get_sampling_index
+from image_to_palette.model.ColorHistogram import ColorHistogram
+from conftest import random_histogram
+
+def test_draws_follow_pixel_counts():
+    histogram = ColorHistogram.from_pairs([(0xFF000001, 900), (0xFF000002, 100)])
+    index = SamplingIndex(histogram)
+    rng = random.Random(1)
+
+    draws = Counter(histogram.colors[index.draw(rng)] for _ in range(10000))
+
+    assert draws[0xFF000001] == pytest.approx(9000, rel=0.05)
+
+def test_sample_prefers_colors_of_different_buckets():
+    # Many shades of the most common color, and a few less common colors of other buckets
+    pairs = [(0xFF808080 + shade, 200) for shade in range(8)] + [(0xFF000000 | (i << 20), 100) for i in range(1, 4)]
+    index = SamplingIndex(ColorHistogram.from_pairs(pairs))
+
+    colors = index.sample(random.Random(5), 4)
+
+    assert len(colors) == 4
+    assert len({color & BUCKET_MASK for color in colors}) == 4
+
+def test_sample_never_repeats_colors():
+    index = SamplingIndex(ColorHistogram.from_pairs([(0xFF000001, 5), (0xFF000002, 5)]))
+
+    assert sorted(index.sample(random.Random(2), 10)) == [0xFF000001, 0xFF000002]
+
+def test_empty_histogram_samples_nothing():
+    assert SamplingIndex(ColorHistogram()).sample(random.Random(1), 10) == []
+
+def test_numpy_and_python_tables_match(numpy, monkeypatch):
+    histogram = random_histogram(random.Random(3), 1000)
+    expected = SamplingIndex(histogram).cum_weights
+    monkeypatch.setattr(sampling, 'np', None)
+
+    assert SamplingIndex(histogram).cum_weights == expected
+
+def test_index_is_kept_on_the_histogram():
+    histogram = ColorHistogram.from_pairs([(0xFF000001, 1)])
+
+    assert get_sampling_index(histogram) is get_sampling_index(histogram)
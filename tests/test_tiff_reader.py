@@ -0,0 +1,104 @@
+import random
+import struct
+import zlib
+from array import array
+
+import pytest
+
+from image_to_palette.core.TiffReader import TiffReader, inflate, undo_horizontal_predictor, unpack_bits
+from tiff_writer import write_tiff
+
+WIDTH, HEIGHT = 37, 23
+
+def make_samples(samples_per_pixel, seed=1):
+    rng = random.Random(seed)
+    # Few distinct values, so PackBits has runs to encode
+    return bytes(rng.choice((0, 0, 0, 64, 128, 255)) for _ in range(WIDTH * HEIGHT * samples_per_pixel))
+
+# Returns the ARGB pixels of every step-th row and column of the samples
+def expected_pixels(samples, samples_per_pixel, step=1):
+    pixels = []
+    for y in range(0, HEIGHT, step):
+        for x in range(0, WIDTH, step):
+            pixel = samples[(y * WIDTH + x) * samples_per_pixel:][:samples_per_pixel]
+            red, green, blue = (pixel[0],) * 3 if samples_per_pixel < 3 else pixel[:3]
+            alpha = pixel[-1] if samples_per_pixel in (2, 4) else 255
+            pixels.append((alpha << 24) | (red << 16) | (green << 8) | blue)
+    return pixels
+
+def read_pixels(reader, step=1):
+    return list(array('I', b''.join(reader.bands(step))))
+
+LAYOUTS = {
+    'single strip': {},
+    'strips': {'rows_per_strip': 5},
+    'tiles': {'tile': (16, 16)},
+}
+
+@pytest.mark.parametrize('layout', list(LAYOUTS))
+@pytest.mark.parametrize('compression, predictor', [(1, 1), (8, 1), (8, 2), (32773, 1), (32946, 2)])
+@pytest.mark.parametrize('samples_per_pixel', [1, 3, 4])
+def test_bands_decode_every_pixel(tmp_path, layout, compression, predictor, samples_per_pixel):
+    samples = make_samples(samples_per_pixel)
+    path = str(tmp_path / 'image.tif')
+    write_tiff(path, WIDTH, HEIGHT, samples, samples_per_pixel, compression, predictor,
+               extra_samples=2 if samples_per_pixel == 4 else None, **LAYOUTS[layout])
+
+    reader = TiffReader(path)
+
+    assert (reader.width, reader.height) == (WIDTH, HEIGHT)
+    assert read_pixels(reader) == expected_pixels(samples, samples_per_pixel)
+
+@pytest.mark.parametrize('layout', list(LAYOUTS))
+@pytest.mark.parametrize('compression', [1, 8])
+@pytest.mark.parametrize('step', [2, 5])
+def test_bands_keep_every_step_pixel(tmp_path, layout, compression, step):
+    samples = make_samples(3)
+    path = str(tmp_path / 'image.tif')
+    write_tiff(path, WIDTH, HEIGHT, samples, 3, compression, **LAYOUTS[layout])
+
+    assert read_pixels(TiffReader(path), step) == expected_pixels(samples, 3, step)
+
+def test_big_endian_files_are_read(tmp_path):
+    samples = make_samples(3)
+    path = str(tmp_path / 'image.tif')
+    write_tiff(path, WIDTH, HEIGHT, samples, 3, 8, tile=(16, 16), big_endian=True)
+
+    assert read_pixels(TiffReader(path)) == expected_pixels(samples, 3)
+
+def test_associated_alpha_is_premultiplied(tmp_path):
+    path = str(tmp_path / 'image.tif')
+    write_tiff(path, WIDTH, HEIGHT, make_samples(4), 4, extra_samples=1)
+
+    assert TiffReader(path).premultiplied
+
+def test_unsupported_files_are_refused(tmp_path):
+    path = str(tmp_path / 'image.tif')
+    # LZW is left to Qt
+    write_tiff(path, WIDTH, HEIGHT, make_samples(3), 3, compression=5)
+    with pytest.raises(ValueError):
+        TiffReader(path)
+
+    with open(path, 'wb') as file:
+        file.write(b'PNG not a TIFF')
+    with pytest.raises((ValueError, struct.error)):
+        TiffReader(path)
+
+def test_unpack_bits_spans_chunks():
+    encoded = bytes([253, 7, 2, 1, 2, 3, 128])
+
+    assert b''.join(unpack_bits([encoded[:1], encoded[1:4], encoded[4:]])) == b'\x07' * 4 + b'\x01\x02\x03'
+
+def test_inflate_is_bounded():
+    data = bytes(3 << 20)
+    compressed = zlib.compress(data)
+
+    chunks = list(inflate([compressed[:100], compressed[100:]]))
+
+    assert b''.join(chunks) == data
+    assert max(len(chunk) for chunk in chunks) <= 1 << 20
+
+def test_undo_horizontal_predictor_restores_rows():
+    data = bytearray([10, 20, 5, 5, 1, 1, 250, 0, 10, 10, 0, 0])
+
+    assert bytes(undo_horizontal_predictor(data, 3, 2)) == bytes([10, 20, 15, 25, 16, 26, 250, 0, 4, 10, 4, 10])
@@ -0,0 +1,52 @@
+import random
+from array import array
+
+import pytest
+
+from image_to_palette.core import Bucketing
+from image_to_palette.core.Bucketing import EXACT_PRECISION, PRECISIONS, bucket_histogram
+from image_to_palette.core.Histogram import count_pixels
+from image_to_palette.core.TileHistogram import TileHistogram
+from conftest import histogram_pairs
+
+# Returns the pixels of a tile drawn from a few shades, so tiles share colors
+def tile_pixels(rng, length=500):
+    return array('I', (0xFF000000 | rng.choice((0x102030, 0x112131, 0x807060, 0xF0E0D0)) ^ rng.getrandbits(3)
+                       for _ in range(length))).tobytes()
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+@pytest.mark.parametrize('precision', list(PRECISIONS))
+def test_totals_follow_replaced_and_removed_tiles(precision, use_numpy, monkeypatch):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(Bucketing, 'np', None)
+    rng = random.Random(5)
+    tiles = {(index, 0): tile_pixels(rng) for index in range(6)}
+    tile_histogram = TileHistogram(precision)
+    for key, pixels in tiles.items():
+        tile_histogram.update(key, hash(pixels), pixels)
+
+    for key in ((1, 0), (4, 0)):
+        tiles[key] = tile_pixels(rng)
+        tile_histogram.update(key, hash(tiles[key]), tiles[key])
+    tile_histogram.remove((2, 0))
+    del tiles[(2, 0)]
+
+    expected = bucket_histogram(count_pixels(b''.join(tiles.values())), precision)
+    assert histogram_pairs(tile_histogram.histogram()) == histogram_pairs(expected)
+
+def test_histogram_is_built_again_only_after_a_change():
+    rng = random.Random(8)
+    pixels = tile_pixels(rng)
+    tile_histogram = TileHistogram(EXACT_PRECISION)
+    tile_histogram.update((0, 0), 1, pixels)
+    histogram = tile_histogram.histogram()
+
+    # Same colors under a new checksum, such as a change between the sampled pixels
+    tile_histogram.update((0, 0), 2, pixels)
+    assert tile_histogram.histogram() is histogram
+    assert not tile_histogram.is_dirty((0, 0), 2)
+
+    tile_histogram.update((256, 0), 3, tile_pixels(rng))
+    assert tile_histogram.histogram() is not histogram
@@ -0,0 +1,96 @@
+import struct
+import zlib
+
+#---------------------------------------------------------#
+# Minimal baseline TIFF writer for the reader tests,      #
+# writing 8-bit chunky images in strips or tiles.         #
+#---------------------------------------------------------#
+
+# Applies the horizontal predictor to rows of samples
+def predict(raw, row_size, samples_per_pixel):
+    data = bytearray(raw)
+    for start in range(0, len(data), row_size):
+        for index in range(start + row_size - 1, start + samples_per_pixel - 1, -1):
+            data[index] = (data[index] - data[index - samples_per_pixel]) & 0xFF
+    return bytes(data)
+
+# PackBits encodes rows of samples, runs never crossing a row
+def pack_bits(raw, row_size):
+    output = bytearray()
+    for start in range(0, len(raw), row_size):
+        for index in range(start, start + row_size, 128):
+            chunk = raw[index:min(index + 128, start + row_size)]
+            if len(chunk) > 1 and len(set(chunk)) == 1:
+                output += bytes([257 - len(chunk), chunk[0]])
+            else:
+                output += bytes([len(chunk) - 1]) + chunk
+    return bytes(output)
+
+# Writes samples (width x height x samples_per_pixel bytes) as a TIFF file
+def write_tiff(path, width, height, samples, samples_per_pixel, compression=1, predictor=1, tile=None,
+               rows_per_strip=None, extra_samples=None, big_endian=False):
+    order = '>' if big_endian else '<'
+
+    def encode(raw, chunk_width):
+        row_size = chunk_width * samples_per_pixel
+        if predictor == 2:
+            raw = predict(raw, row_size, samples_per_pixel)
+        if compression in (8, 32946):
+            return zlib.compress(raw)
+        if compression == 32773:
+            return pack_bits(raw, row_size)
+        return raw
+
+    chunks = []
+    if tile:
+        tile_width, tile_height = tile
+        for top in range(0, height, tile_height):
+            for left in range(0, width, tile_width):
+                raw = bytearray(tile_width * tile_height * samples_per_pixel)
+                for row in range(min(tile_height, height - top)):
+                    kept = min(tile_width, width - left) * samples_per_pixel
+                    start = ((top + row) * width + left) * samples_per_pixel
+                    offset = row * tile_width * samples_per_pixel
+                    raw[offset:offset + kept] = samples[start:start + kept]
+                chunks.append(encode(bytes(raw), tile_width))
+    else:
+        rows_per_strip = rows_per_strip or height
+        for top in range(0, height, rows_per_strip):
+            chunks.append(encode(samples[top * width * samples_per_pixel:
+                                         min(top + rows_per_strip, height) * width * samples_per_pixel], width))
+
+    data = bytearray(8)
+    offsets = []
+    for chunk in chunks:
+        offsets.append(len(data))
+        data += chunk + b'\0' * (len(chunk) % 2)
+
+    photometric = 2 if samples_per_pixel >= 3 else 1
+    entries = [(256, 4, [width]), (257, 4, [height]), (258, 3, [8] * samples_per_pixel), (259, 3, [compression]),
+               (262, 3, [photometric]), (277, 3, [samples_per_pixel]), (284, 3, [1])]
+    if predictor != 1:
+        entries.append((317, 3, [predictor]))
+    if tile:
+        entries += [(322, 4, [tile[0]]), (323, 4, [tile[1]]), (324, 4, offsets), (325, 4, [len(chunk) for chunk in chunks])]
+    else:
+        entries += [(273, 4, offsets), (278, 4, [rows_per_strip]), (279, 4, [len(chunk) for chunk in chunks])]
+    if extra_samples is not None:
+        entries.append((338, 3, [extra_samples]))
+    entries.sort()
+
+    directory_offset = len(data)
+    values_offset = directory_offset + 2 + 12 * len(entries) + 4
+    directory = struct.pack(order + 'H', len(entries))
+    values = bytearray()
+    for tag, field_type, field_values in entries:
+        packed = struct.pack(f'{order}{len(field_values)}{"H" if field_type == 3 else "I"}', *field_values)
+        if len(packed) <= 4:
+            directory += struct.pack(order + 'HHI', tag, field_type, len(field_values)) + packed.ljust(4, b'\0')
+        else:
+            directory += struct.pack(order + 'HHII', tag, field_type, len(field_values), values_offset + len(values))
+            values += packed
+    data += directory + b'\0\0\0\0' + values
+    data[0:8] = (b'MM' if big_endian else b'II') + struct.pack(order + 'HI', 42, directory_offset)
+
+    with open(path, 'wb') as file:
+        file.write(bytes(data))